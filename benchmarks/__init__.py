@@ -0,0 +1,3 @@
+"""
+Benchmarks de rendimiento de la transcripción (no forman parte de la app).
+"""
@@ -0,0 +1,159 @@
+"""
+Exportación a DOCX: escritura en streaming frente al modelo de objetos de python-docx.
+
+La implementación de referencia es la que usaba src/export.py antes del
+escritor en streaming (doc.add_heading/add_paragraph y doc.save). Para cada
+número de segmentos se mide el tiempo, el tamaño del archivo y la memoria pico
+de las dos, y se comprueba que generan el mismo documento: mismos párrafos,
+con el mismo estilo y el mismo texto.
+
+Uso:
+    python -m benchmarks.docx_export --segmentos 1000 10000 100000 --salida docx.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import zipfile
+import tracemalloc
+from io import BytesIO
+from xml.etree import ElementTree
+
+from benchmarks.suite import _fake_segments, measure
+
+
+def export_docx_object_model(text, segments=None):
+    """Exportación DOCX de referencia construyendo el documento con python-docx"""
+    from docx import Document
+
+    from src.config import EXPORT_CHUNK_SEGMENTS
+    from src.export import _table
+    from src.segments import format_mmss
+
+    doc = Document()
+    doc.add_heading('Transcripción de Audio', 0)
+
+    doc.add_heading('Información', level=1)
+    doc.add_paragraph(f'Fecha de transcripción: {time.strftime("%Y-%m-%d %H:%M:%S")}')
+    if segments:
+        doc.add_paragraph(f'Número de segmentos: {len(segments)}')
+
+    doc.add_heading('Transcripción Completa', level=1)
+    doc.add_paragraph(text)
+
+    if segments:
+        doc.add_heading('Segmentos con Timestamps', level=1)
+        for _, inicios, finales, textos in _table(segments).blocks(EXPORT_CHUNK_SEGMENTS):
+            for inicio, fin, texto in zip(format_mmss(inicios), format_mmss(finales), textos):
+                doc.add_paragraph(f"[{inicio} - {fin}] {texto}")
+
+    bio = BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
+
+
+def _paragraphs(data):
+    """
+    (estilo, texto) de cada párrafo de un DOCX, sin la fecha (cambia entre ejecuciones).
+
+    Se lee word/document.xml directamente: recorrer 100k párrafos con
+    python-docx tarda más que las propias exportaciones.
+    """
+    w = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+    with zipfile.ZipFile(BytesIO(data)) as docx:
+        body = ElementTree.fromstring(docx.read('word/document.xml')).find(f'{w}body')
+
+    parrafos = []
+    for p in body.iter(f'{w}p'):
+        estilo = p.find(f'{w}pPr/{w}pStyle')
+        partes = []
+        for elemento in p.iter():
+            if elemento.tag == f'{w}t':
+                partes.append(elemento.text or '')
+            elif elemento.tag == f'{w}tab':
+                partes.append('\t')
+            elif elemento.tag == f'{w}br':
+                partes.append('\n')
+        texto = ''.join(partes)
+        if not texto.startswith('Fecha de transcripción:'):
+            parrafos.append((estilo.get(f'{w}val') if estilo is not None else None, texto))
+    return parrafos
+
+
+def _peak_mb(func):
+    """Memoria pico reservada por Python durante func, en MB"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def compare(n, repeticiones=1):
+    """
+    Mide las dos implementaciones con n segmentos.
+
+    Returns:
+        dict: Tiempos, tamaños, memoria pico, aceleración y si los documentos son equivalentes
+    """
+    from src.export import export_docx
+
+    segmentos = _fake_segments(n)
+    texto = ''.join(s['text'] for s in segmentos)
+
+    resultado = {'segmentos': n}
+    documentos = {}
+    for nombre, func in (('python-docx', export_docx_object_model), ('streaming', export_docx)):
+        r = measure(lambda: func(texto, segmentos), repeticiones)
+        documentos[nombre] = r['valor']
+        resultado[nombre] = {
+            'min_s': r['min_s'],
+            'mediana_s': r['mediana_s'],
+            'kb': round(len(r['valor']) / 1024, 1),
+            'pico_mb': round(_peak_mb(lambda: func(texto, segmentos)), 1),
+        }
+
+    resultado['aceleracion'] = resultado['python-docx']['min_s'] / resultado['streaming']['min_s']
+    resultado['equivalente'] = _paragraphs(documentos['python-docx']) == _paragraphs(documentos['streaming'])
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.docx_export',
+        description='Compara la exportación DOCX en streaming con la de python-docx.'
+    )
+    parser.add_argument('--segmentos', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--repeticiones', type=int, default=1,
+                        help='Repeticiones por caso (python-docx tarda minutos con 100k segmentos)')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, stdout)')
+    args = parser.parse_args(argv)
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'maquina': {'plataforma': platform.platform(), 'cpus': os.cpu_count()},
+        'resultados': [compare(n, args.repeticiones) for n in args.segmentos],
+    }
+
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    for r in informe['resultados']:
+        print(
+            f"{r['segmentos']} segmentos: python-docx {r['python-docx']['min_s']:.2f} s, "
+            f"streaming {r['streaming']['min_s']:.2f} s (x{r['aceleracion']:.1f}), "
+            f"equivalente: {'sí' if r['equivalente'] else 'NO'}",
+            file=sys.stderr,
+        )
+    return 0 if all(r['equivalente'] for r in informe['resultados']) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Comparación de modelos FP32 frente a INT8 (cuantización dinámica) en CPU.
+
+Cada variante se carga en un proceso nuevo para medir su memoria pico sin
+interferencias. Para cada audio se mide el factor de tiempo real y se calcula
+el WER de INT8 respecto a FP32 y, si existe un .txt junto al audio con la
+transcripción de referencia, respecto a esa referencia.
+
+Uso:
+    python -m benchmarks.quantization audios/*.wav --modelos tiny base small --salida int8.json
+"""
+import os
+import re
+import io
+import sys
+import json
+import time
+import argparse
+import resource
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+VARIANTES = ('fp32', 'int8')
+
+
+def word_error_rate(referencia, hipotesis):
+    """
+    WER por distancia de edición entre palabras (sin mayúsculas ni puntuación).
+
+    Args:
+        referencia (str): Texto de referencia
+        hipotesis (str): Texto a evaluar
+
+    Returns:
+        float: Errores (sustituciones + borrados + inserciones) / palabras de referencia
+    """
+    ref = re.findall(r'\w+', referencia.lower())
+    hyp = re.findall(r'\w+', hipotesis.lower())
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    anterior = list(range(len(hyp) + 1))
+    for i, palabra in enumerate(ref, 1):
+        actual = [i] + [0] * len(hyp)
+        for j, otra in enumerate(hyp, 1):
+            actual[j] = min(
+                anterior[j] + 1,
+                actual[j - 1] + 1,
+                anterior[j - 1] + (palabra != otra),
+            )
+        anterior = actual
+    return anterior[-1] / len(ref)
+
+
+def _peak_rss_mb():
+    """Memoria residente pico del proceso en MB (ru_maxrss está en KB en Linux y en bytes en macOS)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def _model_size_mb(model):
+    """Tamaño del state_dict serializado (incluye los pesos INT8 empaquetados)"""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def run_variant(model_name, variante, audios, idioma=None, hilos=None):
+    """
+    Carga una variante de un modelo y transcribe los audios (en el proceso actual).
+
+    Returns:
+        dict: Tiempos de carga, tamaño, memoria pico y resultados por audio
+    """
+    import torch
+    import whisper
+    from src.transcription import build_model, transcribe_audio
+
+    if hilos:
+        torch.set_num_threads(hilos)
+
+    rss_inicial = _peak_rss_mb()
+    inicio = time.perf_counter()
+    model = build_model(model_name, int8=(variante == 'int8'))
+    carga = time.perf_counter() - inicio
+
+    resultados = []
+    for ruta in audios:
+        audio = whisper.load_audio(ruta)
+        duracion = len(audio) / whisper.audio.SAMPLE_RATE
+        inicio = time.perf_counter()
+        resultado = transcribe_audio(model, audio, idioma)
+        segundos = time.perf_counter() - inicio
+        resultados.append({
+            'audio': ruta,
+            'duracion_audio': duracion,
+            'segundos': segundos,
+            'rtf': segundos / duracion if duracion else None,
+            'texto': resultado['text'],
+        })
+
+    return {
+        'modelo': model_name,
+        'variante': variante,
+        'hilos': torch.get_num_threads(),
+        'carga_s': carga,
+        'tamano_mb': _model_size_mb(model),
+        'rss_inicial_mb': rss_inicial,
+        'rss_pico_mb': _peak_rss_mb(),
+        'audios': resultados,
+    }
+
+
+def _run_isolated(*args):
+    """Ejecuta run_variant en un proceso nuevo para que la memoria pico sea solo suya"""
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+        return pool.submit(run_variant, *args).result()
+
+
+def _read_reference(ruta):
+    """Transcripción de referencia en <audio>.txt, si existe"""
+    referencia = os.path.splitext(ruta)[0] + '.txt'
+    if os.path.exists(referencia):
+        with open(referencia, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def compare(model_name, audios, idioma=None, hilos=None):
+    """
+    Ejecuta FP32 e INT8 de un modelo y calcula las diferencias.
+
+    Returns:
+        dict: Resultados de ambas variantes y resumen (aceleración, memoria, WER)
+    """
+    variantes = {}
+    for variante in VARIANTES:
+        try:
+            variantes[variante] = _run_isolated(model_name, variante, audios, idioma, hilos)
+        except Exception as e:
+            variantes[variante] = {'modelo': model_name, 'variante': variante, 'error': str(e)}
+
+    fp32, int8 = variantes['fp32'], variantes['int8']
+    resumen = {}
+    if 'error' not in fp32 and 'error' not in int8:
+        t32 = sum(a['segundos'] for a in fp32['audios'])
+        t8 = sum(a['segundos'] for a in int8['audios'])
+        resumen = {
+            'aceleracion': t32 / t8 if t8 else None,
+            'reduccion_tamano': 1 - int8['tamano_mb'] / fp32['tamano_mb'],
+            'rss_pico_fp32_mb': fp32['rss_pico_mb'],
+            'rss_pico_int8_mb': int8['rss_pico_mb'],
+            'wer_int8_vs_fp32': [],
+        }
+        for a32, a8 in zip(fp32['audios'], int8['audios']):
+            a8['wer_vs_fp32'] = word_error_rate(a32['texto'], a8['texto'])
+            resumen['wer_int8_vs_fp32'].append(a8['wer_vs_fp32'])
+            referencia = _read_reference(a32['audio'])
+            if referencia is not None:
+                a32['wer_vs_referencia'] = word_error_rate(referencia, a32['texto'])
+                a8['wer_vs_referencia'] = word_error_rate(referencia, a8['texto'])
+
+    return {'modelo': model_name, 'variantes': variantes, 'resumen': resumen}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.quantization',
+        description='Compara velocidad, memoria y WER de modelos FP32 e INT8.'
+    )
+    parser.add_argument('audios', nargs='+', help='Archivos de audio (opcionalmente con <audio>.txt de referencia)')
+    parser.add_argument('--modelos', nargs='+', default=['tiny', 'base'])
+    parser.add_argument('--idioma', default=None, help='Idioma fijo (por defecto, auto-detección)')
+    parser.add_argument('--hilos', type=int, default=None, help='Hilos de torch por proceso')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, stdout)')
+    args = parser.parse_args(argv)
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'maquina': {'plataforma': platform.platform(), 'cpus': os.cpu_count()},
+        'resultados': [compare(m, args.audios, args.idioma, args.hilos) for m in args.modelos],
+    }
+
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    for resultado in informe['resultados']:
+        resumen = resultado['resumen']
+        if resumen:
+            wer = resumen['wer_int8_vs_fp32']
+            print(
+                f"{resultado['modelo']}: x{resumen['aceleracion']:.2f} más rápido, "
+                f"{resumen['reduccion_tamano']:.0%} menos pesos, "
+                f"WER INT8 vs FP32 {sum(wer) / len(wer):.3f}",
+                file=sys.stderr,
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
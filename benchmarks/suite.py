@@ -0,0 +1,483 @@
+"""
+Benchmarks del flujo completo de transcripción, etapa por etapa.
+
+Genera audio sintético (silencio con ráfagas y una señal parecida a la voz) a
+varias duraciones y mide por separado la ingesta, ffprobe, la detección de voz,
+la carga del modelo, el factor de tiempo real de la transcripción (por modelo,
+número de hilos y con o sin detección de voz), el de la decodificación por
+lotes según el tamaño del lote, la carga y la memoria de varios
+procesos con y sin pesos compartidos, el coste del ProgressTracker, las
+exportaciones según el número de segmentos y la memoria de los segmentos como
+dicts frente a SegmentTable.
+Los casos que necesitan pesos de Whisper se saltan si no están en la caché local.
+
+Uso:
+    python -m benchmarks.suite --salida bench.json
+    python -m benchmarks.suite --modelos tiny base --hilos 1 4 --comparar bench.json
+    python -m benchmarks.suite --modelos base --lotes 1 4 8 16 --duracion-modelo 300
+"""
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import platform
+import statistics
+import tempfile
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+SENALES = ('silencio', 'voz')
+
+
+def make_signal(tipo, duracion, seed=0):
+    """
+    Genera audio sintético mono a 16 kHz.
+
+    Args:
+        tipo (str): 'silencio' (90 % silencio con ráfagas cortas) o 'voz'
+            (armónicos con entonación y sílabas a ~4 Hz, con pausas)
+        duracion (float): Duración en segundos
+        seed (int): Semilla del ruido
+
+    Returns:
+        np.ndarray: Muestras float32 en [-1, 1]
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duracion * SAMPLE_RATE)
+    t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+    audio = rng.normal(0, 0.002, n).astype(np.float32)
+
+    if tipo == 'silencio':
+        # Una ráfaga de 1 s cada 10 s
+        for inicio in range(0, int(duracion), 10):
+            a, b = inicio * SAMPLE_RATE, min(n, (inicio + 1) * SAMPLE_RATE)
+            audio[a:b] += 0.3 * np.sin(2 * np.pi * 440 * t[a:b])
+    elif tipo == 'voz':
+        f0 = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)  # Entonación lenta
+        fase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        voz = sum(np.sin(k * fase) / k for k in range(1, 8))
+        silabas = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+        pausas = (np.sin(2 * np.pi * 0.1 * t) > -0.6)  # ~30 % del tiempo en pausa
+        audio += (0.15 * voz * silabas * pausas).astype(np.float32)
+    else:
+        raise ValueError(f'Señal desconocida: {tipo}')
+
+    return np.clip(audio, -1, 1)
+
+
+def write_wav(ruta, audio):
+    """Escribe muestras float32 como WAV PCM de 16 bits"""
+    with wave.open(ruta, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+
+def measure(func, repeticiones=3):
+    """
+    Ejecuta func varias veces y devuelve estadísticas de tiempo.
+
+    Returns:
+        dict: Mínimo y mediana en segundos, y el valor devuelto por la última ejecución
+    """
+    tiempos = []
+    valor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        valor = func()
+        tiempos.append(time.perf_counter() - inicio)
+    return {'min_s': min(tiempos), 'mediana_s': statistics.median(tiempos), 'valor': valor}
+
+
+def model_cached(model_name):
+    """Indica si los pesos del modelo ya están en la caché local de whisper"""
+    import whisper
+
+    url = whisper._MODELS.get(model_name)
+    if url is None:
+        return False
+    raiz = os.path.join(os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'whisper')
+    return os.path.exists(os.path.join(raiz, os.path.basename(url)))
+
+
+class Suite:
+    """Acumula los casos medidos y los saltados"""
+    def __init__(self, repeticiones=3):
+        self.repeticiones = repeticiones
+        self.casos = []
+        self.saltados = []
+
+    def add(self, etapa, parametros, **medidas):
+        self.casos.append({'etapa': etapa, 'parametros': parametros, **medidas})
+        detalle = ', '.join(f'{k}={v}' for k, v in parametros.items())
+        segundos = medidas.get('min_s')
+        print(f"{etapa:<14} {detalle:<45} {segundos if segundos is None else f'{segundos:.4f} s'}", file=sys.stderr)
+
+    def skip(self, etapa, motivo, **parametros):
+        self.saltados.append({'etapa': etapa, 'parametros': parametros, 'motivo': motivo})
+        print(f'{etapa:<14} saltado: {motivo}', file=sys.stderr)
+
+
+def bench_ingest(suite, audios):
+    """Escritura y decodificación del audio subido (una lectura, una decodificación)"""
+    from src.audio import ingest, decode_file
+    from src.utils import find_tool
+
+    if find_tool('ffmpeg') is None:
+        suite.skip('ingesta', 'ffmpeg no disponible')
+        return
+
+    for (tipo, duracion), ruta in audios.items():
+        parametros = {'senal': tipo, 'duracion_s': duracion, 'mb': round(os.path.getsize(ruta) / 2**20, 2)}
+
+        def stream():
+            with open(ruta, 'rb') as f:
+                ingest(f, ruta).close()
+
+        def archivo():
+            decode_file(ruta).close()
+
+        for modo, func in (('stream', stream), ('archivo', archivo)):
+            r = measure(func, suite.repeticiones)
+            suite.add('ingesta', dict(parametros, modo=modo), min_s=r['min_s'], mediana_s=r['mediana_s'],
+                      x_tiempo_real=duracion / r['min_s'])
+
+
+def bench_duration(suite, audios):
+    """Duración con ffprobe (el método anterior a la ingesta única)"""
+    from src.utils import find_tool, get_audio_duration
+
+    if find_tool('ffprobe') is None:
+        suite.skip('ffprobe', 'ffprobe no disponible')
+        return
+
+    for (tipo, duracion), ruta in audios.items():
+        r = measure(lambda: get_audio_duration(ruta), suite.repeticiones)
+        suite.add('ffprobe', {'senal': tipo, 'duracion_s': duracion}, min_s=r['min_s'], mediana_s=r['mediana_s'])
+
+
+def bench_models(suite, modelos, hilos, duracion_modelo):
+    """Carga de cada modelo y factor de tiempo real de transcribe_audio por número de hilos"""
+    try:
+        import torch
+        from src.transcription import build_model, transcribe_audio, uses_int8
+    except ImportError as e:
+        suite.skip('modelo', f'whisper/torch no instalados ({e})')
+        return
+
+    hilos_originales = torch.get_num_threads()
+    for modelo in modelos:
+        if not model_cached(modelo):
+            suite.skip('modelo', 'pesos no descargados', modelo=modelo)
+            continue
+
+        inicio = time.perf_counter()
+        model = build_model(modelo)
+        suite.add('carga_modelo', {'modelo': modelo, 'int8': uses_int8(modelo)},
+                  min_s=time.perf_counter() - inicio)
+
+        for n_hilos in hilos:
+            torch.set_num_threads(n_hilos)
+            for tipo in SENALES:
+                audio = make_signal(tipo, duracion_modelo)
+                for vad in (False, True):
+                    # Una repetición: cada transcripción ya dura varios segundos
+                    r = measure(lambda: transcribe_audio(model, audio, vad=vad), 1)
+                    suite.add('transcripcion', {'modelo': modelo, 'hilos': n_hilos, 'senal': tipo,
+                                                'duracion_s': duracion_modelo, 'vad': vad},
+                              min_s=r['min_s'], rtf=r['min_s'] / duracion_modelo,
+                              segmentos=len(r['valor']['segments']),
+                              omitido_s=r['valor'].get('vad', {}).get('omitido_s', 0.0))
+        del model
+    torch.set_num_threads(hilos_originales)
+
+
+def bench_batched(suite, modelos, lotes, duracion_modelo):
+    """Factor de tiempo real de la decodificación por lotes según el número de ventanas por lote"""
+    try:
+        from src.transcription import build_model, transcribe_audio_batched
+    except ImportError as e:
+        suite.skip('lotes', f'whisper/torch no instalados ({e})')
+        return
+
+    audio = make_signal('voz', duracion_modelo)
+    for modelo in modelos:
+        if not model_cached(modelo):
+            suite.skip('lotes', 'pesos no descargados', modelo=modelo)
+            continue
+
+        model = build_model(modelo)
+        for lote in lotes:
+            r = measure(lambda: transcribe_audio_batched(model, [audio], batch_size=lote)[0], 1)
+            suite.add('lotes', {'modelo': modelo, 'lote': lote, 'duracion_s': duracion_modelo},
+                      min_s=r['min_s'], rtf=r['min_s'] / duracion_modelo,
+                      segmentos=len(r['valor']['segments']))
+        del model
+
+
+def _process_memory():
+    """
+    Memoria del proceso en MB (Linux: /proc/self/smaps_rollup).
+
+    pss reparte cada página compartida entre los procesos que la mapean; anonima
+    es la memoria propia del proceso (incluidas las copias de los pesos).
+    """
+    campos = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                campos[partes[0].rstrip(':')] = int(partes[1]) / 1024
+    return {
+        'rss_mb': round(campos.get('Rss', 0.0), 1),
+        'pss_mb': round(campos.get('Pss', 0.0), 1),
+        'anonima_mb': round(campos.get('Anonymous', 0.0), 1),
+    }
+
+
+def _model_worker(modelo, compartidos, barrera, cola):
+    """Proceso que carga el modelo, lo usa y mide su memoria mientras los demás siguen vivos"""
+    os.environ['TRANSCRIPT_SHARED_WEIGHTS'] = '1' if compartidos else '0'
+    import torch
+    from src.transcription import build_model
+
+    inicio = time.perf_counter()
+    model = build_model(modelo, int8=False)
+    carga = time.perf_counter() - inicio
+    # Encoder y proyección final (usa toda la matriz de embeddings): se leen todos los pesos
+    with torch.no_grad():
+        features = model.embed_audio(torch.zeros(1, model.dims.n_mels, 3000))
+        model.logits(torch.tensor([[0]]), features)
+
+    barrera.wait()
+    cola.put({'carga_s': carga, **_process_memory()})
+    barrera.wait()
+
+
+def bench_shared_weights(suite, modelos, procesos):
+    """Carga y memoria por proceso con una copia de los pesos por proceso o con pesos compartidos"""
+    import multiprocessing
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        suite.skip('pesos', 'solo en Linux (/proc/self/smaps_rollup)')
+        return
+    try:
+        from src.weights import attach_model, export_weights
+    except ImportError as e:
+        suite.skip('pesos', f'whisper/torch no instalados ({e})')
+        return
+
+    ctx = multiprocessing.get_context('spawn')
+    for modelo in modelos:
+        if not model_cached(modelo):
+            suite.skip('pesos', 'pesos no descargados', modelo=modelo)
+            continue
+        if attach_model(modelo) is None:
+            export_weights(modelo)  # La exportación se hace una vez; aquí se mide adjuntarse
+
+        for compartidos in (False, True):
+            barrera = ctx.Barrier(procesos)
+            cola = ctx.Queue()
+            workers = [ctx.Process(target=_model_worker, args=(modelo, compartidos, barrera, cola))
+                       for _ in range(procesos)]
+            for w in workers:
+                w.start()
+            medidas = [cola.get() for _ in workers]
+            for w in workers:
+                w.join()
+
+            suite.add('pesos', {'modelo': modelo, 'compartidos': compartidos, 'procesos': procesos},
+                      min_s=min(m['carga_s'] for m in medidas),
+                      **{campo: statistics.median(m[campo] for m in medidas)
+                         for campo in ('rss_mb', 'pss_mb', 'anonima_mb')})
+
+
+def bench_vad(suite, duraciones):
+    """Coste de la detección de voz y fracción de audio que se salta"""
+    from src.vad import SpeechMap, detect_speech
+
+    for tipo in SENALES:
+        for duracion in duraciones:
+            audio = make_signal(tipo, duracion)
+            r = measure(lambda: SpeechMap(detect_speech(audio), len(audio)), suite.repeticiones)
+            suite.add('vad', {'senal': tipo, 'duracion_s': duracion}, min_s=r['min_s'],
+                      mediana_s=r['mediana_s'], x_tiempo_real=duracion / r['min_s'],
+                      fraccion_omitida=round(r['valor'].skipped_fraction, 3))
+
+
+def _fake_segments(n):
+    """Segmentos con la forma de los de Whisper para medir exportaciones y progreso"""
+    return [
+        {'id': i, 'start': i * 4.0, 'end': i * 4.0 + 3.5,
+         'text': f' Segmento número {i} con un texto de longitud típica para una frase hablada.'}
+        for i in range(n)
+    ]
+
+
+def bench_progress(suite, llamadas=10000):
+    """Coste por llamada de ProgressTracker (el bucle lo llama en cada ventana)"""
+    from src.progress import ProgressTracker
+
+    segmentos = _fake_segments(5)
+
+    def ventanas():
+        tracker = ProgressTracker(duracion_total=llamadas * 30)
+        for i in range(llamadas):
+            tracker.on_window(i * 30.0, segmentos)
+        return tracker
+
+    def lecturas():
+        tracker = ventanas()
+        for _ in range(llamadas // 100):
+            tracker.snapshot()
+
+    for nombre, func in (('on_window', ventanas), ('on_window+snapshot', lecturas)):
+        r = measure(func, suite.repeticiones)
+        suite.add('progreso', {'operacion': nombre, 'llamadas': llamadas}, min_s=r['min_s'],
+                  us_por_llamada=r['min_s'] / llamadas * 1e6)
+
+
+def bench_export(suite, cantidades):
+    """Tiempo y tamaño de cada formato de exportación según el número de segmentos"""
+    from src.export import EXPORT_FORMATS, export_bytes
+
+    for n in cantidades:
+        segmentos = _fake_segments(n)
+        texto = ''.join(s['text'] for s in segmentos)
+        for fmt in EXPORT_FORMATS:
+            try:
+                r = measure(lambda: export_bytes(fmt, texto, segmentos), suite.repeticiones)
+            except ImportError as e:
+                suite.skip('exportacion', f'dependencia no instalada ({e})', formato=fmt)
+                continue
+            suite.add('exportacion', {'formato': fmt, 'segmentos': n}, min_s=r['min_s'],
+                      mediana_s=r['mediana_s'], kb=round(len(r['valor']) / 1024, 1))
+
+
+def bench_segments(suite, cantidades):
+    """Memoria de los segmentos como dicts de Whisper frente a SegmentTable, y coste de convertir"""
+    import tracemalloc
+    from src.segments import SegmentTable
+
+    for n in cantidades:
+        tracemalloc.start()
+        # Como los de Whisper: con tokens y el resto de campos por segmento
+        segmentos = [
+            {**s, 'seek': 0, 'tokens': list(range(50364, 50364 + 25)), 'temperature': 0.0,
+             'avg_logprob': -0.25, 'compression_ratio': 1.4, 'no_speech_prob': 0.01}
+            for s in _fake_segments(n)
+        ]
+        memoria_dicts = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        r = measure(lambda: SegmentTable.from_segments(segmentos), suite.repeticiones)
+        tabla = r['valor']
+        with tempfile.TemporaryDirectory() as directorio:
+            tabla.save(directorio)
+            carga = measure(lambda: SegmentTable.load(directorio), suite.repeticiones)
+        suite.add('segmentos', {'segmentos': n}, min_s=r['min_s'], carga_mmap_s=carga['min_s'],
+                  mb_dicts=round(memoria_dicts / 1e6, 2), mb_tabla=round(tabla.nbytes / 1e6, 2))
+
+
+def _case_key(caso):
+    return caso['etapa'], json.dumps(caso['parametros'], sort_keys=True)
+
+
+def compare(anterior, actual):
+    """
+    Compara dos informes caso a caso.
+
+    Returns:
+        list: (etapa, parametros, segundos antes, segundos ahora, ratio ahora/antes)
+    """
+    previos = {_case_key(c): c for c in anterior['casos']}
+    filas = []
+    for caso in actual['casos']:
+        previo = previos.get(_case_key(caso))
+        if previo and previo.get('min_s') and caso.get('min_s'):
+            filas.append((caso['etapa'], caso['parametros'], previo['min_s'], caso['min_s'],
+                          caso['min_s'] / previo['min_s']))
+    return filas
+
+
+def _machine_info():
+    info = {'plataforma': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+    try:
+        import torch
+        info['torch'] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite',
+        description='Mide cada etapa de la transcripción y guarda los resultados en JSON.'
+    )
+    parser.add_argument('--duraciones', type=float, nargs='+', default=[30, 300],
+                        help='Duraciones (s) del audio sintético para ingesta y ffprobe')
+    parser.add_argument('--modelos', nargs='*', default=['tiny', 'base'])
+    parser.add_argument('--hilos', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--lotes', type=int, nargs='+', default=[1, 4, 8],
+                        help='Ventanas por lote en los casos de decodificación por lotes')
+    parser.add_argument('--procesos', type=int, default=3,
+                        help='Procesos simultáneos en los casos de pesos compartidos')
+    parser.add_argument('--duracion-modelo', type=float, default=30,
+                        help='Duración (s) del audio transcrito en los casos con modelo')
+    parser.add_argument('--segmentos', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Número de segmentos en los casos de exportación')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, stdout)')
+    parser.add_argument('--comparar', help='Informe JSON previo con el que comparar')
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.repeticiones)
+    with tempfile.TemporaryDirectory() as directorio:
+        audios = {}
+        for tipo in SENALES:
+            for duracion in args.duraciones:
+                ruta = os.path.join(directorio, f'{tipo}_{int(duracion)}s.wav')
+                write_wav(ruta, make_signal(tipo, duracion))
+                audios[(tipo, duracion)] = ruta
+
+        bench_ingest(suite, audios)
+        bench_duration(suite, audios)
+        bench_vad(suite, args.duraciones)
+        bench_models(suite, args.modelos, sorted(set(args.hilos)), args.duracion_modelo)
+        bench_batched(suite, args.modelos, sorted(set(args.lotes)), args.duracion_modelo)
+        bench_shared_weights(suite, args.modelos, args.procesos)
+    bench_progress(suite)
+    bench_export(suite, args.segmentos)
+    bench_segments(suite, args.segmentos)
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'maquina': _machine_info(),
+        'casos': suite.casos,
+        'saltados': suite.saltados,
+    }
+
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        print('\nComparación (ratio < 1: más rápido ahora)', file=sys.stderr)
+        for etapa, parametros, antes, ahora, ratio in compare(anterior, informe):
+            detalle = ', '.join(f'{k}={v}' for k, v in parametros.items())
+            print(f'{etapa:<14} {detalle:<45} {antes:.4f} -> {ahora:.4f} s  x{ratio:.2f}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
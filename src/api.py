@@ -0,0 +1,683 @@
+"""
+API HTTP de transcripción para otros servicios.
+
+Un único bucle de asyncio atiende todas las conexiones (HTTP/1.1 con
+keep-alive, sin dependencias externas); la transcripción corre en la cola de
+trabajos de src.jobs, igual que desde la app. El cuerpo de una subida se lee
+por bloques y se escribe a un temporal en disco mientras se calcula su hash,
+sin tenerlo entero en memoria. Como mucho API_MAX_UPLOADS subidas se reciben a
+la vez: las demás esperan sin leer el cuerpo (el control de flujo de TCP frena
+al cliente) y, con más de API_MAX_PENDING trabajos en cola, se responde 503.
+Con un presupuesto de latencia (LATENCY_BUDGET_S), cada subida pasa además el
+control de admisión de src.estimator según la duración del audio: se difiere o
+se rechaza (503 con Retry-After, o 422 si el audio no cabe ni con la cola vacía).
+
+Los segmentos de cada trabajo se publican como Server-Sent Events a medida que
+se decodifican. Los eventos se guardan una vez por trabajo y cada suscriptor
+solo lleva su posición: un cliente lento no frena la decodificación ni a los
+demás (cada escritura espera a que se vacíe su búfer) y puede reconectar con
+Last-Event-ID. Una conexión en espera es solo una corrutina parada.
+
+En modo paralelo los segmentos llegan por fragmentos, en orden, cuando terminan
+todos los fragmentos anteriores. En cascada, tras los segmentos del borrador
+llega un evento 'reemplazo' por cada tramo refinado: {desde, hasta, segmentos}
+sustituye los segmentos recibidos con índices desde..hasta (incluidos, contando
+desde 0). Se envían del último tramo al primero, así que los índices siempre se
+refieren al orden del borrador. Aplicados, el texto coincide con /resultado.
+
+Rutas:
+    POST   /transcripciones?modelo=base&idioma=es&perfil=fast&nombre=audio.mp3   (cuerpo: el audio)
+    GET    /transcripciones/<id>                  Estado y progreso
+    GET    /transcripciones/<id>/eventos          Segmentos y progreso (text/event-stream)
+    GET    /transcripciones/<id>/resultado?formato=srt
+    DELETE /transcripciones/<id>                  Cancelar
+    GET    /salud, GET /metrics
+
+Uso:
+    python -m src.api --host 0.0.0.0 --puerto 8765
+    curl -T audio.mp3 -X POST 'http://127.0.0.1:8765/transcripciones?nombre=audio.mp3'
+    curl -N http://127.0.0.1:8765/transcripciones/<id>/eventos
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+import tempfile
+from http import HTTPStatus
+from urllib.parse import parse_qsl, quote, urlsplit, unquote
+
+from src.config import (
+    API_HOST,
+    API_IDLE_TIMEOUT_S,
+    API_MAX_HEADER_BYTES,
+    API_MAX_PENDING,
+    API_MAX_UPLOADS,
+    API_PORT,
+    API_SSE_HEARTBEAT_S,
+    DECODE_PROFILE,
+    DECODE_PROFILES,
+    IDIOMAS,
+    INGEST_CHUNK_BYTES,
+    MAX_FILE_SIZE_MB,
+    MODELO_POR_DEFECTO,
+    MODELOS_DISPONIBLES,
+    WARMUP_MODEL,
+)
+from src.jobs import COMPLETADO, PENDIENTE, get_job_manager
+from src.metrics import REGISTRY
+from src.segments import SegmentTable
+
+logger = logging.getLogger(__name__)
+
+REGISTRY.counter('api_peticiones_total', 'Peticiones a la API HTTP por ruta y código')
+
+
+class HttpError(Exception):
+    """Error que se devuelve al cliente con su código HTTP"""
+    def __init__(self, status, mensaje=None, cabeceras=None):
+        super().__init__(mensaje or HTTPStatus(status).phrase)
+        self.status = status
+        self.cabeceras = cabeceras or {}
+
+
+class Request:
+    """Línea de petición y cabeceras (en minúsculas) de una petición HTTP"""
+    def __init__(self, metodo, ruta, query, cabeceras):
+        self.metodo = metodo
+        self.ruta = ruta
+        self.query = query
+        self.cabeceras = cabeceras
+
+    @property
+    def keep_alive(self):
+        return self.cabeceras.get('connection', '').lower() != 'close'
+
+
+async def read_request(reader):
+    """
+    Lee la línea de petición y las cabeceras.
+
+    Returns:
+        Request, o None si el cliente cerró la conexión sin enviar nada
+    """
+    try:
+        cabecera = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), API_IDLE_TIMEOUT_S)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise HttpError(400)
+    except asyncio.LimitOverrunError:
+        raise HttpError(431)
+    except asyncio.TimeoutError:
+        return None
+
+    lineas = cabecera.decode('latin-1').split('\r\n')
+    try:
+        metodo, destino, _ = lineas[0].split(' ', 2)
+    except ValueError:
+        raise HttpError(400)
+    cabeceras = {}
+    for linea in lineas[1:]:
+        if linea:
+            nombre, _, valor = linea.partition(':')
+            cabeceras[nombre.strip().lower()] = valor.strip()
+    url = urlsplit(destino)
+    return Request(metodo.upper(), unquote(url.path).rstrip('/') or '/', dict(parse_qsl(url.query)), cabeceras)
+
+
+async def iter_body(reader, request, limite):
+    """
+    Recorre el cuerpo de la petición por bloques (Content-Length o chunked).
+
+    Args:
+        reader (asyncio.StreamReader): Conexión
+        request (Request): Petición ya leída
+        limite (int): Bytes máximos del cuerpo
+
+    Yields:
+        bytes: Bloques de como mucho INGEST_CHUNK_BYTES
+    """
+    async def leer(n):
+        datos = await asyncio.wait_for(reader.read(min(n, INGEST_CHUNK_BYTES)), API_IDLE_TIMEOUT_S)
+        if not datos:
+            raise HttpError(400, 'Cuerpo incompleto')
+        return datos
+
+    total = 0
+    if 'chunked' in request.cabeceras.get('transfer-encoding', '').lower():
+        while True:
+            linea = await asyncio.wait_for(reader.readline(), API_IDLE_TIMEOUT_S)
+            try:
+                pendiente = int(linea.split(b';')[0], 16)
+            except ValueError:
+                raise HttpError(400, 'Bloque chunked mal formado')
+            if pendiente == 0:
+                # Trailers opcionales hasta la línea vacía
+                while (await asyncio.wait_for(reader.readline(), API_IDLE_TIMEOUT_S)) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            total += pendiente
+            if total > limite:
+                raise HttpError(413)
+            while pendiente:
+                datos = await leer(pendiente)
+                pendiente -= len(datos)
+                yield datos
+            await reader.readline()
+    elif 'content-length' in request.cabeceras:
+        try:
+            pendiente = int(request.cabeceras['content-length'])
+        except ValueError:
+            raise HttpError(400, 'Content-Length no válido')
+        if pendiente > limite:
+            raise HttpError(413)
+        while pendiente:
+            datos = await leer(pendiente)
+            pendiente -= len(datos)
+            yield datos
+    else:
+        raise HttpError(411)
+
+
+def _write_block(f, digest, bloque):
+    """Escribe un bloque de la subida y lo añade al hash (en un hilo, fuera del bucle)"""
+    digest.update(bloque)
+    f.write(bloque)
+
+
+class JobEvents:
+    """
+    Eventos SSE de un trabajo, guardados una vez y compartidos por sus suscriptores.
+
+    Solo se modifica desde el bucle de eventos; los hilos de la cola publican
+    con call_soon_threadsafe.
+    """
+    def __init__(self):
+        self.eventos = []  # (tipo, datos en JSON)
+        self.cerrado = False
+        self._cambio = asyncio.Event()
+
+    def publish(self, eventos):
+        self.eventos.extend(eventos)
+        self._despertar()
+
+    def close(self):
+        self.cerrado = True
+        self._despertar()
+
+    def _despertar(self):
+        self._cambio.set()
+        self._cambio = asyncio.Event()
+
+    async def wait(self, cursor, timeout):
+        """Espera a que haya eventos a partir de cursor, a que se cierre o a que pase timeout"""
+        if cursor < len(self.eventos) or self.cerrado:
+            return
+        try:
+            await asyncio.wait_for(self._cambio.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def format(self, desde):
+        """Eventos a partir de desde en el formato de text/event-stream"""
+        return ''.join(
+            f'id: {i}\nevent: {tipo}\ndata: {datos}\n\n'
+            for i, (tipo, datos) in enumerate(self.eventos[desde:], desde)
+        ).encode('utf-8')
+
+
+def _json(datos):
+    return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+def _safe_filename(nombre):
+    """Nombre de archivo sin ruta, caracteres de control, comillas ni barras invertidas"""
+    nombre = os.path.basename(nombre)
+    return ''.join(c for c in nombre if c.isprintable() and c not in '"\\').strip() or 'audio'
+
+
+def _content_disposition(nombre):
+    """
+    Cabecera Content-Disposition de descarga (RFC 6266).
+
+    filename lleva una versión ASCII para clientes antiguos y filename* el
+    nombre completo en UTF-8 codificado con % (RFC 5987).
+    """
+    nombre = _safe_filename(nombre)
+    ascii_ = nombre.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+    return f"attachment; filename=\"{ascii_}\"; filename*=UTF-8''{quote(nombre, safe='')}"
+
+
+class TranscriptionApi:
+    """Servidor HTTP de la API sobre la cola de trabajos del proceso"""
+    def __init__(self, manager=None, max_uploads=API_MAX_UPLOADS, max_pending=API_MAX_PENDING):
+        self.manager = manager or get_job_manager()
+        self.max_pending = max_pending
+        self._uploads = asyncio.Semaphore(max_uploads)
+        self._events = {}  # id del trabajo -> JobEvents
+        self._loop = None
+        self.conexiones = 0
+        self.suscriptores = 0
+        REGISTRY.add_collector(self.collect_metrics)
+
+    def collect_metrics(self):
+        return [
+            ('api_conexiones', 'Conexiones HTTP abiertas', self.conexiones),
+            ('api_suscriptores', 'Clientes recibiendo eventos SSE', self.suscriptores),
+        ]
+
+    async def serve(self, host=API_HOST, port=API_PORT):
+        """Arranca el servidor y atiende peticiones hasta que se cancela"""
+        self._loop = asyncio.get_running_loop()
+        # limit acota el búfer de cada conexión (y con él, el tamaño de las cabeceras)
+        server = await asyncio.start_server(self.handle, host, port, limit=API_MAX_HEADER_BYTES)
+        logger.info('API en http://%s:%d', host, port)
+        purga = asyncio.create_task(self._purge_events())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            purga.cancel()
+
+    async def _purge_events(self):
+        """Olvida los eventos de los trabajos que la cola ya purgó"""
+        while True:
+            await asyncio.sleep(API_IDLE_TIMEOUT_S)
+            for job_id in [j for j in self._events if self.manager.get(j) is None]:
+                del self._events[job_id]
+
+    async def handle(self, reader, writer):
+        """Atiende las peticiones de una conexión (keep-alive) hasta que se cierra"""
+        self.conexiones += 1
+        try:
+            while True:
+                request = None
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    seguir = await self._dispatch(request, reader, writer)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, e.cabeceras, cerrar=True)
+                    self._count(request, e.status)
+                    break
+                if not (seguir and request.keep_alive):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception:
+            logger.exception('Error atendiendo una petición')
+        finally:
+            self.conexiones -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    def _count(self, request, status):
+        ruta = request.ruta.split('/')[1] if request is not None else ''
+        REGISTRY.inc('api_peticiones_total', ruta=ruta or '/', codigo=str(status))
+
+    async def _dispatch(self, request, reader, writer):
+        """Enruta la petición; devuelve False si la conexión debe cerrarse"""
+        partes = [p for p in request.ruta.split('/') if p]
+        metodo = request.metodo
+
+        if partes == ['salud'] and metodo == 'GET':
+            return await self._respond(writer, request, 200, {'estado': 'ok', **self.manager.stats()})
+        if partes == ['metrics'] and metodo == 'GET':
+            cuerpo = REGISTRY.render().encode('utf-8')
+            await self._send(writer, 200, cuerpo, 'text/plain; version=0.0.4; charset=utf-8')
+            self._count(request, 200)
+            return True
+        if partes == ['transcripciones'] and metodo == 'POST':
+            return await self._respond(writer, request, 202, await self._upload(request, reader, writer))
+
+        if len(partes) >= 2 and partes[0] == 'transcripciones':
+            job = self.manager.get(partes[1])
+            if job is None:
+                raise HttpError(404, 'Trabajo no encontrado')
+            accion = partes[2] if len(partes) == 3 else None
+            if accion is None and metodo == 'GET':
+                return await self._respond(writer, request, 200, self._status(job))
+            if accion is None and metodo == 'DELETE':
+                return await self._respond(writer, request, 200, {'cancelado': self.manager.cancel(job.id)})
+            if accion == 'eventos' and metodo == 'GET':
+                self._count(request, 200)
+                await self._stream_events(job, request, writer)
+                return False
+            if accion == 'resultado' and metodo == 'GET':
+                await self._send_result(job, request, writer)
+                self._count(request, 200)
+                return True
+            if len(partes) > 3 or accion not in (None, 'eventos', 'resultado'):
+                raise HttpError(404)
+            raise HttpError(405)
+        raise HttpError(404)
+
+    async def _respond(self, writer, request, status, datos):
+        await self._send_json(writer, status, datos)
+        self._count(request, status)
+        return True
+
+    async def _send(self, writer, status, cuerpo, tipo, cabeceras=None, cerrar=False):
+        lineas = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}', f'Content-Type: {tipo}',
+                  f'Content-Length: {len(cuerpo)}']
+        lineas += [f'{k}: {v}' for k, v in (cabeceras or {}).items()]
+        if cerrar:
+            lineas.append('Connection: close')
+        writer.write(('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1') + cuerpo)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, datos, cabeceras=None, cerrar=False):
+        cuerpo = _json(datos).encode('utf-8')
+        await self._send(writer, status, cuerpo, 'application/json; charset=utf-8', cabeceras, cerrar)
+
+    def _status(self, job):
+        from src.estimator import remaining_seconds
+
+        progreso = job.progreso.snapshot()
+        estimado = job.params.get('estimacion_s')
+        if job.estado == PENDIENTE:
+            restante = estimado
+        elif job.activo:
+            restante = remaining_seconds(estimado, time.time() - job.iniciado, progreso['porcentaje'])
+        else:
+            restante = 0.0
+        return {
+            'id': job.id,
+            'estado': job.estado,
+            'nombre': job.params.get('nombre'),
+            'modelo': job.params.get('modelo'),
+            'posicion': self.manager.queue_position(job.id) if job.estado == PENDIENTE else 0,
+            'diferido': job.diferido,
+            'progreso': progreso,
+            'duracion_s': round(job.duracion, 3),
+            'estimacion_s': None if estimado is None else round(estimado, 1),
+            'restante_s': None if restante is None else round(restante, 1),
+            'error': job.error,
+        }
+
+    def _params(self, request):
+        """Valida los parámetros de una subida"""
+        q = request.query
+        modelo = q.get('modelo', MODELO_POR_DEFECTO)
+        if not MODELOS_DISPONIBLES.get(modelo, {}).get('disponible'):
+            raise HttpError(400, f'Modelo no disponible: {modelo}')
+        idioma = q.get('idioma', 'auto')
+        if idioma not in IDIOMAS:
+            raise HttpError(400, f'Idioma no soportado: {idioma}')
+        perfil = q.get('perfil', DECODE_PROFILE)
+        if perfil not in DECODE_PROFILES:
+            raise HttpError(400, f'Perfil no soportado: {perfil}')
+        return {
+            'nombre': _safe_filename(q.get('nombre', 'audio')),
+            'modelo': modelo,
+            'idioma': None if idioma == 'auto' else idioma,
+            'paralelo': q.get('paralelo') == '1',
+            'cascada': q.get('cascada') == '1',
+            'perfil': perfil,
+            'usuario': request.cabeceras.get('x-usuario') or q.get('usuario') or 'api',
+        }
+
+    async def _upload(self, request, reader, writer):
+        """Recibe el audio a un temporal y encola su transcripción"""
+        from src.cache import cache_key, get_default_cache
+        from src.transcription import model_options
+
+        params = self._params(request)
+        # Admisión antes de leer el cuerpo: con la cola llena no se recibe nada
+        if self.manager.stats()['pendientes'] >= self.max_pending:
+            raise HttpError(503, 'Cola llena', {'Retry-After': '30'})
+
+        loop = asyncio.get_running_loop()
+        async with self._uploads:
+            if request.cabeceras.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                await writer.drain()
+
+            extension = os.path.splitext(params['nombre'])[1]
+            fd, ruta = tempfile.mkstemp(prefix='api-', suffix=extension)
+            digest = hashlib.sha256()
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    bloque = bytearray()
+                    async for datos in iter_body(reader, request, MAX_FILE_SIZE_MB * 1024 * 1024):
+                        bloque += datos
+                        if len(bloque) >= INGEST_CHUNK_BYTES:
+                            await loop.run_in_executor(None, _write_block, f, digest, bloque)
+                            bloque = bytearray()
+                    await loop.run_in_executor(None, _write_block, f, digest, bloque)
+            except BaseException:
+                os.unlink(ruta)
+                raise
+        if os.path.getsize(ruta) == 0:
+            os.unlink(ruta)
+            raise HttpError(400, 'Cuerpo vacío')
+
+        clave = cache_key(digest.hexdigest(), params['modelo'], params['idioma'],
+                          model_options(params['modelo'], cascade=params['cascada'], profile=params['perfil'],
+                                        parallel=params['paralelo']))
+        resultado = await loop.run_in_executor(None, get_default_cache().get, clave)
+        eventos = JobEvents()
+        usuario = params.pop('usuario')
+        # El mismo audio ya en la cola: se devuelve ese trabajo en lugar de repetirlo
+        existente = self.manager.find_active(usuario, clave_cache=clave)
+        if existente is not None and existente.id not in self._events:
+            existente = None
+
+        if resultado is not None:
+            os.unlink(ruta)
+            resultado['segments'] = SegmentTable.from_segments(resultado['segments'])
+            resultado['metadata'] = {'desde_cache': True, 'modo': 'cache'}
+            job_id = self.manager.add_finished(resultado, usuario=usuario, **params)
+            self._events[job_id] = eventos
+            self._finished(job_id)
+        elif existente is not None:
+            os.unlink(ruta)
+            job_id = existente.id
+        else:
+            admision = await loop.run_in_executor(None, self._admit, ruta, params)
+            if not admision['admitido']:
+                os.unlink(ruta)
+                if admision['reintentar_s'] is None:
+                    raise HttpError(422, admision['motivo'])
+                raise HttpError(503, admision['motivo'], {'Retry-After': str(max(1, round(admision['reintentar_s'])))})
+            job_id = self.manager.submit(
+                self._run_job, usuario=usuario, cleanup=self._cleanup, diferido=admision['diferido'],
+                archivo=ruta, clave_cache=clave, eventos=eventos, estimacion_s=admision['proceso_s'], **params
+            )
+            self._events[job_id] = eventos
+
+        job = self.manager.get(job_id)
+        logger.info('API: %s recibido (%s, trabajo %s)', params['nombre'], params['modelo'], job_id[:8])
+        return {
+            'id': job_id,
+            'estado': job.estado,
+            'diferido': job.diferido,
+            'estimacion_s': job.params.get('estimacion_s'),
+            'eventos': f'/transcripciones/{job_id}/eventos',
+            'resultado': f'/transcripciones/{job_id}/resultado',
+        }
+
+    def _admit(self, ruta, params):
+        """Duración del audio y decisión de admisión (en un hilo: llama a ffprobe)"""
+        from src.estimator import admit
+        from src.pipeline import plan_mode
+        from src.utils import get_audio_duration
+
+        duracion = get_audio_duration(ruta)
+        modo = plan_mode(duracion, params['paralelo'], params['cascada']) if duracion else None
+        return admit(self.manager, params['modelo'], duracion, params['perfil'], modo)
+
+    def _run_job(self, job):
+        """Trabajo de la cola: transcribe publicando cada ventana como eventos"""
+        from src.pipeline import transcription_job
+
+        eventos = job.params['eventos']
+
+        def publicar(procesado_s, segmentos):
+            # El JSON se genera en el hilo del trabajo; el bucle solo añade los eventos
+            nuevos = [
+                ('segmento', _json({'start': s['start'], 'end': s['end'], 'text': s['text']}))
+                for s in segmentos
+            ]
+            nuevos.append(('progreso', _json(job.progreso.snapshot())))
+            self._call_in_loop(eventos.publish, nuevos)
+
+        def sustituir(desde, hasta, segmentos):
+            # Cascada: los segmentos refinados ocupan el lugar de los del borrador ya enviados
+            datos = {
+                'desde': desde,
+                'hasta': hasta,
+                'segmentos': [{'start': s['start'], 'end': s['end'], 'text': s['text']} for s in segmentos],
+            }
+            self._call_in_loop(eventos.publish, [('reemplazo', _json(datos))])
+
+        job.progreso.add_window_listener(publicar)
+        job.progreso.add_replace_listener(sustituir)
+        return transcription_job(job)
+
+    def _cleanup(self, job):
+        """Al terminar el trabajo (en su hilo): borra el temporal y cierra sus eventos"""
+        ruta = job.params.pop('archivo', None)
+        if ruta:
+            try:
+                os.unlink(ruta)
+            except OSError:
+                pass
+        self._call_in_loop(self._finished, job.id)
+
+    def _call_in_loop(self, func, *args):
+        try:
+            self._loop.call_soon_threadsafe(func, *args)
+        except RuntimeError:
+            pass  # El bucle ya se cerró
+
+    def _finished(self, job_id):
+        """Publica el evento final del trabajo y cierra su flujo"""
+        job = self.manager.get(job_id)
+        eventos = self._events.get(job_id)
+        if job is None or eventos is None:
+            return
+        final = {'estado': job.estado, 'error': job.error, 'duracion_s': round(job.duracion, 3)}
+        if job.estado == COMPLETADO:
+            final.update(
+                idioma=job.resultado.get('language'),
+                segmentos=len(job.resultado.get('segments', [])),
+                metadata=job.resultado.get('metadata'),
+                resultado=f'/transcripciones/{job_id}/resultado',
+            )
+        eventos.publish([('fin', _json(final))])
+        eventos.close()
+
+    async def _stream_events(self, job, request, writer):
+        """Envía los eventos del trabajo como text/event-stream hasta el evento final"""
+        eventos = self._events.get(job.id)
+        if eventos is None:
+            raise HttpError(404, 'El trabajo no se creó desde la API')
+        try:
+            cursor = max(0, int(request.cabeceras.get('last-event-id', '-1')) + 1)
+        except ValueError:
+            cursor = 0
+        if cursor > len(eventos.eventos):
+            raise HttpError(400, 'Last-Event-ID posterior al último evento')
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n'
+            b'Cache-Control: no-cache\r\nX-Accel-Buffering: no\r\nConnection: close\r\n\r\n'
+            b'retry: 3000\n\n'
+        )
+        self.suscriptores += 1
+        try:
+            while True:
+                if cursor < len(eventos.eventos):
+                    writer.write(eventos.format(cursor))
+                    cursor = len(eventos.eventos)
+                elif eventos.cerrado:
+                    break
+                else:
+                    await eventos.wait(cursor, API_SSE_HEARTBEAT_S)
+                    if cursor < len(eventos.eventos) or eventos.cerrado:
+                        continue
+                    writer.write(b': ping\n\n')
+                # Contrapresión por cliente: no se sigue hasta que su búfer se vacía
+                await writer.drain()
+        finally:
+            self.suscriptores -= 1
+
+    async def _send_result(self, job, request, writer):
+        """Envía el resultado exportado en el formato pedido, por bloques y con Content-Length"""
+        from src.export import EXPORT_FORMATS, write_export
+
+        if job.estado != COMPLETADO:
+            raise HttpError(409, f'El trabajo está en estado {job.estado}')
+        formato = request.query.get('formato', 'jsonl')
+        if formato not in EXPORT_FORMATS:
+            raise HttpError(400, f'Formato no soportado: {formato}')
+
+        info = EXPORT_FORMATS[formato]
+        nombre = os.path.splitext(job.params.get('nombre') or 'audio')[0]
+        loop = asyncio.get_running_loop()
+        # La exportación se genera en un hilo a un temporal (en memoria hasta 8 MB); así se
+        # conoce su tamaño y la conexión puede seguir abierta (keep-alive) tras enviarlo
+        archivo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        try:
+            resultado = job.resultado
+            await loop.run_in_executor(
+                None, write_export, formato, resultado.get('text', ''), resultado.get('segments'), archivo
+            )
+            tamano = archivo.tell()
+            archivo.seek(0)
+            writer.write(
+                f'HTTP/1.1 200 OK\r\nContent-Type: {info["mime"]}\r\nContent-Length: {tamano}\r\n'
+                f'Content-Disposition: {_content_disposition(nombre + "." + info["extension"])}\r\n\r\n'
+                .encode('utf-8')
+            )
+            while True:
+                bloque = await loop.run_in_executor(None, archivo.read, INGEST_CHUNK_BYTES)
+                if not bloque:
+                    break
+                writer.write(bloque)
+                await writer.drain()
+        finally:
+            archivo.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.api',
+        description='API HTTP de transcripción con resultados en streaming (SSE).'
+    )
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--puerto', type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    from src import startup
+    from src.utils import setup_ffmpeg
+
+    if not setup_ffmpeg():
+        logger.error('FFmpeg no está disponible')
+        return 1
+    if WARMUP_MODEL:
+        startup.start_warmup(MODELO_POR_DEFECTO)
+
+    async def arrancar():
+        await TranscriptionApi().serve(args.host, args.puerto)
+
+    try:
+        asyncio.run(arrancar())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
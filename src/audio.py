@@ -0,0 +1,300 @@
+"""
+Ingesta de audio: una sola lectura y una sola decodificación por archivo.
+
+Los bytes subidos se envían por bloques a la entrada estándar de ffmpeg, que
+los decodifica a PCM mono de 16 kHz. Las muestras se escriben como float32 en
+un archivo temporal que se mapea en memoria, así que la duración sale del
+número de muestras (sin ffprobe) y Whisper recibe el array directamente.
+"""
+import os
+import mmap
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+from src.config import INGEST_CHUNK_BYTES
+
+SAMPLE_RATE = 16000  # Frecuencia de muestreo que espera Whisper
+
+# Contenedores que suelen guardar el índice al final y no se pueden leer desde un pipe
+PIPE_UNSAFE_EXTENSIONS = {'mp4', 'm4a', 'mov', '3gp'}
+
+
+class IngestedAudio:
+    """PCM mono float32 a 16 kHz mapeado en memoria desde un archivo temporal"""
+    def __init__(self, ruta_pcm, sha256=None):
+        self.ruta_pcm = ruta_pcm
+        self.sha256 = sha256
+        n_muestras = os.path.getsize(ruta_pcm) // 4
+        if n_muestras:
+            # Copia en escritura: las páginas se comparten y torch acepta el array
+            self.pcm = np.memmap(ruta_pcm, dtype=np.float32, mode='c', shape=(n_muestras,))
+        else:
+            self.pcm = np.zeros(0, dtype=np.float32)
+
+    @property
+    def duracion(self):
+        """Duración en segundos calculada a partir del número de muestras"""
+        return len(self.pcm) / SAMPLE_RATE
+
+    def close(self):
+        """Libera el mapeo y borra el archivo temporal"""
+        self.pcm = np.zeros(0, dtype=np.float32)
+        try:
+            os.unlink(self.ruta_pcm)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _ffmpeg_command(entrada):
+    """Comando de ffmpeg equivalente al de whisper.audio.load_audio"""
+    return [
+        'ffmpeg', '-nostdin', '-threads', '0', '-loglevel', 'error',
+        '-i', entrada,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE),
+        'pipe:1',
+    ]
+
+
+def _run_decoder(cmd, feed=None, chunk_size=INGEST_CHUNK_BYTES):
+    """
+    Ejecuta ffmpeg y vuelca su salida como float32 en un archivo temporal.
+
+    Args:
+        cmd (list): Comando de ffmpeg que escribe PCM s16le en stdout
+        feed (callable): Recibe stdin de ffmpeg y escribe la entrada (opcional)
+        chunk_size (int): Bytes leídos de ffmpeg en cada iteración
+
+    Returns:
+        str: Ruta del archivo con las muestras float32
+    """
+    fd, ruta_pcm = tempfile.mkstemp(suffix='.f32')
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if feed else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    errores = []
+    lector_errores = threading.Thread(target=lambda: errores.append(proc.stderr.read()), daemon=True)
+    lector_errores.start()
+
+    fallos_entrada = []
+    alimentador = None
+    if feed:
+        def alimentar():
+            try:
+                feed(proc.stdin)
+            except Exception as e:
+                fallos_entrada.append(e)
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        alimentador = threading.Thread(target=alimentar, daemon=True)
+        alimentador.start()
+
+    try:
+        resto = b''
+        with os.fdopen(fd, 'wb') as salida:
+            while True:
+                datos = proc.stdout.read(chunk_size)
+                if not datos:
+                    break
+                datos = resto + datos
+                util = len(datos) - len(datos) % 2
+                resto = datos[util:]
+                muestras = np.frombuffer(datos[:util], dtype=np.int16).astype(np.float32) / 32768.0
+                salida.write(muestras.tobytes())
+
+        proc.wait()
+        if alimentador is not None:
+            alimentador.join()
+        lector_errores.join()
+
+        if fallos_entrada:
+            raise fallos_entrada[0]
+        if proc.returncode != 0:
+            mensaje = b''.join(errores).decode(errors='replace').strip()
+            raise RuntimeError(f'Failed to load audio: {mensaje}')
+    except BaseException:
+        proc.kill()
+        try:
+            os.unlink(ruta_pcm)
+        except OSError:
+            pass
+        raise
+
+    return ruta_pcm
+
+
+def stream_pcm(path, chunk_size=INGEST_CHUNK_BYTES):
+    """
+    Decodifica un archivo con ffmpeg y entrega el PCM por bloques, sin guardarlo.
+
+    Args:
+        path (str): Ruta del archivo de audio
+        chunk_size (int): Bytes leídos de ffmpeg en cada iteración
+
+    Yields:
+        np.ndarray: Bloques de muestras float32 mono a 16 kHz
+    """
+    proc = subprocess.Popen(
+        _ffmpeg_command(path),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    errores = []
+    lector_errores = threading.Thread(target=lambda: errores.append(proc.stderr.read()), daemon=True)
+    lector_errores.start()
+
+    try:
+        resto = b''
+        while True:
+            datos = proc.stdout.read(chunk_size)
+            if not datos:
+                break
+            datos = resto + datos
+            util = len(datos) - len(datos) % 2
+            resto = datos[util:]
+            yield np.frombuffer(datos[:util], dtype=np.int16).astype(np.float32) / 32768.0
+
+        proc.wait()
+        lector_errores.join()
+        if proc.returncode != 0:
+            mensaje = b''.join(errores).decode(errors='replace').strip()
+            raise RuntimeError(f'Failed to load audio: {mensaje}')
+    finally:
+        # Si quien consume deja de pedir bloques, ffmpeg no debe quedarse bloqueado escribiendo
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+
+def read_samples(audio, a, b):
+    """
+    Copia las muestras [a, b) de un array de audio.
+
+    De un np.memmap (como IngestedAudio.pcm) se leen del archivo con una lectura
+    normal en lugar de tocar las páginas del mapeo: recorrer así un audio de
+    varias horas no hace crecer la memoria residente del proceso.
+
+    Args:
+        audio: Array float32, np.memmap o tensor de muestras
+        a (int): Primera muestra
+        b (int): Muestra final (exclusiva)
+
+    Returns:
+        np.ndarray: Muestras float32 (una copia)
+    """
+    a, b = max(0, a), min(len(audio), b)
+    if b <= a:
+        return np.zeros(0, dtype=np.float32)
+    # Solo el mapeo original: una vista recortada conserva el offset del padre
+    if isinstance(audio, np.memmap) and isinstance(audio.base, mmap.mmap) and audio.dtype == np.float32:
+        return np.fromfile(audio.filename, dtype=np.float32, count=b - a, offset=audio.offset + a * 4)
+    return np.array(audio[a:b], dtype=np.float32)
+
+
+def decode_file(path):
+    """Decodifica un archivo en disco (ffmpeg lo lee directamente)"""
+    return IngestedAudio(_run_decoder(_ffmpeg_command(path)))
+
+
+def decode_stream(fileobj, extension=None, compute_hash=False, chunk_size=INGEST_CHUNK_BYTES):
+    """
+    Decodifica un archivo abierto enviándolo por bloques a ffmpeg.
+
+    Args:
+        fileobj: Objeto con read() (por ejemplo, el UploadedFile de Streamlit)
+        extension (str): Extensión original, para detectar contenedores no leíbles por pipe
+        compute_hash (bool): Calcular el SHA-256 de los bytes durante la lectura
+        chunk_size (int): Tamaño de los bloques enviados a ffmpeg
+
+    Returns:
+        IngestedAudio: PCM decodificado (con sha256 si se pidió)
+    """
+    digest = hashlib.sha256() if compute_hash else None
+    seekable = hasattr(fileobj, 'seek')
+    if seekable:
+        fileobj.seek(0)
+
+    extension = (extension or '').lower().lstrip('.')
+    if extension in PIPE_UNSAFE_EXTENSIONS:
+        return _decode_spooled(fileobj, digest, chunk_size)
+
+    def feed(stdin):
+        try:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+                if digest is not None:
+                    digest.update(chunk)
+                stdin.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg dejó de leer; el resto solo se consume para completar el hash
+            if digest is not None:
+                for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+                    digest.update(chunk)
+
+    try:
+        ruta_pcm = _run_decoder(_ffmpeg_command('pipe:0'), feed, chunk_size)
+    except RuntimeError:
+        if not seekable:
+            raise
+        # Algunos contenedores necesitan poder saltar dentro del archivo
+        fileobj.seek(0)
+        return _decode_spooled(fileobj, hashlib.sha256() if compute_hash else None, chunk_size)
+
+    return IngestedAudio(ruta_pcm, digest.hexdigest() if digest is not None else None)
+
+
+def _decode_spooled(fileobj, digest, chunk_size):
+    """Copia la entrada a un temporal (calculando el hash) y decodifica desde disco"""
+    fd, ruta = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+                if digest is not None:
+                    digest.update(chunk)
+                f.write(chunk)
+
+        audio = decode_file(ruta)
+        audio.sha256 = digest.hexdigest() if digest is not None else None
+        return audio
+    finally:
+        try:
+            os.unlink(ruta)
+        except OSError:
+            pass
+
+
+def ingest(source, name=None, compute_hash=False):
+    """
+    Decodifica una ruta o un archivo abierto a PCM mapeado en memoria.
+
+    Args:
+        source: Ruta (str) o objeto con read()
+        name (str): Nombre original del archivo (para conocer su extensión)
+        compute_hash (bool): Calcular el SHA-256 al leer un archivo abierto
+
+    Returns:
+        IngestedAudio: Audio decodificado; llamar a close() al terminar
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return decode_file(os.fspath(source))
+
+    extension = os.path.splitext(name or getattr(source, 'name', '') or '')[1]
+    return decode_stream(source, extension, compute_hash)
@@ -0,0 +1,421 @@
+"""
+Transcripción por lotes desde la línea de comandos.
+
+Recorre directorios o lee un manifiesto, reparte los archivos entre varios
+procesos que cargan el modelo una sola vez y escribe por cada archivo las
+exportaciones pedidas, más un resumen JSONL con los tiempos de cada uno.
+Con --reanudar se saltan los archivos que ya terminaron en una ejecución previa.
+Cada transcripción se añade al archivo con búsqueda (ver src/store.py).
+
+Uso:
+    python -m src.batch grabaciones/ --modelo base --idioma es --formatos txt,srt --salida transcripciones/
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.config import (
+    DECODE_BATCH_SIZE,
+    DECODE_PROFILE,
+    DECODE_PROFILES,
+    FORMATOS_AUDIO,
+    MODELOS_DISPONIBLES,
+    IDIOMAS,
+    STORE_ENABLED,
+)
+from src.export import EXPORT_FORMATS, write_export
+
+logger = logging.getLogger(__name__)
+
+RESUMEN_POR_DEFECTO = 'resumen.jsonl'
+
+# Modelo y nombre cargados en cada proceso (una vez para toda la ejecución)
+_modelo = None
+_nombre_modelo = None
+
+
+def _init_worker(model_name, threads=None):
+    """Carga el modelo en el proceso actual"""
+    global _modelo, _nombre_modelo
+    from src.transcription import load_whisper_model
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    _modelo = load_whisper_model(model_name)
+    if _modelo is None:
+        raise RuntimeError(f'No se pudo cargar el modelo {model_name}')
+    _nombre_modelo = model_name
+
+
+def find_audio_files(entradas, manifiesto=None):
+    """
+    Lista los archivos de audio a procesar.
+
+    Args:
+        entradas (list): Archivos o directorios (los directorios se recorren recursivamente)
+        manifiesto (str): Archivo con una ruta por línea (opcional)
+
+    Returns:
+        list: Tuplas (ruta, ruta_relativa) sin duplicados y en orden estable
+    """
+    extensiones = {f'.{ext}' for ext in FORMATOS_AUDIO}
+    archivos = []
+
+    rutas = list(entradas)
+    if manifiesto:
+        base = os.path.dirname(os.path.abspath(manifiesto))
+        with open(manifiesto, 'r', encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if linea and not linea.startswith('#'):
+                    rutas.append(linea if os.path.isabs(linea) else os.path.join(base, linea))
+
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for raiz, dirs, nombres in os.walk(ruta):
+                dirs.sort()
+                for nombre in sorted(nombres):
+                    if os.path.splitext(nombre)[1].lower() in extensiones:
+                        completa = os.path.join(raiz, nombre)
+                        archivos.append((completa, os.path.relpath(completa, ruta)))
+        elif os.path.isfile(ruta):
+            archivos.append((ruta, os.path.basename(ruta)))
+        else:
+            logger.warning('No existe: %s', ruta)
+
+    vistos = set()
+    unicos = []
+    for ruta, relativa in archivos:
+        clave = os.path.abspath(ruta)
+        if clave not in vistos:
+            vistos.add(clave)
+            unicos.append((ruta, relativa))
+    return unicos
+
+
+def _file_signature(ruta):
+    """Tamaño y fecha de modificación, para saber si un archivo cambió desde la última ejecución"""
+    stat = os.stat(ruta)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def load_completed(resumen):
+    """Lee un resumen previo y devuelve {ruta_absoluta: registro} de los archivos terminados"""
+    completados = {}
+    if not os.path.exists(resumen):
+        return completados
+
+    with open(resumen, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue  # Línea truncada por una ejecución interrumpida
+            if registro.get('estado') == 'ok':
+                completados[registro['archivo']] = registro
+    return completados
+
+
+def _is_done(ruta, completados):
+    """Un archivo está hecho si terminó bien, no ha cambiado y sus salidas existen"""
+    registro = completados.get(os.path.abspath(ruta))
+    if registro is None:
+        return False
+    tamano, mtime = _file_signature(ruta)
+    if registro.get('tamano') != tamano or registro.get('mtime') != mtime:
+        return False
+    return all(os.path.exists(salida) for salida in registro.get('salidas', []))
+
+
+def _write_atomic(ruta, fmt, texto, segmentos):
+    """Escribe una exportación en un temporal y la mueve a su sitio al terminar"""
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'wb') as f:
+        write_export(fmt, texto, segmentos, f)
+    os.replace(temporal, ruta)
+
+
+def process_file(ruta, relativa, salida, formatos, idioma=None, usar_cache=True, perfil=None):
+    """
+    Transcribe un archivo con el modelo del proceso y escribe sus exportaciones.
+
+    Returns:
+        dict: Registro para el resumen JSONL con estado, salidas y tiempos por etapa
+    """
+    return process_files([(ruta, relativa)], salida, formatos, idioma, usar_cache, perfil=perfil)[0]
+
+
+def process_files(archivos, salida, formatos, idioma=None, usar_cache=True, lote=1, perfil=None):
+    """
+    Transcribe un grupo de archivos con el modelo del proceso y escribe sus exportaciones.
+
+    Con lote > 1 las ventanas de todos los archivos del grupo que no están en
+    caché se decodifican juntas en lotes de ese tamaño; el tiempo de
+    transcripción se reparte entre ellos en proporción a su duración.
+
+    Args:
+        archivos (list): Tuplas (ruta, ruta relativa para la salida)
+        lote (int): Ventanas por lote (1 = bucle secuencial por archivo)
+        perfil (str): Perfil de decodificación (None: DECODE_PROFILE)
+
+    Returns:
+        list: Un registro por archivo para el resumen JSONL
+    """
+    from src.audio import decode_file
+    from src.cache import get_default_cache, cache_key, hash_file
+    from src.checkpoint import Checkpoint
+    from src.metrics import StageTimer
+    from src.segments import SegmentTable
+    from src.store import index_result
+    from src.transcription import transcribe_audio, transcribe_audio_batched, model_options
+
+    cache = get_default_cache() if usar_cache else None
+    trabajos = []
+    for ruta, relativa in archivos:
+        inicio = time.perf_counter()
+        tamano, mtime = _file_signature(ruta)
+        trabajo = {
+            'relativa': relativa,
+            'inicio': inicio,
+            'tiempos': {},
+            'registro': {
+                'archivo': os.path.abspath(ruta),
+                'modelo': _nombre_modelo,
+                'tamano': tamano,
+                'mtime': mtime,
+                'perfil': perfil or DECODE_PROFILE,
+                'pid': os.getpid(),
+            },
+            'resultado': None,
+            'audio': None,
+        }
+        trabajos.append(trabajo)
+        try:
+            if usar_cache:
+                t = time.perf_counter()
+                trabajo['clave'] = cache_key(hash_file(ruta), _nombre_modelo, idioma,
+                                             model_options(_nombre_modelo, batched=lote > 1, profile=perfil))
+                trabajo['resultado'] = cache.get(trabajo['clave'])
+                trabajo['tiempos']['cache'] = time.perf_counter() - t
+
+            trabajo['registro']['desde_cache'] = trabajo['resultado'] is not None
+            if trabajo['resultado'] is None:
+                t = time.perf_counter()
+                trabajo['audio'] = decode_file(ruta)
+                trabajo['tiempos']['decodificacion'] = time.perf_counter() - t
+        except Exception as e:
+            trabajo['error'] = str(e)
+
+    pendientes = [trabajo for trabajo in trabajos if trabajo['audio'] is not None]
+    try:
+        if lote > 1 and pendientes:
+            t = time.perf_counter()
+            timer = StageTimer()
+            try:
+                resultados = transcribe_audio_batched(
+                    _modelo, [trabajo['audio'].pcm for trabajo in pendientes], idioma, timer=timer, batch_size=lote,
+                    profile=perfil,
+                )
+            except Exception as e:
+                for trabajo in pendientes:
+                    trabajo['error'] = str(e)
+            else:
+                total = time.perf_counter() - t
+                duracion_total = sum(trabajo['audio'].duracion for trabajo in pendientes) or 1.0
+                for trabajo, resultado in zip(pendientes, resultados):
+                    trabajo['resultado'] = resultado
+                    trabajo['tiempos']['transcripcion'] = total * trabajo['audio'].duracion / duracion_total
+                    trabajo['registro']['etapas'] = timer.etapas
+                    trabajo['registro']['contadores'] = timer.contadores
+                    trabajo['registro']['lote'] = len(pendientes)
+        else:
+            for trabajo in pendientes:
+                t = time.perf_counter()
+                timer = StageTimer()
+                checkpoint = Checkpoint(trabajo['clave']) if usar_cache else None
+                try:
+                    trabajo['resultado'] = transcribe_audio(
+                        _modelo, trabajo['audio'].pcm, idioma, timer=timer, checkpoint=checkpoint, profile=perfil
+                    )
+                except Exception as e:
+                    trabajo['error'] = str(e)
+                    continue
+                finally:
+                    if checkpoint is not None:
+                        checkpoint.close()
+                trabajo['tiempos']['transcripcion'] = time.perf_counter() - t
+                trabajo['registro']['etapas'] = timer.etapas
+                trabajo['registro']['contadores'] = timer.contadores
+    finally:
+        for trabajo in pendientes:
+            trabajo['duracion'] = trabajo['audio'].duracion
+            trabajo['audio'].close()
+
+    registros = []
+    for trabajo in trabajos:
+        registro, tiempos, resultado = trabajo['registro'], trabajo['tiempos'], trabajo['resultado']
+        try:
+            if 'error' in trabajo:
+                raise RuntimeError(trabajo['error'])
+            duracion = trabajo.get('duracion')
+            if duracion is not None:
+                registro['silencio_omitido_s'] = resultado.get('vad', {}).get('omitido_s', 0.0)
+                registro['fallbacks'] = resultado.get('fallbacks')
+                if usar_cache:
+                    cache.put(trabajo['clave'], resultado)
+                    Checkpoint(trabajo['clave']).discard()
+            resultado['segments'] = SegmentTable.from_segments(resultado['segments'])
+
+            t = time.perf_counter()
+            base = os.path.join(salida, os.path.splitext(trabajo['relativa'])[0])
+            salidas = []
+            for fmt in formatos:
+                destino = f"{base}.{EXPORT_FORMATS[fmt]['extension']}"
+                _write_atomic(destino, fmt, resultado['text'], resultado['segments'])
+                salidas.append(os.path.abspath(destino))
+            tiempos['exportacion'] = time.perf_counter() - t
+
+            if STORE_ENABLED:
+                index_result(resultado, trabajo['relativa'], clave=trabajo.get('clave'),
+                             ruta=registro['archivo'], modelo=_nombre_modelo, duracion=duracion)
+
+            registro.update({
+                'estado': 'ok',
+                'idioma': resultado['language'],
+                'segmentos': len(resultado['segments']),
+                'duracion_audio': duracion,
+                'salidas': salidas,
+            })
+            if duracion and 'transcripcion' in tiempos:
+                registro['rtf'] = tiempos['transcripcion'] / duracion
+        except Exception as e:
+            registro.update({'estado': 'error', 'error': str(e)})
+
+        tiempos['total'] = time.perf_counter() - trabajo['inicio']
+        registro['tiempos'] = tiempos
+        registros.append(registro)
+    return registros
+
+
+def run_batch(archivos, modelo, salida, formatos, idioma=None, procesos=1,
+              resumen=None, reanudar=False, usar_cache=True, lote=1, perfil=None):
+    """
+    Procesa una lista de archivos y va añadiendo cada resultado al resumen JSONL.
+
+    Con lote > 1 los archivos se agrupan de lote en lote y las ventanas de cada
+    grupo se decodifican juntas (ver src/batched.py).
+
+    Returns:
+        dict: Contadores de archivos procesados, saltados y con error
+    """
+    resumen = resumen or os.path.join(salida, RESUMEN_POR_DEFECTO)
+    os.makedirs(os.path.dirname(os.path.abspath(resumen)), exist_ok=True)
+    if usar_cache:
+        from src.checkpoint import purge_stale
+        purge_stale()
+
+    if reanudar:
+        completados = load_completed(resumen)
+        pendientes = [(r, rel) for r, rel in archivos if not _is_done(r, completados)]
+    else:
+        pendientes = list(archivos)
+
+    contadores = {'total': len(archivos), 'saltados': len(archivos) - len(pendientes), 'ok': 0, 'error': 0}
+    logger.info('%d archivos, %d ya hechos, %d pendientes', len(archivos), contadores['saltados'], len(pendientes))
+
+    # El resumen se abre en modo append y se vuelca tras cada archivo para poder reanudar
+    with open(resumen, 'a', encoding='utf-8') as f_resumen:
+        def registrar(registro):
+            contadores[registro['estado']] += 1
+            f_resumen.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            f_resumen.flush()
+            logger.info(
+                '[%d/%d] %s: %s (%.1f s)',
+                contadores['ok'] + contadores['error'], len(pendientes),
+                registro['archivo'], registro['estado'], registro['tiempos']['total']
+            )
+
+        grupos = [pendientes[i:i + lote] for i in range(0, len(pendientes), lote)]
+        if procesos <= 1:
+            _init_worker(modelo)
+            for grupo in grupos:
+                for registro in process_files(grupo, salida, formatos, idioma, usar_cache, lote, perfil):
+                    registrar(registro)
+        else:
+            hilos = max(1, (os.cpu_count() or 1) // procesos)
+            with ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(modelo, hilos),
+            ) as pool:
+                futures = [
+                    pool.submit(process_files, grupo, salida, formatos, idioma, usar_cache, lote, perfil)
+                    for grupo in grupos
+                ]
+                for future in as_completed(futures):
+                    for registro in future.result():
+                        registrar(registro)
+
+    return contadores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.batch',
+        description='Transcribe por lotes archivos de audio con Whisper.'
+    )
+    parser.add_argument('entradas', nargs='*', help='Archivos o directorios de audio')
+    parser.add_argument('--manifiesto', help='Archivo con una ruta de audio por línea')
+    parser.add_argument('--modelo', default='base', choices=list(MODELOS_DISPONIBLES.keys()))
+    parser.add_argument('--idioma', default='auto', choices=list(IDIOMAS.keys()))
+    parser.add_argument('--formatos', default='txt', help='Formatos separados por comas: ' + ','.join(EXPORT_FORMATS))
+    parser.add_argument('--salida', default='transcripciones', help='Directorio de salida')
+    parser.add_argument('--procesos', type=int, default=1, help='Procesos en paralelo (cada uno con su modelo)')
+    parser.add_argument('--resumen', help=f'Resumen JSONL (por defecto <salida>/{RESUMEN_POR_DEFECTO})')
+    parser.add_argument('--reanudar', action='store_true', help='Saltar los archivos ya procesados según el resumen')
+    parser.add_argument('--sin-cache', action='store_true', help='No consultar ni guardar la caché de resultados')
+    parser.add_argument('--lote', type=int, default=DECODE_BATCH_SIZE,
+                        help='Ventanas decodificadas a la vez, también entre archivos (1 = secuencial)')
+    parser.add_argument('--perfil', default=DECODE_PROFILE, choices=list(DECODE_PROFILES.keys()),
+                        help='Perfil de decodificación: velocidad frente a calidad')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    formatos = [fmt.strip() for fmt in args.formatos.split(',') if fmt.strip()]
+    desconocidos = [fmt for fmt in formatos if fmt not in EXPORT_FORMATS]
+    if desconocidos:
+        parser.error(f'Formatos no soportados: {", ".join(desconocidos)}')
+
+    archivos = find_audio_files(args.entradas, args.manifiesto)
+    if not archivos:
+        parser.error('No se encontraron archivos de audio')
+
+    contadores = run_batch(
+        archivos,
+        args.modelo,
+        args.salida,
+        formatos,
+        idioma=None if args.idioma == 'auto' else args.idioma,
+        procesos=args.procesos,
+        resumen=args.resumen,
+        reanudar=args.reanudar,
+        usar_cache=not args.sin_cache,
+        lote=max(1, args.lote),
+        perfil=args.perfil,
+    )
+    logger.info('Terminado: %s', contadores)
+    return 1 if contadores['error'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
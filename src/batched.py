@@ -0,0 +1,291 @@
+"""
+Transcripción por lotes de ventanas de 30 segundos.
+
+El bucle de decoding.py pasa por el encoder y el decoder una ventana cada vez,
+y cada ventana depende de dónde terminó la anterior. Aquí las ventanas se
+cortan de antemano (agrupando las regiones con voz si hay detección de voz, y
+cortando en el punto más silencioso las regiones de más de 30 s) y son
+independientes: sin el texto anterior como prompt. Así las ventanas de un
+audio largo, o de varios archivos, se apilan en lotes de DECODE_BATCH_SIZE que
+pasan juntos por el encoder y se decodifican a la vez, aprovechando mucho mejor
+las multiplicaciones de matrices en CPU. Los reintentos por temperatura se
+repiten solo con las ventanas que los necesitan, también en lote, con el mismo
+límite por ventana y de tiempo total que el bucle secuencial (FallbackBudget).
+"""
+import time
+
+import numpy as np
+import torch
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import exact_div
+
+from src.config import DECODE_BATCH_SIZE, VAD_ENABLED, VAD_MIN_SKIP_FRACTION
+from src.decoding import (
+    DEFAULT_TEMPERATURES,
+    FallbackBudget,
+    build_segment,
+    is_silent,
+    needs_fallback,
+    split_segments,
+    temperature_options,
+)
+from src.metrics import NULL_TIMER
+
+CUT_SEARCH_S = 5.0  # Margen antes del límite de 30 s en el que buscar un corte en silencio
+CUT_FRAME_S = 0.1  # Frames de energía para elegir el corte
+
+
+def _quiet_cut(audio, lo, hi):
+    """Muestra con menos energía entre lo y hi (frames de 100 ms)"""
+    frame = int(SAMPLE_RATE * CUT_FRAME_S)
+    n = (hi - lo) // frame
+    if n < 2:
+        return hi
+    bloque = np.asarray(audio[lo:lo + n * frame], dtype=np.float32).reshape(n, frame)
+    energia = np.einsum('ij,ij->i', bloque, bloque)
+    return lo + int(np.argmin(energia[1:]) + 1) * frame
+
+
+def plan_windows(audio, regiones=None, window=N_SAMPLES, search_s=CUT_SEARCH_S):
+    """
+    Corta el audio en ventanas independientes de como mucho 30 s.
+
+    Las regiones consecutivas se agrupan mientras quepan en una ventana (los
+    silencios cortos entre ellas se mantienen); una región más larga se corta
+    en el punto más silencioso de los últimos search_s segundos de cada ventana.
+
+    Args:
+        audio (np.ndarray): Audio mono a 16 kHz
+        regiones (list): (inicio, fin) en muestras con voz, o None para todo el audio
+        window (int): Muestras máximas por ventana
+        search_s (float): Margen para buscar el corte en silencio
+
+    Returns:
+        list: Tuplas (inicio, fin) en muestras, ordenadas
+    """
+    if regiones is None:
+        regiones = [(0, len(audio))] if len(audio) else []
+    margen = int(search_s * SAMPLE_RATE)
+
+    ventanas = []
+    actual = None
+    for a, b in regiones:
+        if actual is not None and b - actual[0] <= window:
+            actual = (actual[0], b)
+            continue
+        if actual is not None:
+            ventanas.append(actual)
+        while b - a > window:
+            corte = _quiet_cut(audio, a + window - margen, a + window)
+            ventanas.append((a, corte))
+            a = corte
+        actual = (a, b)
+    if actual is not None:
+        ventanas.append(actual)
+    return ventanas
+
+
+class _File:
+    """Estado de un archivo dentro del lote"""
+    def __init__(self, audio, language, progress):
+        self.audio = audio
+        self.language = language
+        self.progress = progress
+        self.segments = []
+        self.vad = None
+        self.fallbacks = FallbackBudget()  # Solo cuenta los reintentos de sus ventanas
+
+
+def transcribe_batch(model, audios, language=None, progress=None, timer=None, vad=VAD_ENABLED,
+                     batch_size=DECODE_BATCH_SIZE,
+                     temperature=DEFAULT_TEMPERATURES,
+                     compression_ratio_threshold=2.4,
+                     logprob_threshold=-1.0,
+                     no_speech_threshold=0.6,
+                     max_fallbacks=None,
+                     fallback_budget_s=None,
+                     **decode_options):
+    """
+    Transcribe uno o varios audios decodificando sus ventanas en lotes.
+
+    Args:
+        model: Modelo de Whisper cargado
+        audios (list): Arrays PCM a 16 kHz (por ejemplo, IngestedAudio.pcm)
+        language: Idioma común, lista con uno por audio, o None/'auto' para auto-detección
+        progress (list): ProgressTracker por audio, o None (opcional)
+        timer: StageTimer que acumula mel, encoder, idioma y decodificación (opcional)
+        vad (bool): Cortar las ventanas sobre las regiones con voz y saltar el silencio
+        batch_size (int): Ventanas por pasada del encoder y del decoder
+        temperature: Temperatura o secuencia de temperaturas de reintento
+        compression_ratio_threshold (float): Reintentar si el texto es demasiado repetitivo
+        logprob_threshold (float): Reintentar si la log-probabilidad media es menor
+        no_speech_threshold (float): Saltar la ventana si parece silencio
+        max_fallbacks (int): Reintentos máximos por ventana (None: todas las temperaturas)
+        fallback_budget_s (float): Segundos máximos en reintentos en toda la llamada (None: sin límite)
+        **decode_options: Opciones para whisper.DecodingOptions (fp16, beam_size...)
+
+    Returns:
+        list: Un resultado por audio con 'text', 'segments' y 'language' como
+            whisper.transcribe y 'fallbacks' con sus reintentos; con vad, también
+            'vad' con el audio omitido
+    """
+    timer = timer or NULL_TIMER
+    if model.device == torch.device('cpu'):
+        decode_options['fp16'] = False
+    dtype = torch.float16 if decode_options.get('fp16', True) else torch.float32
+    temperatures = [temperature] if isinstance(temperature, (int, float)) else list(temperature)
+    budget = FallbackBudget(max_fallbacks, fallback_budget_s)
+
+    languages = language if isinstance(language, (list, tuple)) else [language] * len(audios)
+    trackers = progress or [None] * len(audios)
+    files = [
+        _File(audio, None if lang in (None, 'auto') else lang, tracker)
+        for audio, lang, tracker in zip(audios, languages, trackers)
+    ]
+    if not model.is_multilingual:
+        for f in files:
+            f.language = 'en'
+
+    # Ventanas de todos los archivos, en orden: (archivo, inicio, fin)
+    ventanas = []
+    for f in files:
+        regiones = None
+        if vad:
+            from src.vad import SpeechMap, detect_speech
+
+            with timer.stage('vad'):
+                speech_map = SpeechMap(detect_speech(f.audio), len(f.audio))
+            if speech_map.skipped_fraction >= VAD_MIN_SKIP_FRACTION and speech_map.voiced_samples:
+                regiones = speech_map.regiones
+                f.vad = {
+                    'omitido_s': speech_map.skipped_s,
+                    'fraccion_omitida': speech_map.skipped_fraction,
+                    'regiones': len(regiones),
+                }
+        ventanas.extend((f, a, b) for a, b in plan_windows(f.audio, regiones))
+        if f.progress is not None:
+            f.progress.set_total(len(f.audio) / SAMPLE_RATE)
+
+    input_stride = exact_div(N_FRAMES, model.dims.n_audio_ctx)
+    time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+    tokenizers = {}
+
+    def tokenizer_for(lang):
+        if lang not in tokenizers:
+            tokenizers[lang] = get_tokenizer(
+                model.is_multilingual, num_languages=model.num_languages,
+                language=lang, task=decode_options.get('task', 'transcribe'),
+            )
+        return tokenizers[lang]
+
+    def decode_with_fallback(features, lang, archivos):
+        """Decodifica un lote y repite con más temperatura solo las ventanas que lo necesitan"""
+        options = {**decode_options, 'language': lang}
+        results = [None] * len(features)
+        pendientes = list(range(len(features)))
+        for intento, t in enumerate(temperatures):
+            if intento:
+                if not budget.allows(intento):
+                    budget.deny(len(pendientes))
+                    timer.count('fallbacks_agotados', len(pendientes))
+                    for i in pendientes:
+                        archivos[i].fallbacks.deny()
+                    break
+                timer.count('fallbacks', len(pendientes))
+            inicio = time.perf_counter()
+            with timer.stage('decodificacion'):
+                salida = model.decode(features[pendientes], temperature_options(options, t))
+            if intento:
+                segundos = time.perf_counter() - inicio
+                budget.record(segundos, len(pendientes))
+                for i in pendientes:
+                    archivos[i].fallbacks.record(segundos / len(pendientes))
+            siguientes = []
+            for i, result in zip(pendientes, salida):
+                results[i] = result
+                if needs_fallback(result, compression_ratio_threshold, logprob_threshold, no_speech_threshold):
+                    siguientes.append(i)
+            pendientes = siguientes
+            if not pendientes:
+                break
+        return results
+
+    for inicio in range(0, len(ventanas), batch_size):
+        lote = ventanas[inicio:inicio + batch_size]
+        timer.count('lotes')
+        timer.count('ventanas', len(lote))
+
+        # La normalización del mel es por ventana, no sobre todo el audio
+        with timer.stage('mel'):
+            mels = torch.stack([
+                pad_or_trim(log_mel_spectrogram(
+                    np.asarray(f.audio[a:b], dtype=np.float32), model.dims.n_mels, padding=N_SAMPLES
+                ), N_FRAMES)
+                for f, a, b in lote
+            ]).to(model.device).to(dtype)
+        with torch.no_grad(), timer.stage('encoder'):
+            features = model.embed_audio(mels)
+
+        # Idioma de cada archivo con la primera ventana que llega sin él
+        sin_idioma = {}
+        for k, (f, _, _) in enumerate(lote):
+            if f.language is None and id(f) not in sin_idioma:
+                sin_idioma[id(f)] = (k, f)
+        if sin_idioma:
+            indices = [k for k, _ in sin_idioma.values()]
+            with timer.stage('idioma'):
+                _, probs = model.detect_language(features[indices])
+            for (_, f), p in zip(sin_idioma.values(), probs):
+                f.language = max(p, key=p.get)
+
+        # Un lote con varios idiomas se decodifica en un grupo por idioma
+        grupos = {}
+        for k, (f, _, _) in enumerate(lote):
+            grupos.setdefault(f.language, []).append(k)
+        results = [None] * len(lote)
+        for lang, indices in grupos.items():
+            archivos = [lote[k][0] for k in indices]
+            for k, result in zip(indices, decode_with_fallback(features[indices], lang, archivos)):
+                results[k] = result
+
+        for (f, a, b), result in zip(lote, results):
+            nuevos = []
+            if not is_silent(result, no_speech_threshold, logprob_threshold):
+                tokenizer = tokenizer_for(f.language)
+                tokens = torch.tensor(result.tokens)
+                segment_size = min(N_FRAMES, (b - a) // HOP_LENGTH)
+                time_offset = a / SAMPLE_RATE
+                pieces, _ = split_segments(
+                    tokens, tokenizer, time_offset, segment_size, input_stride, time_precision
+                )
+                # La ventana no se repite desde la última marca: el texto sin cerrar se conserva
+                usados = sum(len(piece[2]) for piece in pieces)
+                if usados < len(tokens):
+                    desde = pieces[-1][1] if usados else time_offset
+                    pieces.append((desde, b / SAMPLE_RATE, tokens[usados:]))
+                for start, end, segment_tokens in pieces:
+                    segment = build_segment(a // HOP_LENGTH, start, end, segment_tokens, tokenizer, result)
+                    nuevos.append({'id': len(f.segments), **segment})
+                    f.segments.append(nuevos[-1])
+            if f.progress is not None:
+                f.progress.on_window(b / SAMPLE_RATE, nuevos)
+
+        for f in {id(f): f for f, _, _ in lote}.values():
+            if f.progress is not None:
+                f.progress.check_cancelled()
+
+    results = []
+    for f in files:
+        language = f.language or 'en'
+        tokenizer = tokenizer_for(language)
+        result = {
+            'text': tokenizer.decode([token for segment in f.segments for token in segment['tokens']]),
+            'segments': f.segments,
+            'language': language,
+            'fallbacks': f.fallbacks.report(),
+        }
+        if f.vad is not None:
+            result['vad'] = f.vad
+        results.append(result)
+    return results
@@ -0,0 +1,166 @@
+"""
+Caché en disco de resultados de transcripción.
+
+Las entradas se direccionan por contenido: la clave combina el hash del audio
+con el modelo, el idioma y las opciones de decodificación, así que volver a
+subir la misma grabación devuelve el resultado guardado sin cargar el modelo.
+El tamaño total se limita expulsando las entradas usadas hace más tiempo (LRU).
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+from src.config import CACHE_DIR, CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+# Campos del resultado de Whisper que se guardan
+RESULT_FIELDS = ('text', 'segments', 'language')
+
+
+def hash_bytes(data):
+    """Calcula el SHA-256 de un buffer (bytes o memoryview) sin copiarlo"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(audio_hash, model_name, language=None, options=None):
+    """
+    Construye la clave de caché de una transcripción.
+
+    Args:
+        audio_hash (str): Hash del contenido del audio
+        model_name (str): Nombre del modelo de Whisper
+        language (str): Idioma (None o 'auto' para auto-detección)
+        options (dict): Opciones de decodificación que afectan al resultado
+
+    Returns:
+        str: Clave hexadecimal estable
+    """
+    payload = json.dumps({
+        'audio': audio_hash,
+        'modelo': model_name,
+        'idioma': language or 'auto',
+        'opciones': options or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TranscriptionCache:
+    """Caché LRU en disco con un archivo JSON por resultado"""
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.path.join(CACHE_DIR, 'resultados')
+        self.max_bytes = max_bytes if max_bytes is not None else CACHE_MAX_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        """Ruta del archivo de una clave (repartido en subdirectorios por prefijo)"""
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        """Devuelve el resultado guardado o None si no existe"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            logger.info('Caché: fallo %s', key[:12])
+            return None
+        except (OSError, ValueError):
+            # Entrada corrupta o a medio escribir: se descarta
+            self.misses += 1
+            logger.warning('Caché: entrada corrupta %s, se elimina', key[:12])
+            self._remove(path)
+            return None
+
+        # Marcar como usada recientemente para la expulsión LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        logger.info('Caché: acierto %s', key[:12])
+        return result
+
+    def put(self, key, result):
+        """Guarda un resultado de Whisper y aplica el límite de tamaño"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {field: result.get(field) for field in RESULT_FIELDS}
+
+        # Escritura atómica: un lector nunca ve un JSON a medias
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+        logger.info('Caché: guardado %s', key[:12])
+        self._evict()
+
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta respetar max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith('.json'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                logger.info('Caché: expulsado %s', os.path.basename(path)[:12])
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Devuelve la caché compartida del proceso, creándola en el primer uso"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptionCache()
+        return _default_cache
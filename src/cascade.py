@@ -0,0 +1,171 @@
+"""
+Transcripción en cascada: borrador con un modelo rápido y refinado selectivo.
+
+El archivo completo se transcribe con CASCADE_DRAFT_MODEL. Los segmentos de
+poca confianza (log-probabilidad media baja, texto repetitivo o texto sobre lo
+que el modelo cree silencio, típico de las alucinaciones) se agrupan en tramos,
+y solo el audio de esos tramos se vuelve a transcribir con el modelo elegido.
+Los segmentos refinados sustituyen a los del borrador en su lugar (y se
+publican como sustituciones en el ProgressTracker del trabajo). Si pocos
+segmentos son dudosos, el coste se acerca al del modelo rápido y la calidad al
+del grande.
+"""
+import logging
+
+import numpy as np
+
+from src.config import (
+    CASCADE_COMPRESSION_THRESHOLD,
+    CASCADE_LOGPROB_THRESHOLD,
+    CASCADE_MERGE_GAP_S,
+    CASCADE_NO_SPEECH_THRESHOLD,
+    CASCADE_PAD_S,
+)
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+HOP_LENGTH = 160  # Muestras por frame de mel (el 'seek' de los segmentos va en frames)
+
+
+def is_low_confidence(segment, logprob_threshold=CASCADE_LOGPROB_THRESHOLD,
+                      compression_threshold=CASCADE_COMPRESSION_THRESHOLD,
+                      no_speech_threshold=CASCADE_NO_SPEECH_THRESHOLD):
+    """
+    Indica si un segmento del borrador debe refinarse.
+
+    Args:
+        segment (dict): Segmento de Whisper con avg_logprob, compression_ratio y no_speech_prob
+        logprob_threshold (float): Log-probabilidad media mínima
+        compression_threshold (float): Ratio de compresión máximo del texto
+        no_speech_threshold (float): Probabilidad de silencio máxima para un segmento con texto
+
+    Returns:
+        bool: True si el segmento tiene texto y alguna señal de poca confianza
+    """
+    if not segment['text'].strip():
+        return False
+    return (
+        segment['avg_logprob'] < logprob_threshold
+        or segment['compression_ratio'] > compression_threshold
+        or segment['no_speech_prob'] > no_speech_threshold
+    )
+
+
+def escalation_spans(segments, duration, pad_s=CASCADE_PAD_S, merge_gap_s=CASCADE_MERGE_GAP_S, **thresholds):
+    """
+    Agrupa los segmentos dudosos en tramos de audio a refinar.
+
+    Los segmentos dudosos separados por menos de merge_gap_s forman un solo
+    tramo, que sustituye también a los segmentos que quedan entre ellos. Cada
+    tramo se amplía pad_s a cada lado sin entrar en los segmentos vecinos, para
+    que el modelo grande no repita palabras que se conservan del borrador.
+
+    Args:
+        segments (list): Segmentos del borrador, ordenados
+        duration (float): Duración del audio en segundos
+        pad_s (float): Margen alrededor de cada tramo
+        merge_gap_s (float): Hueco máximo entre segmentos dudosos de un mismo tramo
+        **thresholds: Umbrales para is_low_confidence
+
+    Returns:
+        list: Tuplas (primer índice, último índice, inicio_s, fin_s)
+    """
+    dudosos = [i for i, segment in enumerate(segments) if is_low_confidence(segment, **thresholds)]
+
+    grupos = []
+    for i in dudosos:
+        if grupos and segments[i]['start'] - segments[grupos[-1][1]]['end'] < merge_gap_s:
+            grupos[-1][1] = i
+        else:
+            grupos.append([i, i])
+
+    spans = []
+    for primero, ultimo in grupos:
+        inicio = segments[primero]['start'] - pad_s
+        fin = segments[ultimo]['end'] + pad_s
+        if primero > 0:
+            inicio = max(inicio, segments[primero - 1]['end'])
+        if ultimo + 1 < len(segments):
+            fin = min(fin, segments[ultimo + 1]['start'])
+        spans.append((primero, ultimo, max(0.0, inicio), min(duration, fin)))
+    return spans
+
+
+def refine_low_confidence(model, audio, draft, language=None, progress=None, timer=None, profile=None, **thresholds):
+    """
+    Vuelve a transcribir con un modelo mejor los tramos dudosos de un borrador.
+
+    Args:
+        model: Modelo de Whisper con el que refinar
+        audio (np.ndarray): Audio completo a 16 kHz (el mismo del borrador)
+        draft (dict): Resultado del borrador ('text', 'segments', 'language')
+        language (str): Idioma (None o 'auto' para usar el detectado en el borrador)
+        progress: ProgressTracker del trabajo (opcional)
+        timer: StageTimer (opcional)
+        profile (str): Perfil de decodificación del refinado (None: DECODE_PROFILE)
+        **thresholds: Umbrales para escalation_spans / is_low_confidence
+
+    Returns:
+        dict: Resultado con los segmentos sustituidos y 'cascada' con el informe de escalado
+    """
+    from src.decoding import FallbackBudget
+    from src.transcription import transcribe_audio_batched
+
+    duration = len(audio) / SAMPLE_RATE
+    segments = draft['segments']
+    spans = escalation_spans(segments, duration, **thresholds)
+    escalado_s = sum(fin - inicio for _, _, inicio, fin in spans)
+
+    if spans:
+        if progress is not None:
+            progress.log(f'🪜 Refinando {len(spans)} tramos dudosos ({escalado_s:.0f} s de audio)')
+        trozos = [
+            np.asarray(audio[int(inicio * SAMPLE_RATE):int(fin * SAMPLE_RATE)], dtype=np.float32)
+            for _, _, inicio, fin in spans
+        ]
+        # Los tramos son independientes: se decodifican por lotes y sin detección de voz
+        idioma = draft['language'] if language in (None, 'auto') else language
+        refinados = transcribe_audio_batched(model, trozos, idioma, timer=timer, vad=False, profile=profile)
+        fallbacks = FallbackBudget.combine([draft.get('fallbacks')] + [r.get('fallbacks') for r in refinados])
+
+        nuevos = []
+        siguiente = 0
+        for (primero, ultimo, inicio, _), refinado in zip(spans, refinados):
+            nuevos.extend(segments[siguiente:primero])
+            for segment in refinado['segments']:
+                segment['start'] += inicio
+                segment['end'] += inicio
+                segment['seek'] += int(inicio * SAMPLE_RATE) // HOP_LENGTH
+                nuevos.append(segment)
+            siguiente = ultimo + 1
+        nuevos.extend(segments[siguiente:])
+        segments = [{**segment, 'id': i} for i, segment in enumerate(nuevos)]
+
+        if progress is not None:
+            # Del último tramo al primero: los índices del borrador siguen valiendo tras cada sustitución
+            for (primero, ultimo, _, _), refinado in reversed(list(zip(spans, refinados))):
+                progress.on_replace(primero, ultimo, refinado['segments'])
+
+    else:
+        fallbacks = draft.get('fallbacks')
+
+    escalados = sum(ultimo - primero + 1 for primero, ultimo, _, _ in spans)
+    informe = {
+        'tramos': len(spans),
+        'segmentos_escalados': escalados,
+        'segmentos_borrador': len(draft['segments']),
+        'audio_escalado_s': escalado_s,
+        'fraccion_escalada': escalado_s / duration if duration else 0.0,
+    }
+    logger.info('Cascada: %d/%d segmentos, %.1f s (%.0f%%) refinados',
+                escalados, len(draft['segments']), escalado_s, informe['fraccion_escalada'] * 100)
+
+    result = {
+        **draft,
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'cascada': informe,
+        'fallbacks': fallbacks,
+    }
+    return result
@@ -0,0 +1,197 @@
+"""
+Puntos de control para reanudar transcripciones largas.
+
+Mientras se decodifica, cada ventana terminada se añade como una línea JSON a
+un archivo en CACHE_DIR/checkpoints, con la misma clave que la caché de
+resultados (hash del audio, modelo, idioma y opciones). Si el trabajo falla, se
+cancela o el proceso se reinicia, volver a transcribir la misma grabación con
+los mismos ajustes continúa desde la última ventana guardada. Al guardar el
+resultado en la caché el punto de control se borra; los abandonados se
+eliminan cuando superan CHECKPOINT_TTL_S.
+
+Mientras un trabajo usa el punto de control tiene un bloqueo exclusivo (flock)
+sobre el archivo. Otro trabajo con la misma clave (el mismo audio subido otra
+vez, en este proceso o en otro) no puede tomarlo y transcribe sin punto de
+control, en lugar de mezclar sus ventanas con las del primero. Solo se borra un
+archivo con el bloqueo tomado.
+"""
+import os
+import json
+import time
+import fcntl
+import logging
+
+from src.config import CACHE_DIR, CHECKPOINT_TTL_S
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+
+def checkpoint_dir():
+    return os.path.join(CACHE_DIR, 'checkpoints')
+
+
+class Checkpoint:
+    """
+    Registro de solo-añadir de las ventanas terminadas de una transcripción.
+
+    La primera línea es una cabecera con los frames de mel y el idioma; cada
+    línea siguiente es una ventana con el seek alcanzado, sus segmentos y el
+    índice desde el que se usa el texto anterior como prompt. Una última línea
+    a medio escribir (caída durante la escritura) se ignora y se trunca.
+
+    load y start toman el bloqueo si no se tenía; si otro trabajo lo tiene,
+    load devuelve None y no se guarda nada. close lo suelta.
+    """
+    def __init__(self, key, directory=None):
+        self.key = key
+        self.path = os.path.join(directory or checkpoint_dir(), f'{key}.jsonl')
+        self._file = None
+        self._valid_bytes = 0
+
+    def acquire(self):
+        """
+        Abre el archivo (sin truncarlo) con un bloqueo exclusivo no bloqueante.
+
+        Returns:
+            bool: Si el bloqueo es de este objeto; False si lo tiene otro trabajo
+        """
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            f = open(self.path, 'a+b')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                logger.info('Punto de control %s en uso por otro trabajo: se transcribe sin él', self.key[:12])
+                return False
+            # Si quien lo tenía lo borró entre el open y el flock, el bloqueo es de un archivo huérfano
+            try:
+                mismo = os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                mismo = False
+            if mismo:
+                self._file = f
+                return True
+            f.close()
+
+    def load(self, content_frames):
+        """
+        Lee el estado guardado si corresponde al mismo audio.
+
+        Args:
+            content_frames (int): Frames de mel del audio que se va a transcribir
+
+        Returns:
+            dict: 'seek', 'segments', 'language', 'prompt_reset_since' y 'ventanas', o None
+        """
+        if not self.acquire():
+            return None
+
+        with open(self.path, 'rb') as f:
+            state = None
+            for line in f:
+                try:
+                    registro = json.loads(line)
+                except ValueError:
+                    break  # Línea incompleta: lo anterior sigue siendo válido
+                if state is None:
+                    if registro.get('version') != VERSION or registro.get('frames') != content_frames:
+                        logger.warning('Punto de control %s no corresponde al audio, se descarta', self.key[:12])
+                        return None
+                    state = {
+                        'seek': 0,
+                        'segments': [],
+                        'language': registro['idioma'],
+                        'prompt_reset_since': 0,
+                        'ventanas': 0,
+                    }
+                else:
+                    state['seek'] = registro['seek']
+                    state['segments'].extend(registro['segmentos'])
+                    state['prompt_reset_since'] = registro['reinicio_prompt']
+                    state['ventanas'] += 1
+                self._valid_bytes = f.tell()
+
+        if state is not None and state['ventanas']:
+            logger.info('Punto de control %s: %d ventanas', self.key[:12], state['ventanas'])
+        return state
+
+    def start(self, content_frames, language, state=None):
+        """
+        Abre el registro para añadir ventanas.
+
+        Args:
+            content_frames (int): Frames de mel del audio
+            language (str): Idioma de la transcripción
+            state (dict): Estado devuelto por load para continuar, o None para empezar de cero
+        """
+        if not self.acquire():
+            return
+        # Modo de añadir: tras truncar, cada escritura va al final de lo válido
+        if state is not None:
+            self._file.truncate(self._valid_bytes)
+        else:
+            self._file.truncate(0)
+            self._write({'version': VERSION, 'frames': content_frames, 'idioma': language})
+
+    def record(self, seek, segments, prompt_reset_since):
+        """Añade una ventana terminada y la lleva a disco antes de seguir"""
+        if self._file is not None:
+            self._write({'seek': seek, 'segmentos': segments, 'reinicio_prompt': prompt_reset_since})
+
+    def _write(self, registro):
+        self._file.write(json.dumps(registro, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Cierra el registro y suelta el bloqueo"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Borra el punto de control (la transcripción ya está guardada), salvo si otro trabajo lo usa"""
+        if not self.acquire():
+            return
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        self.close()
+
+
+def purge_stale(directory=None, max_age_s=CHECKPOINT_TTL_S):
+    """
+    Elimina los puntos de control que nadie ha retomado en max_age_s.
+
+    Returns:
+        int: Número de archivos eliminados
+    """
+    directory = directory or checkpoint_dir()
+    try:
+        nombres = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+
+    limite = time.time() - max_age_s
+    eliminados = 0
+    for nombre in nombres:
+        path = os.path.join(directory, nombre)
+        try:
+            if not nombre.endswith('.jsonl') or os.stat(path).st_mtime >= limite:
+                continue
+            # Uno que sigue bloqueado es de un trabajo en curso (ventanas muy lentas)
+            with open(path, 'rb') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.unlink(path)
+            eliminados += 1
+        except OSError:
+            continue
+    if eliminados:
+        logger.info('Puntos de control: %d abandonados eliminados', eliminados)
+    return eliminados
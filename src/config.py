@@ -1,6 +1,7 @@
 """
 Configuración de la aplicación.
 """
+import os
 
 # Modelos disponibles
 MODELOS_DISPONIBLES = {
@@ -9,14 +10,20 @@ MODELOS_DISPONIBLES = {
         'tamaño': '~39 MB',
         'velocidad': 'Muy rápido',
         'precision': 'Básica',
-        'disponible': True
+        'disponible': True,
+        'int8': False,  # Cuantización dinámica INT8 de las capas lineales al cargar
+        'peso_cpu': 1,  # Peso relativo al repartir los núcleos entre trabajos
+        'rtf_cpu': 0.05  # Segundos de cómputo por segundo de audio con 4 hilos (a priori, ver src/estimator.py)
     },
     'base': {
         'nombre': 'Base',
         'tamaño': '~74 MB',
         'velocidad': 'Rápido',
         'precision': 'Buena',
-        'disponible': True
+        'disponible': True,
+        'int8': False,
+        'peso_cpu': 2,
+        'rtf_cpu': 0.12
     },
     'small': {
         'nombre': 'Small',
@@ -24,10 +31,16 @@ MODELOS_DISPONIBLES = {
         'velocidad': 'Lento',
         'precision': 'Muy buena',
         'disponible': False,  # No disponible en CPU gratuita
-        'razon_deshabilitado': 'Requiere demasiados recursos para CPU gratuita'
+        'razon_deshabilitado': 'Requiere demasiados recursos para CPU gratuita',
+        'int8': True,  # Si se habilita, en INT8 (ver benchmarks/quantization.py)
+        'peso_cpu': 4,
+        'rtf_cpu': 0.4
     }
 }
 
+# Modelo seleccionado por defecto (y el que se precarga al arrancar)
+MODELO_POR_DEFECTO = 'base'
+
 # Idiomas soportados
 IDIOMAS = {
     'auto': 'Detección automática',
@@ -50,3 +63,144 @@ RECOMMENDED_FILE_SIZE_MB = 50
 APP_TITLE = '🎙️ Transcriptor de Audio con Whisper'
 APP_ICON = '🎙️'
 
+# Transcripción paralela por fragmentos
+PARALLEL_WORKERS = max(1, (os.cpu_count() or 1) // 2)  # Procesos con modelo propio
+PARALLEL_MIN_DURATION_S = 300  # Por debajo de esto no compensa arrancar procesos
+PARALLEL_MIN_CHUNK_S = 120  # Duración mínima de cada fragmento
+PARALLEL_SILENCE_SEARCH_S = 15.0  # Margen para buscar silencio alrededor de cada corte
+PARALLEL_OVERLAP_S = 1.0  # Solape entre fragmentos para no perder palabras en el corte
+PARALLEL_CANCEL_POLL_S = 0.5  # Cada cuánto se mira si se canceló el trabajo mientras los fragmentos se transcriben
+
+# Caché de resultados en disco
+CACHE_DIR = os.environ.get(
+    'TRANSCRIPT_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'transcript-whisper')
+)
+CACHE_MAX_MB = 500  # Tamaño máximo antes de expulsar las entradas más antiguas
+CHECKPOINT_TTL_S = 7 * 24 * 3600  # Los puntos de control no retomados se borran pasado este tiempo
+
+# Pesos de los modelos compartidos entre procesos (ver src/weights.py)
+SHARED_WEIGHTS = os.environ.get('TRANSCRIPT_SHARED_WEIGHTS', '1') != '0'  # Mapear los pesos en lugar de cargar una copia por proceso
+SHARED_WEIGHTS_DIR = os.environ.get('TRANSCRIPT_WEIGHTS_DIR', os.path.join(CACHE_DIR, 'pesos'))  # /dev/shm para no pasar por disco
+
+# Archivo de transcripciones con búsqueda de texto completo
+STORE_ENABLED = os.environ.get('TRANSCRIPT_STORE', '1') != '0'  # Indexar cada transcripción terminada
+STORE_PATH = os.environ.get('TRANSCRIPT_STORE_PATH', os.path.join(CACHE_DIR, 'transcripciones.db'))
+SEARCH_MAX_RESULTS = 50  # Resultados por búsqueda
+
+# Exportación
+EXPORT_CHUNK_SEGMENTS = 500  # Segmentos por bloque al generar exportaciones en streaming
+
+# Progreso
+PROGRESS_LOG_LINES = 200  # Líneas de log que se conservan por transcripción
+
+# Reparto de CPU entre trabajos simultáneos
+CPU_CORES = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+CPU_PINNING = os.environ.get('TRANSCRIPT_CPU_PINNING', '0') == '1'  # Fijar cada trabajo a núcleos disjuntos (Linux)
+
+# Decodificación por lotes de ventanas (ver src/batched.py y benchmarks/suite.py --lotes)
+DECODE_BATCH_SIZE = int(os.environ.get('TRANSCRIPT_BATCH_SIZE', '1'))  # Ventanas por lote (1 = bucle secuencial)
+
+# Perfiles de decodificación: velocidad frente a calidad (ver src/decoding.py)
+# Si una ventana sale demasiado repetitiva o con poca confianza, Whisper la repite
+# con la siguiente temperatura; con audio ruidoso, hasta seis veces. Cada perfil
+# limita esos reintentos por ventana y su tiempo total en la transcripción.
+DECODE_PROFILES = {
+    'fast': {
+        'nombre': 'Rápido',
+        'descripcion': 'Búsqueda voraz, un reintento por ventana y sin contexto entre ventanas',
+        'temperature': (0.0, 0.4, 0.8),
+        'beam_size': None,
+        'best_of': None,
+        'condition_on_previous_text': False,  # Evita bucles de repetición, que son los que más reintentan
+        'max_fallbacks': 1,  # Reintentos por ventana
+        'fallback_budget_s': 30,  # Segundos máximos en reintentos por transcripción (None = sin límite)
+        'coste_relativo': 0.6,  # Coste frente a 'balanced' que el estimador supone mientras no tiene datos
+    },
+    'balanced': {
+        'nombre': 'Equilibrado',
+        'descripcion': 'Los ajustes de Whisper con los reintentos acotados',
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'beam_size': None,
+        'best_of': None,
+        'condition_on_previous_text': True,
+        'max_fallbacks': 3,
+        'fallback_budget_s': 300,
+        'coste_relativo': 1.0,
+    },
+    'accurate': {
+        'nombre': 'Preciso',
+        'descripcion': 'Búsqueda en haz de 5, 5 candidatos al reintentar y todos los reintentos',
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'beam_size': 5,
+        'best_of': 5,
+        'condition_on_previous_text': True,
+        'max_fallbacks': None,
+        'fallback_budget_s': None,
+        'coste_relativo': 3.0,
+    },
+}
+DECODE_PROFILE = os.environ.get('TRANSCRIPT_DECODE_PROFILE', 'balanced')  # Perfil por defecto
+
+# Transcripción en cascada (borrador rápido y refinado de los segmentos dudosos)
+CASCADE_DRAFT_MODEL = 'tiny'  # Modelo que transcribe el borrador completo
+CASCADE_LOGPROB_THRESHOLD = -0.7  # Se refinan los segmentos con log-probabilidad media menor
+CASCADE_COMPRESSION_THRESHOLD = 2.0  # ... con el texto más repetitivo que esto
+CASCADE_NO_SPEECH_THRESHOLD = 0.5  # ... o con texto donde el modelo cree que hay silencio
+CASCADE_PAD_S = 0.5  # Margen de audio alrededor de cada tramo refinado
+CASCADE_MERGE_GAP_S = 2.0  # Segmentos dudosos más cercanos se refinan en un mismo tramo
+
+# Cola de trabajos
+JOB_WORKERS = max(1, (os.cpu_count() or 1) // 4)  # Transcripciones simultáneas
+JOB_RESULT_TTL_S = 6 * 3600  # Tiempo que se conservan los resultados en memoria
+
+# Estimación del tiempo de proceso y control de admisión (ver src/estimator.py)
+ESTIMATOR_ENABLED = os.environ.get('TRANSCRIPT_ESTIMATOR', '1') != '0'  # Aprender del coste de cada trabajo terminado (si no, solo la estimación a priori)
+ESTIMATOR_PATH = os.environ.get('TRANSCRIPT_ESTIMATOR_PATH', os.path.join(CACHE_DIR, 'costes.db'))
+ESTIMATOR_HISTORY = 200  # Observaciones más recientes por modelo, modo y perfil con las que se ajusta
+ESTIMATOR_HALF_LIFE = 50  # Observaciones tras las que una medida pesa la mitad (la máquina cambia)
+ESTIMATOR_PRIOR_WEIGHT = 3.0  # Peso de la estimación a priori de los exponentes (hilos, voz), en observaciones
+ESTIMATOR_REFRESH_S = 60.0  # Se reajusta con lo registrado por otros procesos pasado este tiempo
+LATENCY_BUDGET_S = float(os.environ.get('TRANSCRIPT_LATENCY_BUDGET_S', '0'))  # Espera más proceso máximos por trabajo (0 = sin control)
+ADMISSION_POLICY = os.environ.get('TRANSCRIPT_ADMISSION_POLICY', 'diferir')  # 'diferir': a una cola de baja prioridad; 'rechazar'
+
+# API HTTP (ver src/api.py)
+API_HOST = os.environ.get('TRANSCRIPT_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('TRANSCRIPT_API_PORT', '8765'))
+API_MAX_UPLOADS = int(os.environ.get('TRANSCRIPT_API_MAX_UPLOADS', '4'))  # Subidas recibiéndose a la vez; el resto espera sin leer el cuerpo
+API_MAX_PENDING = int(os.environ.get('TRANSCRIPT_API_MAX_PENDING', '32'))  # Trabajos en cola a partir de los que se responde 503
+API_IDLE_TIMEOUT_S = 60.0  # Conexiones sin actividad (o subidas paradas) que se cierran
+API_SSE_HEARTBEAT_S = 15.0  # Comentario SSE periódico para detectar clientes desconectados
+API_MAX_HEADER_BYTES = 16 * 1024  # Tamaño máximo de la línea de petición y las cabeceras
+
+# Ingesta de audio
+INGEST_CHUNK_BYTES = 1024 * 1024  # Bloques enviados a ffmpeg y leídos de su salida
+PROBE_BYTES = 4 * 1024 * 1024  # Principio de un audio en memoria que se pasa a ffprobe para estimar su duración
+
+# Transcripción por ventanas con memoria acotada (ver src/windowed.py)
+WINDOWED_MIN_DURATION_S = float(os.environ.get('TRANSCRIPT_WINDOWED_MIN_S', '1800'))  # Desde esta duración no se calcula el mel completo (0 = siempre)
+
+# Arranque
+WARMUP_MODEL = os.environ.get('TRANSCRIPT_WARMUP', '1') != '0'  # Precargar el modelo por defecto en segundo plano
+
+# Métricas
+METRICS_ENABLED = os.environ.get('TRANSCRIPT_METRICS', '1') != '0'  # Timers por etapa, logs JSON e histogramas
+METRICS_PORT = int(os.environ.get('TRANSCRIPT_METRICS_PORT', '0'))  # Puerto de /metrics (0 = no servir)
+
+# Detección de voz (se salta el silencio antes de Whisper)
+VAD_ENABLED = os.environ.get('TRANSCRIPT_VAD', '1') != '0'
+VAD_FRAME_S = 0.03  # Frames de análisis de 30 ms
+VAD_THRESHOLD_DB = 12.0  # dB por encima del ruido de fondo para considerar voz
+VAD_MAX_FLATNESS = 0.5  # Planitud espectral máxima de un frame de voz (1 = ruido blanco)
+VAD_PAD_S = 0.3  # Margen alrededor de cada región de voz
+VAD_MIN_SILENCE_S = 1.0  # Solo se saltan silencios de al menos esta duración
+VAD_MIN_SPEECH_S = 0.25  # Regiones de voz más cortas se descartan
+VAD_MIN_SKIP_FRACTION = 0.05  # Si se ahorra menos de esto, se transcribe el audio completo
+
+# Transcripción en directo
+STREAM_STEP_S = 1.0  # Audio nuevo que dispara cada decodificación
+STREAM_MAX_BUFFER_S = 15.0  # Máximo de audio sin finalizar que se decodifica en cada paso
+STREAM_COMMIT_MARGIN_S = 1.0  # Los segmentos que acaban tan cerca del final del búfer aún pueden cambiar
+STREAM_PROMPT_TOKENS = 100  # Tokens del texto finalizado usados como contexto
+STREAM_POLL_S = 0.2  # Espera entre lecturas de un archivo que crece
+STREAM_IDLE_TIMEOUT_S = 10.0  # Se da por terminado un archivo que deja de crecer este tiempo
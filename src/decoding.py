@@ -0,0 +1,477 @@
+"""
+Bucle de decodificación por ventanas de 30 segundos.
+
+Reproduce el algoritmo de whisper.transcribe (sin marcas de tiempo por palabra)
+pero bajo control de la aplicación: informa del progreso ventana a ventana al
+ProgressTracker del trabajo, permite cancelar entre ventanas y pasa cada
+ventana por el encoder una sola vez aunque haya reintentos por temperatura.
+"""
+import time
+import warnings
+
+import torch
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import exact_div
+
+from src.metrics import NULL_TIMER
+
+DEFAULT_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+
+def encode_window(model, mel_segment):
+    """Pasa una ventana de mel (n_mels, N_FRAMES) por el encoder"""
+    with torch.no_grad():
+        return model.embed_audio(mel_segment.unsqueeze(0))[0]
+
+
+def temperature_options(decode_options, temperature):
+    """DecodingOptions para una temperatura, sin las opciones que no le aplican"""
+    kwargs = {**decode_options}
+    if temperature > 0:
+        # beam_size y patience no aplican al muestrear con temperatura
+        kwargs.pop('beam_size', None)
+        kwargs.pop('patience', None)
+    else:
+        kwargs.pop('best_of', None)
+    return DecodingOptions(**kwargs, temperature=temperature)
+
+
+def needs_fallback(result, compression_ratio_threshold, logprob_threshold, no_speech_threshold):
+    """Indica si una decodificación debe repetirse con la siguiente temperatura"""
+    fallback = False
+    if compression_ratio_threshold is not None and result.compression_ratio > compression_ratio_threshold:
+        fallback = True  # demasiado repetitivo
+    if logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+        fallback = True  # log-probabilidad media demasiado baja
+    if (
+        no_speech_threshold is not None
+        and result.no_speech_prob > no_speech_threshold
+        and logprob_threshold is not None
+        and result.avg_logprob < logprob_threshold
+    ):
+        fallback = False  # silencio
+    return fallback
+
+
+class FallbackBudget:
+    """
+    Límite de los reintentos por temperatura de una transcripción.
+
+    Cada ventana se reintenta como mucho max_per_window veces y, en total, no se
+    dedican más de max_seconds a reintentos; al agotarse, la ventana se queda
+    con su última decodificación. Cuenta los reintentos hechos y las ventanas
+    que se quedaron sin los que necesitaban.
+    """
+    def __init__(self, max_per_window=None, max_seconds=None):
+        self.max_per_window = max_per_window
+        self.max_seconds = max_seconds
+        self.reintentos = 0
+        self.agotados = 0
+        self.segundos = 0.0
+
+    def allows(self, intento):
+        """Indica si una ventana que lo necesita puede hacer el intento número intento (1 = primer reintento)"""
+        if self.max_per_window is not None and intento > self.max_per_window:
+            return False
+        return self.max_seconds is None or self.segundos < self.max_seconds
+
+    def deny(self, ventanas=1):
+        """Registra ventanas que necesitaban otro intento y se quedan sin él"""
+        self.agotados += ventanas
+
+    def record(self, segundos, ventanas=1):
+        """Registra un reintento de varias ventanas que duró segundos"""
+        self.reintentos += ventanas
+        self.segundos += segundos
+
+    def report(self):
+        """Resumen para los metadatos del resultado"""
+        return {'reintentos': self.reintentos, 'agotados': self.agotados, 'segundos': round(self.segundos, 3)}
+
+    @staticmethod
+    def combine(reports):
+        """Suma varios resúmenes (fragmentos en paralelo, borrador y refinado...)"""
+        reports = [r for r in reports if r]
+        return {
+            'reintentos': sum(r['reintentos'] for r in reports),
+            'agotados': sum(r['agotados'] for r in reports),
+            'segundos': round(sum(r['segundos'] for r in reports), 3),
+        }
+
+
+def is_silent(result, no_speech_threshold, logprob_threshold):
+    """Indica si la ventana decodificada es silencio y debe saltarse"""
+    if no_speech_threshold is None or result.no_speech_prob <= no_speech_threshold:
+        return False
+    # No se salta si la log-probabilidad es alta pese a no_speech_prob
+    return logprob_threshold is None or result.avg_logprob <= logprob_threshold
+
+
+def split_segments(tokens, tokenizer, time_offset, segment_size, input_stride, time_precision):
+    """
+    Divide los tokens de una ventana en segmentos según sus marcas de tiempo.
+
+    Args:
+        tokens (torch.Tensor): Tokens decodificados de la ventana
+        tokenizer: Tokenizer de Whisper
+        time_offset (float): Segundo en el que empieza la ventana
+        segment_size (int): Frames de mel con contenido en la ventana
+        input_stride (int): Frames de mel por token de tiempo
+        time_precision (float): Segundos por token de tiempo
+
+    Returns:
+        tuple: (lista de (inicio, fin, tokens), frames que avanza la ventana)
+    """
+    segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+    timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+    single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+
+    consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
+    consecutive.add_(1)
+
+    pieces = []
+    if len(consecutive) > 0:
+        # Hay dos marcas de tiempo seguidas: cada par delimita un segmento
+        slices = consecutive.tolist()
+        if single_timestamp_ending:
+            slices.append(len(tokens))
+
+        last_slice = 0
+        for current_slice in slices:
+            sliced_tokens = tokens[last_slice:current_slice]
+            start_pos = sliced_tokens[0].item() - tokenizer.timestamp_begin
+            end_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+            pieces.append((
+                time_offset + start_pos * time_precision,
+                time_offset + end_pos * time_precision,
+                sliced_tokens,
+            ))
+            last_slice = current_slice
+
+        if single_timestamp_ending:
+            # Una marca sola al final indica que no hay más voz en la ventana
+            advance = segment_size
+        else:
+            # Se descarta el segmento sin terminar y se continúa desde la última marca
+            last_timestamp_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+            advance = last_timestamp_pos * input_stride
+    else:
+        duration = segment_duration
+        timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+        if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+            # Sin marcas consecutivas pero con alguna: se usa la última como final
+            last_timestamp_pos = timestamps[-1].item() - tokenizer.timestamp_begin
+            duration = last_timestamp_pos * time_precision
+
+        pieces.append((time_offset, time_offset + duration, tokens))
+        advance = segment_size
+
+    return pieces, advance
+
+
+def build_segment(seek, start, end, tokens, tokenizer, result):
+    """
+    Construye un segmento con el formato de whisper.transcribe.
+
+    Args:
+        seek (int): Frame de mel en el que empieza la ventana
+        start (float): Segundo inicial del segmento
+        end (float): Segundo final del segmento
+        tokens (torch.Tensor): Tokens del segmento, con sus marcas de tiempo
+        tokenizer: Tokenizer de Whisper
+        result: DecodingResult de la ventana
+
+    Returns:
+        dict: Segmento sin 'id'
+    """
+    tokens = tokens.tolist()
+    text_tokens = [token for token in tokens if token < tokenizer.eot]
+    segment = {
+        'seek': seek,
+        'start': start,
+        'end': end,
+        'text': tokenizer.decode(text_tokens),
+        'tokens': tokens,
+        'temperature': result.temperature,
+        'avg_logprob': result.avg_logprob,
+        'compression_ratio': result.compression_ratio,
+        'no_speech_prob': result.no_speech_prob,
+    }
+    # Segmentos instantáneos o sin texto se vacían como hace Whisper
+    if segment['start'] == segment['end'] or segment['text'].strip() == '':
+        segment['text'] = ''
+        segment['tokens'] = []
+        segment['words'] = []
+    return segment
+
+
+class MelWindows:
+    """Ventanas de 30 s de un log-mel calculado de una vez sobre todo el audio"""
+    def __init__(self, mel):
+        self.mel = mel
+        # Se añadieron 30 s de silencio al final para poder cortar la última ventana
+        self.content_frames = mel.shape[-1] - N_FRAMES
+        # La detección de idioma usa la primera ventana tal cual si está completa
+        self.reuse_language_features = self.content_frames >= N_FRAMES
+
+    def language_segment(self):
+        """Mel de N_FRAMES para detectar el idioma"""
+        return pad_or_trim(self.mel, N_FRAMES)
+
+    def segment(self, seek):
+        """
+        Mel de la ventana que empieza en seek.
+
+        Returns:
+            tuple: (mel de N_FRAMES, frames con contenido), o None si no queda audio
+        """
+        if seek >= self.content_frames:
+            return None
+        segment_size = min(N_FRAMES, self.content_frames - seek)
+        return pad_or_trim(self.mel[:, seek:seek + segment_size], N_FRAMES), segment_size
+
+    def position(self, seek):
+        """Segundos transcritos al llegar a seek"""
+        return min(self.content_frames, seek) * HOP_LENGTH / SAMPLE_RATE
+
+
+def _compute_dtype(model, decode_options):
+    """Tipo de los tensores de entrada; fija fp16=False en decode_options si se usa FP32"""
+    dtype = torch.float16 if decode_options.get('fp16', True) else torch.float32
+    if model.device == torch.device('cpu') and dtype == torch.float16:
+        warnings.warn('FP16 is not supported on CPU; using FP32 instead')
+        dtype = torch.float32
+    if dtype == torch.float32:
+        decode_options['fp16'] = False
+    return dtype
+
+
+def transcribe_windows(model, audio, language=None, progress=None, timer=None, speech_map=None, checkpoint=None,
+                       **options):
+    """
+    Transcribe audio ventana a ventana con el mismo algoritmo que Whisper.
+
+    Args:
+        model: Modelo de Whisper cargado
+        audio: Ruta al archivo, array de numpy o tensor con audio a 16 kHz
+        language (str): Idioma (None para auto-detección)
+        progress: ProgressTracker que recibe cada ventana y permite cancelar (opcional)
+        timer: StageTimer que acumula mel, encoder, idioma y decodificación (opcional)
+        speech_map: SpeechMap si el audio es la voz compactada; los segmentos salen
+            con tiempos de la línea temporal original (opcional)
+        checkpoint: Checkpoint donde se guarda cada ventana terminada y desde el que
+            se continúa si ya tiene ventanas de este audio (opcional)
+        **options: Umbrales, temperaturas y opciones de decode_windows
+
+    Returns:
+        dict: Resultado con 'text', 'segments' y 'language' como whisper.transcribe
+    """
+    timer = timer or NULL_TIMER
+
+    # Se añaden 30 s de silencio al final para poder cortar la última ventana
+    with timer.stage('mel'):
+        mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    windows = MelWindows(mel)
+
+    if progress is not None:
+        progress.set_total(float(windows.content_frames * HOP_LENGTH / SAMPLE_RATE))
+
+    return decode_windows(
+        model, windows, language, progress=progress, timer=timer, speech_map=speech_map,
+        checkpoint=checkpoint, **options
+    )
+
+
+def decode_windows(model, windows, language=None, progress=None, timer=None, speech_map=None, checkpoint=None,
+                   temperature=DEFAULT_TEMPERATURES,
+                   compression_ratio_threshold=2.4,
+                   logprob_threshold=-1.0,
+                   no_speech_threshold=0.6,
+                   condition_on_previous_text=True,
+                   initial_prompt=None,
+                   max_fallbacks=None,
+                   fallback_budget_s=None,
+                   **decode_options):
+    """
+    Decodifica las ventanas de un proveedor de mel con el bucle de Whisper.
+
+    El proveedor (MelWindows o src.windowed.StreamingMelWindows) entrega el mel
+    de cada ventana a partir de su seek; el bucle decide cuánto avanzar según
+    las marcas de tiempo y mantiene el texto anterior como prompt.
+
+    Args:
+        model: Modelo de Whisper cargado
+        windows: Proveedor con segment(seek), language_segment(), position(seek),
+            content_frames (None si aún no se conoce) y reuse_language_features
+        language (str): Idioma (None para auto-detección)
+        progress: ProgressTracker que recibe cada ventana y permite cancelar (opcional)
+        timer: StageTimer que acumula mel, encoder, idioma y decodificación (opcional)
+        speech_map: SpeechMap si el audio es la voz compactada (opcional)
+        checkpoint: Checkpoint para guardar cada ventana y reanudar (opcional)
+        temperature: Temperatura o secuencia de temperaturas de reintento
+        compression_ratio_threshold (float): Reintentar si el texto es demasiado repetitivo
+        logprob_threshold (float): Reintentar si la log-probabilidad media es menor
+        no_speech_threshold (float): Saltar la ventana si parece silencio
+        condition_on_previous_text (bool): Usar el texto anterior como prompt
+        initial_prompt (str): Texto inicial que condiciona la primera ventana
+        max_fallbacks (int): Reintentos máximos por ventana (None: todas las temperaturas)
+        fallback_budget_s (float): Segundos máximos en reintentos en todo el audio (None: sin límite)
+        **decode_options: Opciones para whisper.DecodingOptions (fp16, beam_size...)
+
+    Returns:
+        dict: Resultado con 'text', 'segments' y 'language' como whisper.transcribe, y
+            'fallbacks' con los reintentos hechos (FallbackBudget.report)
+    """
+    dtype = _compute_dtype(model, decode_options)
+    timer = timer or NULL_TIMER
+    content_frames = windows.content_frames
+
+    resumed = checkpoint.load(content_frames) if checkpoint is not None else None
+    if resumed is not None:
+        language = resumed['language']
+
+    # Las features de la primera ventana se reutilizan si sirven para detectar idioma
+    first_features = None
+    if language is None:
+        if not model.is_multilingual:
+            language = 'en'
+        else:
+            mel_segment = windows.language_segment().to(model.device).to(dtype)
+            with timer.stage('encoder'):
+                features = encode_window(model, mel_segment)
+            with timer.stage('idioma'):
+                _, probs = model.detect_language(features)
+            language = max(probs, key=probs.get)
+            if windows.reuse_language_features:
+                first_features = features
+
+    decode_options['language'] = language
+    task = decode_options.get('task', 'transcribe')
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=language,
+        task=task,
+    )
+
+    budget = FallbackBudget(max_fallbacks, fallback_budget_s)
+
+    def decode_with_fallback(features):
+        temperatures = [temperature] if isinstance(temperature, (int, float)) else temperature
+        decode_result = None
+
+        for intento, t in enumerate(temperatures):
+            if intento:
+                if not budget.allows(intento):
+                    # La ventana necesitaba otro intento, pero el perfil no lo permite
+                    budget.deny()
+                    timer.count('fallbacks_agotados')
+                    break
+                timer.count('fallbacks')
+            inicio = time.perf_counter()
+            with timer.stage('decodificacion'):
+                decode_result = model.decode(features, temperature_options(decode_options, t))
+            if intento:
+                budget.record(time.perf_counter() - inicio)
+
+            if not needs_fallback(decode_result, compression_ratio_threshold, logprob_threshold, no_speech_threshold):
+                break
+
+        return decode_result
+
+    input_stride = exact_div(N_FRAMES, model.dims.n_audio_ctx)  # frames de mel por token: 2
+    time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE  # segundos por token: 0.02
+
+    seek = 0
+    all_tokens = []
+    all_segments = []
+    prompt_reset_since = 0
+
+    initial_prompt_tokens = []
+    if initial_prompt is not None:
+        initial_prompt_tokens = tokenizer.encode(' ' + initial_prompt.strip())
+        all_tokens.extend(initial_prompt_tokens)
+
+    if resumed is not None and resumed['ventanas']:
+        seek = resumed['seek']
+        all_segments = resumed['segments']
+        all_tokens.extend(token for segment in all_segments for token in segment['tokens'])
+        prompt_reset_since = resumed['prompt_reset_since']
+        timer.count('ventanas_reanudadas', resumed['ventanas'])
+        if progress is not None:
+            reanudado_s = windows.position(seek)
+            progress.log(f'♻️ Se reanuda desde un punto de control ({reanudado_s:.0f} s ya transcritos)')
+            progress.on_window(reanudado_s, all_segments)
+
+    if checkpoint is not None:
+        checkpoint.start(content_frames, language, resumed)
+    try:
+        while True:
+            window = windows.segment(seek)
+            if window is None:
+                break
+            time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+            mel_segment, segment_size = window
+            mel_segment = mel_segment.to(model.device).to(dtype)
+
+            if seek == 0 and first_features is not None:
+                features = first_features
+                first_features = None
+            else:
+                with timer.stage('encoder'):
+                    features = encode_window(model, mel_segment)
+
+            timer.count('ventanas')
+            decode_options['prompt'] = all_tokens[prompt_reset_since:]
+            result = decode_with_fallback(features)
+            tokens = torch.tensor(result.tokens)
+
+            if is_silent(result, no_speech_threshold, logprob_threshold):
+                seek += segment_size
+                if checkpoint is not None:
+                    checkpoint.record(seek, [], prompt_reset_since)
+                if progress is not None:
+                    progress.on_window(windows.position(seek))
+                    progress.check_cancelled()
+                continue
+
+            pieces, advance = split_segments(
+                tokens, tokenizer, time_offset, segment_size, input_stride, time_precision
+            )
+
+            current_segments = []
+            for start, end, segment_tokens in pieces:
+                segment = build_segment(seek, start, end, segment_tokens, tokenizer, result)
+                if speech_map is not None:
+                    speech_map.remap_segment(segment)
+                current_segments.append(segment)
+
+            seek += advance
+
+            all_segments.extend(
+                {'id': i, **segment}
+                for i, segment in enumerate(current_segments, start=len(all_segments))
+            )
+            all_tokens.extend(token for segment in current_segments for token in segment['tokens'])
+
+            if not condition_on_previous_text or result.temperature > 0.5:
+                # Con temperatura alta el texto anterior no se usa como prompt
+                prompt_reset_since = len(all_tokens)
+
+            if checkpoint is not None:
+                checkpoint.record(seek, all_segments[len(all_segments) - len(current_segments):], prompt_reset_since)
+            if progress is not None:
+                progress.on_window(windows.position(seek), current_segments)
+                progress.check_cancelled()
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    return {
+        'text': tokenizer.decode(all_tokens[len(initial_prompt_tokens):]),
+        'segments': all_segments,
+        'language': language,
+        'fallbacks': budget.report(),
+    }
@@ -0,0 +1,404 @@
+"""
+Estimación del tiempo de proceso de una transcripción y control de admisión.
+
+Cada trabajo terminado deja una observación en una base SQLite: modelo, modo,
+perfil, hilos medios que tuvo, duración del audio, fracción con voz, segundos
+de carga del modelo y segundos de cómputo. Por cada modelo, modo y perfil se
+ajusta el factor de tiempo real (segundos de cómputo por segundo de audio) con
+una regresión en escala logarítmica sobre los hilos y la fracción con voz:
+
+    log(rtf) = b0 + b1 * log(hilos) + b2 * log(fraccion_voz)
+
+Es una regresión ridge que encoge hacia una estimación a priori (el 'rtf_cpu'
+del modelo con 4 hilos, el 'coste_relativo' del perfil, b1 = -0.6 y b2 = 1), así
+que sin datos ya da un orden de magnitud. El nivel (b0) se ata poco al prior y
+la primera observación ya lo ajusta a la máquina; los exponentes, que solo se
+pueden aprender cuando varían los hilos o la voz, se atan con
+ESTIMATOR_PRIOR_WEIGHT. Las observaciones recientes pesan más (ESTIMATOR_HALF_LIFE).
+La predicción sale de la duración que da ffprobe antes de empezar:
+
+    segundos = carga + duracion * rtf(hilos que recibiría el trabajo, voz media)
+
+Con ella se calcula el tiempo restante en la interfaz desde el primer momento
+y se decide la admisión: si la espera en cola más el proceso superan
+LATENCY_BUDGET_S, el trabajo se rechaza o se difiere a la cola de baja
+prioridad de src.jobs, según ADMISSION_POLICY.
+"""
+import os
+import time
+import heapq
+import sqlite3
+import logging
+import threading
+
+import numpy as np
+
+from src.config import (
+    ADMISSION_POLICY,
+    DECODE_PROFILE,
+    DECODE_PROFILES,
+    ESTIMATOR_ENABLED,
+    ESTIMATOR_HALF_LIFE,
+    ESTIMATOR_HISTORY,
+    ESTIMATOR_PATH,
+    ESTIMATOR_PRIOR_WEIGHT,
+    ESTIMATOR_REFRESH_S,
+    LATENCY_BUDGET_S,
+    MODELOS_DISPONIBLES,
+    PARALLEL_WORKERS,
+)
+from src.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observaciones (
+    id INTEGER PRIMARY KEY,
+    fecha REAL NOT NULL,
+    modelo TEXT NOT NULL,
+    modo TEXT NOT NULL,
+    perfil TEXT NOT NULL,
+    hilos REAL NOT NULL,
+    duracion REAL NOT NULL,
+    fraccion_voz REAL NOT NULL,
+    carga_s REAL NOT NULL,
+    computo_s REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS observaciones_grupo ON observaciones(modelo, modo, perfil, id);
+"""
+
+# Etapas de nivel superior de run_transcription que escalan con el audio
+# (las de dentro, como 'mel' o 'encoder', ya están incluidas en 'transcripcion')
+ETAPAS_COMPUTO = ('ingesta', 'transcripcion', 'refinado', 'guardar_cache')
+
+# Estimación a priori, corregida por los datos en cuanto los hay
+HILOS_REFERENCIA = 4  # Hilos a los que se refiere 'rtf_cpu'
+PRIOR_EXPONENTE_HILOS = -0.6  # Duplicar hilos no divide el tiempo entre dos
+PRIOR_EXPONENTE_VOZ = 1.0  # El silencio que salta la detección de voz no se decodifica
+PRIOR_MODO = {'paralelo': 1.0 / max(1, PARALLEL_WORKERS), 'cascada': 1.3, 'lotes': 0.8}
+PRIOR_PESO_NIVEL = 0.1  # Peso del prior de b0, en observaciones (el rtf_cpu puede errar por mucho)
+PRIOR_CARGA_S = 2.0  # Carga del modelo (casi 0 si ya estaba en memoria)
+PRIOR_SIGMA = 0.4  # Desviación del log(rtf), ~50 % de error
+Z_P90 = 1.2816
+
+REGISTRY.histogram(
+    'estimacion_error_ratio', 'Tiempo de proceso real dividido por el estimado al admitir el trabajo',
+    (0.25, 0.5, 0.67, 0.8, 0.9, 1.1, 1.25, 1.5, 2, 4),
+)
+REGISTRY.counter('admision_total', 'Decisiones del control de admisión')
+
+
+def _prior(modelo, modo, perfil):
+    """Coeficientes a priori (b0, b1, b2) de la regresión de un grupo"""
+    rtf = MODELOS_DISPONIBLES.get(modelo, {}).get('rtf_cpu', 0.2)
+    rtf *= DECODE_PROFILES.get(perfil, {}).get('coste_relativo', 1.0)
+    rtf *= PRIOR_MODO.get(modo, 1.0)
+    b0 = np.log(rtf) - PRIOR_EXPONENTE_HILOS * np.log(HILOS_REFERENCIA)
+    return np.array([b0, PRIOR_EXPONENTE_HILOS, PRIOR_EXPONENTE_VOZ])
+
+
+def _features(hilos, fraccion_voz):
+    hilos = np.maximum(np.asarray(hilos, dtype=np.float64), 1.0)
+    voz = np.clip(np.asarray(fraccion_voz, dtype=np.float64), 0.05, 1.0)
+    return np.column_stack([np.ones_like(hilos), np.log(hilos), np.log(voz)])
+
+
+class _Fit:
+    """Regresión ajustada de un grupo (modelo, modo, perfil)"""
+    def __init__(self, prior, filas=(), peso_prior=ESTIMATOR_PRIOR_WEIGHT, semivida=ESTIMATOR_HALF_LIFE):
+        """
+        Args:
+            prior (np.ndarray): Coeficientes a priori
+            filas (list): (hilos, duracion, fraccion_voz, carga_s, computo_s), la más reciente primero
+            peso_prior (float): Peso del prior de los exponentes, la voz y la carga, en observaciones
+            semivida (float): Observaciones tras las que una medida pesa la mitad
+        """
+        self.observaciones = len(filas)
+        if not filas:
+            self.beta, self.sigma = prior, PRIOR_SIGMA
+            self.voz, self.carga_s = 1.0, PRIOR_CARGA_S
+            return
+
+        hilos, duracion, voz, carga, computo = (np.array(c, dtype=np.float64) for c in zip(*filas))
+        w = 0.5 ** (np.arange(len(filas)) / semivida)
+        X = _features(hilos, voz)
+        y = np.log(computo / duracion)
+
+        # Ridge hacia el prior: (X'WX + λI) β = X'Wy + λ β0
+        lam = np.diag([PRIOR_PESO_NIVEL, peso_prior, peso_prior])
+        self.beta = np.linalg.solve(X.T @ (X * w[:, None]) + lam, X.T @ (w * y) + lam @ prior)
+
+        residuos = y - X @ self.beta
+        total = peso_prior + w.sum()
+        self.sigma = float(np.sqrt((peso_prior * PRIOR_SIGMA ** 2 + (w * residuos ** 2).sum()) / total))
+        self.voz = float((peso_prior * 1.0 + (w * voz).sum()) / total)
+        self.carga_s = float((peso_prior * PRIOR_CARGA_S + (w * carga).sum()) / total)
+
+    def rtf(self, hilos, fraccion_voz=None):
+        """Factor de tiempo real previsto con esos hilos (y la voz media si no se indica)"""
+        voz = self.voz if fraccion_voz is None else fraccion_voz
+        return float(np.exp(_features([hilos], [voz])[0] @ self.beta))
+
+
+class CostEstimator:
+    """Observaciones de coste de los trabajos terminados y predicción del tiempo de los nuevos"""
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str): Base SQLite (None: solo en memoria, se pierde al salir)
+        """
+        self.path = path or ':memory:'
+        if path:
+            directorio = os.path.dirname(path)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if path:
+            # La app, la API y el batch pueden compartir la base
+            self._db.execute('PRAGMA journal_mode=WAL')
+        with self._db:
+            self._db.executescript(SCHEMA)
+        self._fits = {}  # (modelo, modo, perfil) -> (instante del ajuste, _Fit)
+
+    def record(self, modelo, modo, perfil, duracion, etapas, hilos, silencio_omitido_s=0.0):
+        """
+        Registra el coste de una transcripción terminada.
+
+        Args:
+            modelo (str): Modelo de Whisper
+            modo (str): 'secuencial', 'lotes', 'cascada' o 'paralelo'
+            perfil (str): Perfil de decodificación (None: DECODE_PROFILE)
+            duracion (float): Segundos de audio
+            etapas (dict): Segundos por etapa del StageTimer del trabajo
+            hilos (float): Hilos medios que tuvo el trabajo
+            silencio_omitido_s (float): Audio que la detección de voz no decodificó
+
+        Returns:
+            bool: Si la observación era válida y se guardó
+        """
+        computo = sum(etapas.get(etapa, 0.0) for etapa in ETAPAS_COMPUTO)
+        if not duracion or duracion < 1 or computo <= 0 or not hilos:
+            return False
+        perfil = perfil or DECODE_PROFILE
+        voz = max(0.0, min(1.0, 1 - (silencio_omitido_s or 0.0) / duracion))
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT INTO observaciones (fecha, modelo, modo, perfil, hilos, duracion, fraccion_voz, carga_s, computo_s) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), modelo, modo, perfil, float(hilos), float(duracion), float(voz),
+                 float(etapas.get('carga_modelo', 0.0)), float(computo)),
+            )
+            self._fits.pop((modelo, modo, perfil), None)
+        logger.info('Coste registrado: %s/%s/%s, %.0f s de audio en %.1f s (rtf %.3f, %.1f hilos)',
+                    modelo, modo, perfil, duracion, computo, computo / duracion, hilos)
+        return True
+
+    def _fit(self, modelo, modo, perfil):
+        """Regresión del grupo, reajustada si cambió o si pasó ESTIMATOR_REFRESH_S"""
+        clave = (modelo, modo, perfil)
+        with self._lock:
+            guardado = self._fits.get(clave)
+            if guardado is not None and time.monotonic() - guardado[0] < ESTIMATOR_REFRESH_S:
+                return guardado[1]
+            filas = self._db.execute(
+                'SELECT hilos, duracion, fraccion_voz, carga_s, computo_s FROM observaciones '
+                'WHERE modelo = ? AND modo = ? AND perfil = ? ORDER BY id DESC LIMIT ?',
+                (modelo, modo, perfil, ESTIMATOR_HISTORY),
+            ).fetchall()
+            fit = _Fit(_prior(modelo, modo, perfil), filas)
+            self._fits[clave] = (time.monotonic(), fit)
+        return fit
+
+    def estimate(self, modelo, duracion, perfil=None, modo='secuencial', hilos=None):
+        """
+        Predice el tiempo de proceso de un audio.
+
+        Args:
+            modelo (str): Modelo de Whisper
+            duracion (float): Segundos de audio (get_audio_duration)
+            perfil (str): Perfil de decodificación (None: DECODE_PROFILE)
+            modo (str): Modo que usará run_transcription (ver src.pipeline.plan_mode)
+            hilos (float): Hilos del trabajo (None: los que le daría ahora el asignador de CPU)
+
+        Returns:
+            dict: 'segundos' (predicción), 'alto_s' (percentil 90), 'rtf', 'hilos',
+                'fraccion_voz' y 'observaciones' en las que se basa
+        """
+        perfil = perfil or DECODE_PROFILE
+        if hilos is None:
+            from src.resources import get_cpu_allocator
+            hilos = get_cpu_allocator().projected_threads(modelo)
+
+        fit = self._fit(modelo, modo, perfil)
+        rtf = fit.rtf(hilos)
+        computo = duracion * rtf
+        return {
+            'segundos': fit.carga_s + computo,
+            'alto_s': fit.carga_s + computo * float(np.exp(Z_P90 * fit.sigma)),
+            'rtf': rtf,
+            'hilos': hilos,
+            'fraccion_voz': fit.voz,
+            'observaciones': fit.observaciones,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_cost_estimator():
+    """Devuelve el estimador del proceso, creándolo en el primer uso"""
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = CostEstimator(ESTIMATOR_PATH if ESTIMATOR_ENABLED else None)
+        return _estimator
+
+
+def record_job(job, metadata, etapas):
+    """
+    Registra el coste de un trabajo de la cola sin interrumpirlo si falla.
+
+    Args:
+        job: Job terminado (se lee su 'estimacion_s' y sus hilos medios)
+        metadata (dict): 'metadata' del resultado de run_transcription
+        etapas (dict): Segundos por etapa del trabajo
+    """
+    if metadata.get('desde_cache') or not metadata.get('duracion_audio'):
+        return
+    from src.resources import get_cpu_allocator
+
+    hilos = get_cpu_allocator().mean_threads(job.id)
+    try:
+        guardado = get_cost_estimator().record(
+            job.params['modelo'], metadata['modo'], metadata.get('perfil'), metadata['duracion_audio'],
+            etapas, hilos, metadata.get('silencio_omitido_s', 0.0),
+        )
+    except sqlite3.Error:
+        logger.exception('No se pudo registrar el coste del trabajo %s', job.id[:8])
+        return
+
+    estimado = job.params.get('estimacion_s')
+    if guardado and estimado and job.iniciado:
+        REGISTRY.observe('estimacion_error_ratio', (time.time() - job.iniciado) / estimado)
+
+
+def remaining_seconds(estimado, transcurrido, porcentaje):
+    """
+    Segundos que le quedan a un trabajo en curso.
+
+    Mezcla el total previsto antes de empezar con la extrapolación lineal del
+    progreso; la extrapolación gana peso a medida que avanza (raíz del
+    progreso), porque al principio la carga del modelo y la ingesta la falsean.
+    Si ya se superó la previsión y el progreso aún no dice nada, no se sabe.
+
+    Args:
+        estimado (float): Segundos de proceso previstos (None si no hay estimación)
+        transcurrido (float): Segundos desde que empezó
+        porcentaje (float): Progreso de 0 a 100
+
+    Returns:
+        float: Segundos restantes, o None si aún no hay forma de saberlo
+    """
+    p = max(0.0, min(1.0, porcentaje / 100))
+    lineal = transcurrido / p if p >= 0.05 else None
+    if estimado is None:
+        return None if lineal is None else lineal - transcurrido
+    if lineal is None:
+        return estimado - transcurrido if transcurrido < estimado else None
+    peso = p ** 0.5
+    return max(0.0, (1 - peso) * estimado + peso * lineal - transcurrido)
+
+
+def queue_wait(jobs, workers, ahora=None):
+    """
+    Segundos hasta que un trabajo nuevo empezaría a ejecutarse.
+
+    Simula la cola: cada worker queda libre cuando acaba su trabajo en curso y
+    los pendientes ocupan, en orden, el primero que se libera.
+
+    Args:
+        jobs (list): Trabajos activos de JobManager.active_jobs()
+        workers (int): Hilos de la cola
+        ahora (float): Instante actual (por defecto, time.time())
+
+    Returns:
+        float: Espera prevista
+    """
+    from src.jobs import PENDIENTE
+
+    ahora = ahora or time.time()
+    libres = []
+    pendientes = []
+    for job in jobs:
+        estimado = job.params.get('estimacion_s')
+        if job.estado == PENDIENTE:
+            pendientes.append(estimado or 0.0)
+        else:
+            restante = remaining_seconds(estimado, ahora - job.iniciado, job.progreso.snapshot()['porcentaje'])
+            libres.append(restante or 0.0)
+
+    libres = sorted(libres)[:workers] + [0.0] * max(0, workers - len(libres))
+    heapq.heapify(libres)
+    for estimado in pendientes:
+        heapq.heappush(libres, heapq.heappop(libres) + estimado)
+    return libres[0]
+
+
+def admit(manager, modelo, duracion, perfil=None, modo='secuencial', presupuesto=LATENCY_BUDGET_S,
+          politica=ADMISSION_POLICY):
+    """
+    Decide si un trabajo entra en la cola según el presupuesto de latencia.
+
+    Args:
+        manager: JobManager al que se enviará el trabajo
+        modelo (str): Modelo de Whisper
+        duracion (float): Segundos de audio (None si no se pudo saber: se admite sin estimación)
+        perfil (str): Perfil de decodificación (None: DECODE_PROFILE)
+        modo (str): Modo que usará run_transcription
+        presupuesto (float): Espera más proceso máximos (0 = sin control)
+        politica (str): 'diferir' (a la cola de baja prioridad) o 'rechazar'
+
+    Returns:
+        dict: 'admitido', 'diferido', 'espera_s', 'proceso_s', 'total_s',
+            'presupuesto_s', 'reintentar_s' (si se pasa, en cuántos segundos cabría;
+            None si ni con la cola vacía) y 'motivo'
+    """
+    decision = {
+        'admitido': True, 'diferido': False, 'espera_s': None, 'proceso_s': None, 'total_s': None,
+        'presupuesto_s': presupuesto or None, 'reintentar_s': None, 'motivo': None,
+    }
+    if not duracion:
+        REGISTRY.inc('admision_total', decision='sin_estimacion')
+        return decision
+
+    estimacion = get_cost_estimator().estimate(modelo, duracion, perfil, modo)
+    espera = queue_wait(manager.active_jobs(), manager.workers)
+    decision.update(espera_s=espera, proceso_s=estimacion['segundos'], total_s=espera + estimacion['segundos'])
+
+    if not presupuesto or decision['total_s'] <= presupuesto:
+        REGISTRY.inc('admision_total', decision='admitido')
+        return decision
+
+    if estimacion['segundos'] > presupuesto:
+        decision['motivo'] = (f"El proceso se estima en {estimacion['segundos']:.0f} s y el presupuesto "
+                              f"es de {presupuesto:.0f} s")
+    else:
+        decision['motivo'] = (f"La cola tardaría {espera:.0f} s en llegar a este trabajo y el presupuesto "
+                              f"es de {presupuesto:.0f} s")
+        decision['reintentar_s'] = espera - (presupuesto - estimacion['segundos'])
+
+    if politica == 'rechazar':
+        decision['admitido'] = False
+        REGISTRY.inc('admision_total', decision='rechazado')
+    else:
+        decision['diferido'] = True
+        REGISTRY.inc('admision_total', decision='diferido')
+    logger.info('Admisión de %.0f s de audio con %s: %s (%s)', duracion, modelo,
+                'rechazado' if politica == 'rechazar' else 'diferido', decision['motivo'])
+    return decision
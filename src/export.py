@@ -1,86 +1,285 @@
 """
 Funciones para exportar transcripciones en diferentes formatos.
+
+Los formatos de texto (TXT, SRT, WebVTT, JSONL) se generan con generadores que
+emiten el documento por bloques de segmentos, de modo que se pueden escribir
+directamente en un archivo sin construir el documento completo en memoria.
 """
-from docx import Document
 from io import BytesIO
+from xml.sax.saxutils import escape as xml_escape
+import os
+import re
+import json
 import time
+import zipfile
+import functools
+import importlib.util
+
+
+from src.config import EXPORT_CHUNK_SEGMENTS
+from src.metrics import REGISTRY
+from src.segments import SegmentTable, format_clock, format_mmss
+
+
+def _table(segments):
+    """Segmentos en columnas (acepta la lista de dicts de Whisper o una SegmentTable)"""
+    return SegmentTable.from_segments(segments or [])
+
+
+def iter_txt(text, segments=None, chunk_size=EXPORT_CHUNK_SEGMENTS):
+    """
+    Genera la transcripción en formato TXT por bloques.
+
+    Args:
+        text (str): Texto de la transcripción
+        segments: Segmentos con timestamps, lista o SegmentTable (opcional)
+        chunk_size (int): Segmentos por bloque emitido
+
+    Yields:
+        str: Fragmentos consecutivos del archivo TXT
+    """
+    yield "=== TRANSCRIPCIÓN ===\n\n"
+    yield text
+
+    if segments:
+        yield "\n\n=== SEGMENTOS CON TIMESTAMPS ===\n\n"
+        for _, inicios, finales, textos in _table(segments).blocks(chunk_size):
+            yield ''.join(
+                f"[{inicio} - {fin}] {texto}\n"
+                for inicio, fin, texto in zip(format_mmss(inicios), format_mmss(finales), textos)
+            )
+
+
+def _iter_cues(segments, separator, chunk_size, numbered):
+    """Bloques de cues de subtítulos; los segmentos vacíos se omiten"""
+    index = 0
+    for _, inicios, finales, textos in _table(segments).blocks(chunk_size):
+        cues = []
+        for inicio, fin, texto in zip(format_clock(inicios, separator), format_clock(finales, separator), textos):
+            texto = texto.strip()
+            if not texto:
+                continue
+            if numbered:
+                index += 1
+                cues.append(f"{index}\n{inicio} --> {fin}\n{texto}\n\n")
+            else:
+                cues.append(f"{inicio} --> {fin}\n{texto}\n\n")
+        if cues:
+            yield ''.join(cues)
+
+
+def iter_srt(text, segments=None, chunk_size=EXPORT_CHUNK_SEGMENTS):
+    """Genera subtítulos SubRip (SRT) por bloques; los segmentos vacíos se omiten"""
+    yield from _iter_cues(segments, ',', chunk_size, numbered=True)
+
+
+def iter_vtt(text, segments=None, chunk_size=EXPORT_CHUNK_SEGMENTS):
+    """Genera subtítulos WebVTT por bloques; los segmentos vacíos se omiten"""
+    yield "WEBVTT\n\n"
+    yield from _iter_cues(segments, '.', chunk_size, numbered=False)
+
+
+def iter_jsonl(text, segments=None, chunk_size=EXPORT_CHUNK_SEGMENTS):
+    """Genera un objeto JSON por línea y segmento (o uno solo con el texto si no hay segmentos)"""
+    if not segments:
+        yield json.dumps({'text': text}, ensure_ascii=False) + '\n'
+        return
+
+    for primero, inicios, finales, textos in _table(segments).blocks(chunk_size):
+        yield ''.join(
+            json.dumps({'id': primero + k, 'start': inicio, 'end': fin, 'text': texto}, ensure_ascii=False) + '\n'
+            for k, (inicio, fin, texto) in enumerate(zip(inicios.tolist(), finales.tolist(), textos))
+        )
 
 
 def export_txt(text, segments=None):
     """
     Exporta la transcripción a formato TXT.
-    
+
     Args:
         text (str): Texto de la transcripción
         segments (list): Lista de segmentos con timestamps (opcional)
-    
+
     Returns:
         str: Contenido del archivo TXT
     """
-    output = []
-    output.append("=== TRANSCRIPCIÓN ===\n\n")
-    output.append(text)
-    
+    return ''.join(iter_txt(text, segments))
+
+
+def export_srt(text, segments=None):
+    """Exporta la transcripción a subtítulos SRT"""
+    return ''.join(iter_srt(text, segments))
+
+
+def export_vtt(text, segments=None):
+    """Exporta la transcripción a subtítulos WebVTT"""
+    return ''.join(iter_vtt(text, segments))
+
+
+def export_jsonl(text, segments=None):
+    """Exporta los segmentos como JSON Lines"""
+    return ''.join(iter_jsonl(text, segments))
+
+
+# Caracteres que XML 1.0 no admite (python-docx rechazaría el texto)
+_XML_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# Saltos de línea y tabuladores van como elementos propios dentro de la run, como en python-docx
+_RUN_ESPECIALES = re.compile('([\t\n\r])')
+
+
+@functools.lru_cache(maxsize=1)
+def _docx_template():
+    """
+    Lee una vez la plantilla por defecto de python-docx (estilos, tema, propiedades).
+
+    Returns:
+        tuple: (partes [(nombre, bytes)] salvo word/document.xml, cabecera del
+            document.xml hasta <w:body>, cierre desde <w:sectPr>)
+    """
+    spec = importlib.util.find_spec('docx')
+    if spec is None:
+        raise ImportError('python-docx no está instalado')
+    ruta = os.path.join(os.path.dirname(spec.origin), 'templates', 'default.docx')
+
+    with zipfile.ZipFile(ruta) as plantilla:
+        partes = [
+            (nombre, plantilla.read(nombre))
+            for nombre in plantilla.namelist() if nombre != 'word/document.xml'
+        ]
+        documento = plantilla.read('word/document.xml').decode('utf-8')
+
+    inicio_body = documento.index('<w:body>') + len('<w:body>')
+    inicio_sect = documento.index('<w:sectPr', inicio_body)
+    return partes, documento[:inicio_body], documento[inicio_sect:]
+
+
+def _docx_paragraph(text, style=None):
+    """XML de un párrafo con una run, como doc.add_paragraph/add_heading de python-docx"""
+    propiedades = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    text = _XML_INVALIDO.sub('', text)
+    if not text:
+        return f'<w:p>{propiedades}</w:p>'
+
+    contenido = []
+    for parte in _RUN_ESPECIALES.split(text):
+        if parte == '\t':
+            contenido.append('<w:tab/>')
+        elif parte in ('\n', '\r'):
+            contenido.append('<w:br/>')
+        elif parte:
+            espacio = ' xml:space="preserve"' if parte[0].isspace() or parte[-1].isspace() else ''
+            contenido.append(f'<w:t{espacio}>{xml_escape(parte)}</w:t>')
+    return f'<w:p>{propiedades}<w:r>{"".join(contenido)}</w:r></w:p>'
+
+
+def _iter_docx_body(text, segments, chunk_size):
+    """Párrafos del cuerpo del documento por bloques"""
+    yield _docx_paragraph('Transcripción de Audio', 'Title')
+
+    # Añadir información general
+    yield _docx_paragraph('Información', 'Heading1')
+    yield _docx_paragraph(f'Fecha de transcripción: {time.strftime("%Y-%m-%d %H:%M:%S")}')
     if segments:
-        output.append("\n\n=== SEGMENTOS CON TIMESTAMPS ===\n\n")
-        for segmento in segments:
-            inicio = int(segmento['start'])
-            fin = int(segmento['end'])
-            texto_seg = segmento['text']
-            
-            inicio_min = inicio // 60
-            inicio_sec = inicio % 60
-            fin_min = fin // 60
-            fin_sec = fin % 60
-            
-            output.append(f"[{inicio_min:02d}:{inicio_sec:02d} - {fin_min:02d}:{fin_sec:02d}] {texto_seg}\n")
-    
-    return ''.join(output)
+        yield _docx_paragraph(f'Número de segmentos: {len(segments)}')
+
+    # Añadir transcripción completa
+    yield _docx_paragraph('Transcripción Completa', 'Heading1')
+    yield _docx_paragraph(text)
+
+    # Añadir segmentos con timestamps si están disponibles
+    if segments:
+        yield _docx_paragraph('Segmentos con Timestamps', 'Heading1')
+        for _, inicios, finales, textos in _table(segments).blocks(chunk_size):
+            yield ''.join(
+                _docx_paragraph(f"[{inicio} - {fin}] {texto}")
+                for inicio, fin, texto in zip(format_mmss(inicios), format_mmss(finales), textos)
+            )
+
+
+def write_docx(text, segments, fileobj, chunk_size=EXPORT_CHUNK_SEGMENTS):
+    """
+    Escribe la transcripción como DOCX directamente en el contenedor ZIP.
+
+    En lugar de construir el árbol de objetos de python-docx, copia las partes de
+    su plantilla por defecto y escribe el XML del cuerpo (word/document.xml)
+    bloque a bloque dentro del ZIP. El documento es el mismo que generaba
+    doc.add_heading/add_paragraph: mismos párrafos, estilos y textos.
+
+    Args:
+        text (str): Texto de la transcripción
+        segments: Segmentos con timestamps, lista o SegmentTable (opcional)
+        fileobj: Objeto binario con write (no hace falta que admita seek)
+        chunk_size (int): Segmentos por bloque escrito
+    """
+    partes, cabecera, cierre = _docx_template()
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as docx:
+        for nombre, datos in partes:
+            if nombre == '[Content_Types].xml':
+                docx.writestr(nombre, datos)  # Word espera esta parte la primera
+        with docx.open('word/document.xml', 'w', force_zip64=True) as documento:
+            documento.write(cabecera.encode('utf-8'))
+            for bloque in _iter_docx_body(text, segments, chunk_size):
+                documento.write(bloque.encode('utf-8'))
+            documento.write(cierre.encode('utf-8'))
+        for nombre, datos in partes:
+            if nombre != '[Content_Types].xml':
+                docx.writestr(nombre, datos)
 
 
 def export_docx(text, segments=None):
     """
     Exporta la transcripción a formato DOCX con timestamps opcionales.
-    
+
     Args:
         text (str): Texto de la transcripción
-        segments (list): Lista de segmentos con timestamps (opcional)
-    
+        segments: Segmentos con timestamps, lista o SegmentTable (opcional)
+
     Returns:
         bytes: Contenido del archivo DOCX
     """
-    doc = Document()
-    doc.add_heading('Transcripción de Audio', 0)
-    
-    # Añadir información general
-    doc.add_heading('Información', level=1)
-    doc.add_paragraph(f'Fecha de transcripción: {time.strftime("%Y-%m-%d %H:%M:%S")}')
-    if segments:
-        doc.add_paragraph(f'Número de segmentos: {len(segments)}')
-    
-    # Añadir transcripción completa
-    doc.add_heading('Transcripción Completa', level=1)
-    doc.add_paragraph(text)
-    
-    # Añadir segmentos con timestamps si están disponibles
-    if segments:
-        doc.add_heading('Segmentos con Timestamps', level=1)
-        for segmento in segments:
-            inicio = int(segmento['start'])
-            fin = int(segmento['end'])
-            texto_seg = segmento['text']
-            
-            # Formatear tiempo
-            inicio_min = inicio // 60
-            inicio_sec = inicio % 60
-            fin_min = fin // 60
-            fin_sec = fin % 60
-            
-            doc.add_paragraph(f'[{inicio_min:02d}:{inicio_sec:02d} - {fin_min:02d}:{fin_sec:02d}] {texto_seg}')
-    
-    # Guardar en BytesIO
     bio = BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    return bio.read()
+    write_docx(text, segments, bio)
+    return bio.getvalue()
+
+
+# Formatos disponibles: los de texto se generan en streaming con su writer
+EXPORT_FORMATS = {
+    'txt': {'nombre': 'TXT', 'extension': 'txt', 'mime': 'text/plain', 'writer': iter_txt},
+    'docx': {
+        'nombre': 'DOCX',
+        'extension': 'docx',
+        'mime': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'writer': None,
+    },
+    'srt': {'nombre': 'SRT', 'extension': 'srt', 'mime': 'application/x-subrip', 'writer': iter_srt},
+    'vtt': {'nombre': 'WebVTT', 'extension': 'vtt', 'mime': 'text/vtt', 'writer': iter_vtt},
+    'jsonl': {'nombre': 'JSONL', 'extension': 'jsonl', 'mime': 'application/x-ndjson', 'writer': iter_jsonl},
+}
 
+
+def write_export(fmt, text, segments, fileobj):
+    """
+    Escribe una exportación en un archivo binario abierto, bloque a bloque.
+
+    Args:
+        fmt (str): Clave de EXPORT_FORMATS
+        text (str): Texto de la transcripción
+        segments (list): Lista de segmentos con timestamps
+        fileobj: Objeto con método write(bytes)
+    """
+    inicio = time.perf_counter()
+    writer = EXPORT_FORMATS[fmt]['writer']
+    if writer is None:
+        write_docx(text, segments, fileobj)
+    else:
+        for chunk in writer(text, segments):
+            fileobj.write(chunk.encode('utf-8'))
+
+    REGISTRY.observe('exportacion_segundos', time.perf_counter() - inicio, formato=fmt)
+
+
+def export_bytes(fmt, text, segments=None):
+    """Genera una exportación completa como bytes (para descargas)"""
+    bio = BytesIO()
+    write_export(fmt, text, segments, bio)
+    return bio.getvalue()
@@ -0,0 +1,300 @@
+"""
+Cola de trabajos de transcripción en segundo plano.
+
+Los trabajos se ejecutan en un número fijo de hilos dimensionado a la máquina,
+independientes de la ejecución del script de Streamlit. La cola es FIFO dentro
+de cada usuario y reparte por turnos entre usuarios, de modo que quien sube
+muchos archivos no bloquea al resto. Los trabajos diferidos por el control de
+admisión (ver src/estimator.py) esperan en una cola aparte que solo avanza
+cuando la normal está vacía. Los resultados se conservan un tiempo en memoria
+del proceso para poder recuperarlos tras recargar la página.
+"""
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from src.config import JOB_WORKERS, JOB_RESULT_TTL_S
+from src.metrics import REGISTRY
+from src.progress import ProgressTracker, TranscriptionCancelled
+from src.resources import get_cpu_allocator
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+CANCELADO = 'cancelado'
+
+ESTADOS_FINALES = (COMPLETADO, ERROR, CANCELADO)
+
+
+class Job:
+    """Un trabajo de la cola con su progreso y su resultado"""
+    def __init__(self, func, usuario, params, cleanup=None, diferido=False):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.usuario = usuario
+        self.params = params
+        self.cleanup = cleanup
+        self.diferido = diferido
+        self.estado = PENDIENTE
+        self.resultado = None
+        self.error = None
+        self.progreso = ProgressTracker()
+        self.creado = time.time()
+        self.iniciado = None
+        self.finalizado = None
+
+    @property
+    def duracion(self):
+        """Segundos desde que se envió hasta que terminó (o hasta ahora)"""
+        return (self.finalizado or time.time()) - self.creado
+
+    @property
+    def activo(self):
+        return self.estado not in ESTADOS_FINALES
+
+
+class JobManager:
+    """Ejecuta trabajos con un pool acotado de hilos y reparto justo entre usuarios"""
+    def __init__(self, workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL_S):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._cond = threading.Condition()
+        self._jobs = {}
+        # usuario -> cola FIFO de sus trabajos; el orden del dict es el turno
+        self._queues = OrderedDict()
+        self._deferred = deque()  # Trabajos fuera del presupuesto de latencia, en orden de llegada
+        self._running = 0
+        self._threads = []
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'transcripcion-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, usuario='anonimo', cleanup=None, diferido=False, **params):
+        """
+        Encola un trabajo.
+
+        Args:
+            func (callable): Función que recibe el Job y devuelve el resultado
+            usuario (str): Identificador del usuario para el reparto justo
+            cleanup (callable): Se llama con el Job al terminar en cualquier estado (opcional)
+            diferido (bool): A la cola de baja prioridad, que solo avanza sin trabajos normales
+            **params: Parámetros del trabajo, accesibles como job.params
+
+        Returns:
+            str: Identificador del trabajo
+        """
+        job = Job(func, usuario, params, cleanup, diferido)
+        with self._cond:
+            self._purge()
+            self._jobs[job.id] = job
+            if diferido:
+                self._deferred.append(job)
+            else:
+                self._queues.setdefault(usuario, deque()).append(job)
+            self._cond.notify()
+
+        logger.info('Trabajo %s encolado (usuario %s%s)', job.id[:8], usuario, ', diferido' if diferido else '')
+        return job.id
+
+    def add_finished(self, resultado, usuario='anonimo', **params):
+        """Registra un trabajo ya resuelto (por ejemplo, un acierto de caché)"""
+        job = Job(None, usuario, params)
+        job.estado = COMPLETADO
+        job.resultado = resultado
+        job.iniciado = job.finalizado = time.time()
+        with self._cond:
+            self._purge()
+            self._jobs[job.id] = job
+        return job.id
+
+    def get(self, job_id):
+        """Devuelve el Job o None si no existe (o ya se purgó)"""
+        if not job_id:
+            return None
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        """Posición aproximada (1 = siguiente) de un trabajo pendiente, o 0"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.estado != PENDIENTE:
+                return 0
+            if job.diferido:
+                normales = sum(len(queue) for queue in self._queues.values())
+                return normales + self._deferred.index(job) + 1
+            # Simula los turnos: cada ronda atiende un trabajo por usuario
+            queue = self._queues.get(job.usuario, ())
+            rank = next((i for i, queued in enumerate(queue) if queued is job), 0)
+            ahead = rank
+            before = True
+            for user_queue in self._queues.values():
+                if user_queue is queue:
+                    before = False
+                    continue
+                # Los usuarios anteriores en el turno pasan una vez más en la ronda actual
+                ahead += min(len(user_queue), rank + 1 if before else rank)
+            return ahead + 1
+
+    def cancel(self, job_id):
+        """Cancela un trabajo pendiente o pide parar uno en curso"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or not job.activo:
+                return False
+
+            if job.estado == PENDIENTE:
+                if job.diferido:
+                    self._deferred.remove(job)
+                else:
+                    queue = self._queues.get(job.usuario)
+                    if queue is not None:
+                        queue.remove(job)
+                        if not queue:
+                            del self._queues[job.usuario]
+                self._finish(job, CANCELADO)
+                return True
+
+        # En curso: el bucle de decodificación lo detiene en la próxima ventana
+        job.progreso.cancel()
+        return True
+
+    def stats(self):
+        """Número de trabajos pendientes (incluidos los diferidos) y en curso"""
+        with self._cond:
+            pending = sum(len(queue) for queue in self._queues.values())
+            return {
+                'pendientes': pending + len(self._deferred),
+                'diferidos': len(self._deferred),
+                'en_curso': self._running,
+                'workers': self.workers,
+            }
+
+    def active_jobs(self):
+        """Trabajos en curso y pendientes, en el orden aproximado en que se ejecutarán"""
+        with self._cond:
+            activos = [job for job in self._jobs.values() if job.activo]
+        # Los diferidos, detrás de todos los normales
+        return sorted(activos, key=lambda job: (job.estado == PENDIENTE, job.diferido, job.creado))
+
+    def find_active(self, usuario, **params):
+        """
+        Trabajo pendiente o en curso del usuario con esos parámetros (p. ej. clave_cache).
+
+        Sirve para no encolar dos veces el mismo audio: el segundo trabajo repetiría
+        la transcripción sin poder usar el punto de control del primero.
+
+        Returns:
+            Job: El más antiguo que coincide, o None
+        """
+        with self._cond:
+            coinciden = [
+                job for job in self._jobs.values()
+                if job.activo and job.usuario == usuario
+                and all(job.params.get(k) == v for k, v in params.items())
+            ]
+        return min(coinciden, key=lambda job: job.creado, default=None)
+
+    def collect_metrics(self):
+        """Gauges de la cola para el registro de métricas"""
+        stats = self.stats()
+        return [
+            ('trabajos_en_cola', 'Trabajos pendientes', stats['pendientes']),
+            ('trabajos_diferidos', 'Trabajos pendientes fuera del presupuesto de latencia', stats['diferidos']),
+            ('trabajos_en_curso', 'Trabajos ejecutándose', stats['en_curso']),
+            ('trabajos_workers', 'Hilos de la cola', stats['workers']),
+        ]
+
+    def _next_job(self):
+        """Saca el siguiente trabajo respetando el turno entre usuarios (los diferidos, al final)"""
+        if not self._queues:
+            return self._deferred.popleft()
+        usuario, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        # El usuario pasa al final del turno (o sale si no le quedan trabajos)
+        del self._queues[usuario]
+        if queue:
+            self._queues[usuario] = queue
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._deferred:
+                    self._cond.wait()
+                job = self._next_job()
+                job.estado = EN_CURSO
+                job.iniciado = time.time()
+                self._running += 1
+
+            REGISTRY.observe('trabajos_espera_segundos', job.iniciado - job.creado)
+
+            logger.info('Trabajo %s iniciado', job.id[:8])
+
+            # Parte de la CPU del trabajo; el presupuesto de hilos del proceso se reajusta entre ventanas
+            allocator = get_cpu_allocator()
+            try:
+                allocator.acquire(job.id, job.params.get('modelo'))
+                job.progreso.add_listener(allocator.apply)
+                allocator.apply()
+                resultado = job.func(job)
+            except TranscriptionCancelled:
+                estado, resultado = CANCELADO, None
+            except Exception as e:
+                logger.exception('Trabajo %s falló', job.id[:8])
+                job.error = str(e)
+                estado, resultado = ERROR, None
+            else:
+                estado = COMPLETADO
+            finally:
+                allocator.release(job.id)
+
+            with self._cond:
+                job.resultado = resultado
+                self._running -= 1
+                self._finish(job, estado)
+
+    def _finish(self, job, estado):
+        """Marca el trabajo como terminado y ejecuta su limpieza (con el lock tomado)"""
+        job.estado = estado
+        job.finalizado = time.time()
+        REGISTRY.inc('trabajos_total', estado=estado)
+        logger.info('Trabajo %s terminado: %s (%.1f s)', job.id[:8], estado, job.duracion)
+
+        if job.cleanup is not None:
+            try:
+                job.cleanup(job)
+            except Exception:
+                logger.exception('Error limpiando el trabajo %s', job.id[:8])
+
+    def _purge(self):
+        """Olvida los trabajos terminados hace más de result_ttl segundos"""
+        limit = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if not job.activo and job.finalizado < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Devuelve el gestor de trabajos del proceso, creándolo en el primer uso"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+            REGISTRY.add_collector(_manager.collect_metrics)
+        return _manager
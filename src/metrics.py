@@ -0,0 +1,257 @@
+"""
+Métricas de rendimiento: tiempos por etapa y exposición en formato Prometheus.
+
+Cada trabajo lleva un StageTimer que acumula el tiempo de sus etapas (ingesta,
+carga del modelo, mel, encoder, decodificación...). Al terminar, el trabajo se
+publica como una línea de log JSON y alimenta los histogramas del registro del
+proceso, que se sirven como texto de Prometheus en /metrics si se configura
+TRANSCRIPT_METRICS_PORT. Con TRANSCRIPT_METRICS=0 los timers son nulos y el
+registro ignora las observaciones.
+"""
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+from src.config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Acumula segundos por etapa y contadores de un trabajo"""
+    def __init__(self):
+        self.etapas = {}
+        self.contadores = {}
+
+    @contextmanager
+    def stage(self, nombre):
+        """Mide el bloque y suma su duración a la etapa (se puede repetir por ventana)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(nombre, time.perf_counter() - inicio)
+
+    def add(self, nombre, segundos):
+        self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+
+    def count(self, nombre, n=1):
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+
+class _NullTimer:
+    """Timer que no mide nada (instrumentación desactivada o no pedida)"""
+    etapas = {}
+    contadores = {}
+    _nulo = nullcontext()
+
+    def stage(self, nombre):
+        return self._nulo
+
+    def add(self, nombre, segundos):
+        pass
+
+    def count(self, nombre, n=1):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def new_timer():
+    """Devuelve un StageTimer, o el timer nulo si las métricas están desactivadas"""
+    return StageTimer() if METRICS_ENABLED else NULL_TIMER
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class MetricsRegistry:
+    """Contadores e histogramas del proceso, con salida en texto de Prometheus"""
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._meta = {}  # nombre -> (tipo, ayuda, buckets)
+        self._counters = {}  # (nombre, labels) -> valor
+        self._histograms = {}  # (nombre, labels) -> [cuentas por bucket, suma, total]
+        self._collectors = []
+
+    def counter(self, nombre, ayuda):
+        self._meta[nombre] = ('counter', ayuda, None)
+
+    def histogram(self, nombre, ayuda, buckets):
+        self._meta[nombre] = ('histogram', ayuda, tuple(sorted(buckets)))
+
+    def add_collector(self, func):
+        """
+        Registra una función que se consulta al generar la salida (para gauges).
+
+        Args:
+            func (callable): Devuelve una lista de (nombre, ayuda, valor)
+        """
+        self._collectors.append(func)
+
+    def inc(self, nombre, valor=1, **labels):
+        if not self.enabled:
+            return
+        clave = (nombre, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[clave] = self._counters.get(clave, 0) + valor
+
+    def observe(self, nombre, valor, **labels):
+        if not self.enabled:
+            return
+        buckets = self._meta[nombre][2]
+        clave = (nombre, tuple(sorted(labels.items())))
+        with self._lock:
+            datos = self._histograms.get(clave)
+            if datos is None:
+                datos = self._histograms[clave] = [[0] * len(buckets), 0.0, 0]
+            i = bisect.bisect_left(buckets, valor)
+            if i < len(buckets):
+                datos[0][i] += 1
+            datos[1] += valor
+            datos[2] += 1
+
+    def render(self):
+        """Texto en el formato de exposición de Prometheus"""
+        lineas = []
+        with self._lock:
+            for nombre, (tipo, ayuda, buckets) in self._meta.items():
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} {tipo}')
+                if tipo == 'counter':
+                    for (n, labels), valor in self._counters.items():
+                        if n == nombre:
+                            lineas.append(f'{nombre}{_format_labels(labels)} {valor}')
+                    continue
+
+                for (n, labels), (cuentas, suma, total) in self._histograms.items():
+                    if n != nombre:
+                        continue
+                    acumulado = 0
+                    for limite, cuenta in zip(buckets, cuentas):
+                        acumulado += cuenta
+                        lineas.append(f'{nombre}_bucket{_format_labels(labels + (("le", limite),))} {acumulado}')
+                    lineas.append(f'{nombre}_bucket{_format_labels(labels + (("le", "+Inf"),))} {total}')
+                    lineas.append(f'{nombre}_sum{_format_labels(labels)} {suma}')
+                    lineas.append(f'{nombre}_count{_format_labels(labels)} {total}')
+
+        for collector in self._collectors:
+            try:
+                valores = collector()
+            except Exception:
+                logger.exception('Error en un colector de métricas')
+                continue
+            for nombre, ayuda, valor in valores:
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} gauge')
+                lineas.append(f'{nombre} {valor}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.histogram(
+    'transcripcion_rtf', 'Factor de tiempo real (segundos de cómputo por segundo de audio)',
+    (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5),
+)
+REGISTRY.histogram(
+    'transcripcion_etapa_segundos', 'Duración de cada etapa de una transcripción',
+    (0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300, 1200),
+)
+REGISTRY.counter('transcripcion_fallbacks_total', 'Reintentos por temperatura en la decodificación')
+REGISTRY.counter('transcripcion_fallbacks_agotados_total', 'Ventanas que se quedaron sin reintento por el límite del perfil')
+REGISTRY.counter('trabajos_total', 'Trabajos terminados por estado')
+REGISTRY.histogram(
+    'trabajos_espera_segundos', 'Tiempo en cola hasta empezar',
+    (0.1, 1, 5, 15, 60, 300, 900, 3600),
+)
+REGISTRY.histogram(
+    'exportacion_segundos', 'Duración de la generación de cada exportación',
+    (0.001, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+
+def log_event(evento, **campos):
+    """Publica un evento como una línea JSON en el log"""
+    if METRICS_ENABLED:
+        logger.info(json.dumps({'evento': evento, **campos}, ensure_ascii=False, default=str))
+
+
+def record_transcription(modelo, modo, duracion_audio, timer, **campos):
+    """
+    Publica las métricas de una transcripción terminada.
+
+    Args:
+        modelo (str): Nombre del modelo
+        modo (str): 'secuencial', 'lotes', 'cascada', 'paralelo' o 'cache'
+        duracion_audio (float): Segundos de audio (None si no se decodificó)
+        timer: StageTimer del trabajo
+        **campos: Campos extra para el log JSON (por ejemplo, el id del trabajo)
+    """
+    if not METRICS_ENABLED:
+        return
+
+    computo = timer.etapas.get('transcripcion')
+    rtf = computo / duracion_audio if computo and duracion_audio else None
+    if rtf is not None:
+        REGISTRY.observe('transcripcion_rtf', rtf, modelo=modelo, modo=modo)
+    for etapa, segundos in timer.etapas.items():
+        REGISTRY.observe('transcripcion_etapa_segundos', segundos, etapa=etapa)
+    if timer.contadores.get('fallbacks'):
+        REGISTRY.inc('transcripcion_fallbacks_total', timer.contadores['fallbacks'], modelo=modelo)
+    if timer.contadores.get('fallbacks_agotados'):
+        REGISTRY.inc('transcripcion_fallbacks_agotados_total', timer.contadores['fallbacks_agotados'], modelo=modelo)
+
+    log_event(
+        'transcripcion', modelo=modelo, modo=modo, duracion_audio=duracion_audio, rtf=rtf,
+        etapas={k: round(v, 4) for k, v in timer.etapas.items()}, contadores=timer.contadores, **campos
+    )
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port, registry=REGISTRY):
+    """
+    Sirve el registro en http://0.0.0.0:<port>/metrics (una vez por proceso).
+
+    Args:
+        port (int): Puerto TCP
+        registry (MetricsRegistry): Registro a exponer
+
+    Returns:
+        ThreadingHTTPServer: Servidor en marcha en un hilo daemon
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            cuerpo = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, format, *args):
+            pass  # Sin una línea de log por cada scrape
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+            threading.Thread(target=_server.serve_forever, name='metricas', daemon=True).start()
+            logger.info('Métricas en http://0.0.0.0:%d/metrics', port)
+        return _server
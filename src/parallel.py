@@ -0,0 +1,383 @@
+"""
+Transcripción paralela por fragmentos en varios procesos.
+
+El audio se decodifica una sola vez a un PCM en disco, se corta en los silencios más cercanos a
+puntos equidistantes y cada fragmento se transcribe en un proceso que mantiene
+su propio modelo cargado. Al final los segmentos se reensamblan con los tiempos
+corregidos y sin el texto repetido en las zonas de solape.
+"""
+import os
+import re
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from src.config import (
+    PARALLEL_WORKERS,
+    PARALLEL_MIN_CHUNK_S,
+    PARALLEL_SILENCE_SEARCH_S,
+    PARALLEL_OVERLAP_S,
+    PARALLEL_CANCEL_POLL_S,
+)
+from src.audio import SAMPLE_RATE, decode_file
+from src.transcription import DECODE_OPTIONS, transcribe_audio
+
+MEL_FRAMES_PER_SECOND = 100  # Frames de mel por segundo (hop de 160 muestras)
+ENERGY_FRAME_S = 0.1  # Resolución del análisis de energía para buscar cortes
+
+# Modelo cargado en cada proceso worker (se inicializa una vez por proceso)
+_worker_model = None
+_worker_share = None  # (hilos, núcleos) aplicados en el worker
+
+# Pools reutilizados entre transcripciones para no recargar el modelo, por (modelo, workers)
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def _init_worker(model_name, threads):
+    """Inicializa un proceso worker: limita hilos de torch y carga el modelo"""
+    global _worker_model
+    from src.transcription import build_model
+
+    _apply_share(threads, ())
+    _worker_model = build_model(model_name)
+
+
+def _apply_share(threads, cores):
+    """Aplica en el worker los hilos (y núcleos) del trabajo al que sirve, si cambiaron"""
+    global _worker_share
+    if _worker_share == (threads, cores):
+        return
+    import torch
+    from src.resources import pin_process
+
+    _worker_share = (threads, cores)
+    torch.set_num_threads(threads)
+    if cores:
+        pin_process(cores)
+
+
+def _transcribe_chunk(pcm_path, start, end, transcribe_kwargs, threads, cores):
+    """Transcribe las muestras [start, end) del PCM float32 compartido en disco"""
+    # El pool puede servir a varios trabajos: cada fragmento usa la parte del suyo
+    _apply_share(threads, cores)
+    audio = np.memmap(pcm_path, dtype=np.float32, mode='r')
+    chunk = np.array(audio[start:end], dtype=np.float32)
+    # transcribe_audio aplica las mismas opciones y la misma detección de voz que el modo secuencial
+    # (el límite de tiempo en reintentos del perfil se aplica a cada fragmento)
+    result = transcribe_audio(
+        _worker_model, chunk, transcribe_kwargs.get('language'), profile=transcribe_kwargs.get('perfil')
+    )
+    return {
+        'text': result['text'],
+        'segments': result['segments'],
+        'language': result['language'],
+        'omitido_s': result.get('vad', {}).get('omitido_s', 0.0),
+        'fallbacks': result.get('fallbacks'),
+    }
+
+
+class _SharedPool:
+    """Pool de procesos de un modelo y número de transcripciones que lo están usando"""
+    def __init__(self, key, pool):
+        self.key = key
+        self.pool = pool
+        self.usuarios = 0
+
+
+def _get_pool(model_name, workers, threads):
+    """
+    Reserva el pool de procesos para el modelo, creándolo si hace falta.
+
+    Cada reserva se devuelve con _release_pool. Un pool con transcripciones en
+    curso nunca se cierra desde otra; los libres de otros modelos se cierran al
+    crear uno nuevo para no duplicar modelos en memoria.
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+        workers (int): Número de procesos
+        threads (int): Hilos de torch con los que arranca cada proceso
+
+    Returns:
+        _SharedPool: Pool reservado
+    """
+    key = (model_name, workers)
+    with _pool_lock:
+        for other in [k for k, shared in _pools.items() if k != key and shared.usuarios == 0]:
+            _pools.pop(other).pool.shutdown(wait=False)
+
+        shared = _pools.get(key)
+        if shared is None:
+            shared = _pools[key] = _SharedPool(key, ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn evita heredar el estado de OpenMP/torch del proceso padre
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_name, threads),
+            ))
+        shared.usuarios += 1
+        return shared
+
+
+def _release_pool(shared):
+    """Devuelve una reserva; un pool ya descartado se cierra al soltarlo su último usuario"""
+    with _pool_lock:
+        shared.usuarios -= 1
+        if shared.usuarios == 0 and _pools.get(shared.key) is not shared:
+            shared.pool.shutdown(wait=False)
+
+
+def _discard_pool(shared):
+    """Retira un pool roto (un worker murió) para que las siguientes transcripciones creen otro"""
+    with _pool_lock:
+        if _pools.get(shared.key) is shared:
+            del _pools[shared.key]
+
+
+def _frame_energy(audio, frame):
+    """Energía media por frame calculada por bloques para acotar memoria"""
+    n_frames = len(audio) // frame
+    energy = np.empty(n_frames, dtype=np.float32)
+    block = 600  # frames por bloque (60 s con frames de 0.1 s)
+
+    for i in range(0, n_frames, block):
+        n = min(block, n_frames - i)
+        samples = np.asarray(audio[i * frame:(i + n) * frame], dtype=np.float32).reshape(n, frame)
+        energy[i:i + n] = np.einsum('ij,ij->i', samples, samples) / frame
+
+    return energy
+
+
+def find_split_points(audio, n_chunks, search_s=PARALLEL_SILENCE_SEARCH_S):
+    """
+    Busca puntos de corte en silencios cercanos a posiciones equidistantes.
+
+    Args:
+        audio (np.ndarray): Audio mono a 16 kHz
+        n_chunks (int): Número de fragmentos deseado
+        search_s (float): Margen en segundos alrededor de cada corte ideal
+
+    Returns:
+        list: Índices de muestra de los límites, empezando en 0 y terminando en len(audio)
+    """
+    total = len(audio)
+    if n_chunks <= 1 or total == 0:
+        return [0, total]
+
+    frame = int(SAMPLE_RATE * ENERGY_FRAME_S)
+    energy = _frame_energy(audio, frame)
+    if len(energy) == 0:
+        return [0, total]
+
+    # Suavizar para no cortar en un hueco de un solo frame entre palabras
+    energy = np.convolve(energy, np.ones(5, dtype=np.float32) / 5, mode='same')
+    search = int(search_s / ENERGY_FRAME_S)
+
+    cuts = [0]
+    for k in range(1, n_chunks):
+        target = int(len(energy) * k / n_chunks)
+        lo = max(target - search, cuts[-1] // frame + 1)
+        hi = min(target + search + 1, len(energy))
+        if lo >= hi:
+            continue
+        best = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(best * frame + frame // 2)
+    cuts.append(total)
+
+    return cuts
+
+
+def _normalize_words(text):
+    """Palabras en minúsculas y sin puntuación para comparar solapes"""
+    return re.sub(r'[^\w\s]', '', text.lower()).split()
+
+
+def _strip_overlap(previous_text, text, max_words=8):
+    """Quita del inicio de text las palabras que repiten el final de previous_text"""
+    previous = _normalize_words(previous_text)
+    words = text.split()
+    current = _normalize_words(text)
+    if len(current) != len(words):
+        # La normalización eliminó palabras completas; no arriesgamos el recorte
+        return text
+
+    for k in range(min(max_words, len(previous), len(current)), 0, -1):
+        # Una sola palabra coincidente no basta salvo que sea todo el segmento
+        if k < 2 and k != len(current):
+            break
+        if previous[-k:] == current[:k]:
+            rest = words[k:]
+            return ' ' + ' '.join(rest) if rest else ''
+
+    return text
+
+
+def merge_chunk_results(parts):
+    """
+    Une los resultados de cada fragmento en un único resultado de Whisper.
+
+    Args:
+        parts (list): Tuplas (offset_s, owned_from_s, result) ordenadas por tiempo,
+            donde owned_from_s es el corte real a partir del cual el fragmento
+            es responsable del audio (antes de él solo hay solape)
+
+    Returns:
+        dict: Resultado con 'text', 'segments' y 'language'
+    """
+    segments = []
+    languages = Counter()
+
+    for index, (offset, owned_from, result) in enumerate(parts):
+        languages[result.get('language')] += 1
+
+        for segment in result.get('segments', []):
+            segment = dict(segment)
+            segment['start'] += offset
+            segment['end'] += offset
+            segment['seek'] = segment.get('seek', 0) + round(offset * MEL_FRAMES_PER_SECOND)
+
+            if index > 0 and segments:
+                previous = segments[-1]
+
+                # Segmento completamente dentro del solape: ya lo cubrió el fragmento anterior
+                if segment['end'] <= owned_from + 0.1:
+                    continue
+
+                if segment['start'] < previous['end']:
+                    if _normalize_words(segment['text']) == _normalize_words(previous['text']):
+                        continue
+                    segment['text'] = _strip_overlap(previous['text'], segment['text'])
+                    if not segment['text'].strip():
+                        continue
+                    segment['start'] = max(segment['start'], previous['end'])
+                    segment['end'] = max(segment['end'], segment['start'])
+
+            segments.append(segment)
+
+    for i, segment in enumerate(segments):
+        segment['id'] = i
+
+    language = languages.most_common(1)[0][0] if languages else None
+
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': language,
+    }
+
+
+def transcribe_audio_parallel(model_name, audio, language=None, progress_tracker=None, workers=None, profile=None,
+                              job_id=None):
+    """
+    Transcribe un archivo repartiendo fragmentos entre varios procesos.
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper (cada worker carga el suyo)
+        audio: Ruta al archivo de audio o IngestedAudio ya decodificado
+        language (str): Idioma (None para auto-detección)
+        progress_tracker: Objeto ProgressTracker para actualizar progreso (opcional)
+        workers (int): Número de procesos (por defecto PARALLEL_WORKERS)
+        profile (str): Perfil de decodificación (None: DECODE_PROFILE)
+        job_id (str): Trabajo de la cola cuya parte de la CPU se reparte entre los
+            workers (None: todos los núcleos, fuera de la cola)
+
+    Returns:
+        dict: Resultado de la transcripción con el mismo formato que transcribe_audio
+    """
+    workers = workers or PARALLEL_WORKERS
+
+    threads, cores = max(1, (os.cpu_count() or 1) // workers), ()
+    if job_id is not None:
+        from src.resources import get_cpu_allocator
+
+        # Los workers cuentan contra la parte del trabajo, no contra el presupuesto del proceso
+        allocator = get_cpu_allocator()
+        reparto = allocator.worker_threads(job_id, workers)
+        if reparto is not None:
+            threads, cores = reparto
+            allocator.apply()
+
+    # Los workers leen el PCM desde disco con mmap en vez de recibirlo serializado
+    own_audio = isinstance(audio, str)
+    if own_audio:
+        audio = decode_file(audio)
+
+    try:
+        pcm = audio.pcm
+        pcm_path = audio.ruta_pcm
+        duration = len(pcm) / SAMPLE_RATE
+
+        n_chunks = max(1, min(workers, int(duration // PARALLEL_MIN_CHUNK_S)))
+        cuts = find_split_points(pcm, n_chunks)
+        overlap = int(PARALLEL_OVERLAP_S * SAMPLE_RATE)
+
+        transcribe_kwargs = dict(DECODE_OPTIONS)
+        if language and language != 'auto':
+            transcribe_kwargs['language'] = language
+        if profile:
+            transcribe_kwargs['perfil'] = profile
+
+        shared = _get_pool(model_name, workers, threads)
+        futures = {}
+
+        def part(i):
+            start = max(0, cuts[i] - overlap) if i > 0 else 0
+            return start / SAMPLE_RATE, cuts[i] / SAMPLE_RATE, results[i]
+
+        results = []
+        pending = set()
+        processed = 0.0
+        listos = 0  # Fragmentos iniciales consecutivos ya terminados
+        publicados = 0  # Segmentos unidos ya entregados al ProgressTracker
+        try:
+            for i in range(len(cuts) - 1):
+                start = max(0, cuts[i] - overlap) if i > 0 else 0
+                end = cuts[i + 1]
+                future = shared.pool.submit(_transcribe_chunk, pcm_path, start, end, transcribe_kwargs, threads, cores)
+                futures[future] = i
+            results = [None] * len(futures)
+
+            pending = set(futures)
+            while pending:
+                # Con espera acotada para ver la cancelación aunque ningún fragmento termine
+                done, pending = wait(pending, timeout=PARALLEL_CANCEL_POLL_S, return_when=FIRST_COMPLETED)
+                if progress_tracker:
+                    progress_tracker.check_cancelled()
+                for future in done:
+                    i = futures[future]
+                    results[i] = future.result()
+                    processed += (cuts[i + 1] - cuts[i]) / SAMPLE_RATE
+
+                if progress_tracker and done:
+                    # La unión no toca los fragmentos anteriores: los segmentos de un prefijo
+                    # terminado ya son definitivos y se publican en orden
+                    while listos < len(results) and results[listos] is not None:
+                        listos += 1
+                    nuevos = merge_chunk_results([part(i) for i in range(listos)])['segments'][publicados:]
+                    publicados += len(nuevos)
+                    progress_tracker.on_window(processed, nuevos)
+        except BrokenProcessPool:
+            _discard_pool(shared)
+            raise
+        finally:
+            # Si se cancela o falla, los fragmentos de este trabajo que no han empezado se descartan;
+            # los que están en marcha terminan solos y el pool sigue sirviendo a los demás trabajos
+            for future in pending:
+                future.cancel()
+            _release_pool(shared)
+
+        from src.decoding import FallbackBudget
+
+        merged = merge_chunk_results([part(i) for i in range(len(results))])
+        merged['fallbacks'] = FallbackBudget.combine(result['fallbacks'] for result in results)
+        omitido = sum(result['omitido_s'] for result in results)
+        if omitido:
+            merged['vad'] = {'omitido_s': omitido, 'fraccion_omitida': omitido / duration if duration else 0.0}
+        return merged
+    finally:
+        if own_audio:
+            audio.close()
@@ -0,0 +1,202 @@
+"""
+Flujo completo de transcripción de un archivo.
+
+Agrupa los pasos que antes vivían en app.py (caché, duración, carga del modelo,
+transcripción secuencial o paralela) para que los ejecute la cola de trabajos
+sin depender de la ejecución del script de Streamlit.
+"""
+import logging
+
+from src import startup
+from src.audio import ingest
+from src.cache import get_default_cache
+from src.cascade import refine_low_confidence
+from src.checkpoint import Checkpoint, purge_stale
+from src.config import (
+    CASCADE_DRAFT_MODEL, DECODE_BATCH_SIZE, DECODE_PROFILE, ESTIMATOR_ENABLED, PARALLEL_MIN_DURATION_S, STORE_ENABLED
+)
+from src.estimator import record_job
+from src.metrics import NULL_TIMER, StageTimer, new_timer, record_transcription
+from src.segments import SegmentTable
+from src.store import index_result
+from src.transcription import load_whisper_model, transcribe_audio, transcribe_audio_batched
+
+logger = logging.getLogger(__name__)
+
+
+def plan_mode(duration, parallel=False, cascade=False):
+    """
+    Modo que elegirá run_transcription para un audio (para estimar su coste antes de encolarlo).
+
+    Args:
+        duration (float): Segundos de audio
+        parallel (bool): Permitir el modo paralelo en audios largos
+        cascade (bool): Transcripción en cascada
+
+    Returns:
+        str: 'paralelo', 'cascada', 'lotes' o 'secuencial'
+    """
+    if parallel and not cascade and duration >= PARALLEL_MIN_DURATION_S:
+        return 'paralelo'
+    if cascade:
+        return 'cascada'
+    return 'lotes' if DECODE_BATCH_SIZE > 1 else 'secuencial'
+
+
+def run_transcription(source, model_name, language=None, parallel=False, progress=None, cache_key=None,
+                      name=None, timer=None, cascade=False, profile=None, job_id=None):
+    """
+    Transcribe un archivo aplicando caché y, si compensa, el modo paralelo.
+
+    Args:
+        source: Ruta al archivo o archivo abierto (por ejemplo, el UploadedFile)
+        model_name (str): Nombre del modelo de Whisper
+        language (str): Idioma (None o 'auto' para auto-detección)
+        parallel (bool): Permitir el modo paralelo en audios largos
+        progress: ProgressTracker del trabajo (opcional)
+        cache_key (str): Clave de caché del resultado (opcional)
+        name (str): Nombre original del archivo (opcional)
+        timer: StageTimer que recibe los tiempos de cada etapa (opcional)
+        cascade (bool): Borrador con CASCADE_DRAFT_MODEL y refinado con model_name de
+            los segmentos dudosos (desactiva el modo paralelo)
+        profile (str): Perfil de decodificación de DECODE_PROFILES (None: DECODE_PROFILE)
+        job_id (str): Trabajo de la cola; en modo paralelo sus workers usan su parte de la CPU
+
+    Returns:
+        dict: Resultado de Whisper ('text', 'segments' como SegmentTable, 'language') con 'metadata'
+    """
+    timer = timer or NULL_TIMER
+    cache = get_default_cache()
+    if cache_key:
+        with timer.stage('cache'):
+            result = cache.get(cache_key)
+        if result is not None:
+            result['segments'] = SegmentTable.from_segments(result['segments'])
+            result['metadata'] = {'desde_cache': True, 'modo': 'cache'}
+            return result
+
+    # Una sola lectura y decodificación; la duración sale del número de muestras
+    if progress is not None:
+        progress.log('🎧 Decodificando audio...')
+    with timer.stage('ingesta'):
+        audio = ingest(source, name)
+
+    checkpoint = None
+    try:
+        duration = audio.duracion
+        if progress is not None:
+            progress.set_total(duration)
+
+        if plan_mode(duration, parallel, cascade) == 'paralelo':
+            if progress is not None:
+                progress.log('⚡ Transcripción paralela por fragmentos')
+            from src.parallel import transcribe_audio_parallel
+
+            # Las etapas internas ocurren en otros procesos: solo se mide el total
+            with timer.stage('transcripcion'):
+                result = transcribe_audio_parallel(
+                    model_name, audio, language, progress, profile=profile, job_id=job_id
+                )
+            mode = 'paralelo'
+        else:
+            draft_name = CASCADE_DRAFT_MODEL if cascade else model_name
+            if progress is not None:
+                progress.log(f'🔄 Cargando modelo {draft_name}...')
+            with timer.stage('carga_modelo'):
+                model = load_whisper_model(draft_name)
+            if model is None:
+                raise RuntimeError(f'No se pudo cargar el modelo {draft_name}')
+            if DECODE_BATCH_SIZE > 1:
+                with timer.stage('transcripcion'):
+                    result = transcribe_audio_batched(
+                        model, [audio.pcm], language, [progress], timer, profile=profile
+                    )[0]
+                mode = 'lotes'
+            else:
+                # Con clave, cada ventana se guarda y un reintento continúa donde se quedó
+                if cache_key:
+                    purge_stale()
+                    checkpoint = Checkpoint(cache_key)
+                    if not checkpoint.acquire():
+                        # Otro trabajo transcribe el mismo audio y escribe en ese punto de control
+                        checkpoint = None
+                        if progress is not None:
+                            progress.log('⚠️ El mismo audio se está transcribiendo en otro trabajo: sin punto de control')
+                with timer.stage('transcripcion'):
+                    result = transcribe_audio(
+                        model, audio.pcm, language, progress, timer, checkpoint=checkpoint, profile=profile
+                    )
+                mode = 'secuencial'
+
+            if cascade:
+                if progress is not None:
+                    progress.check_cancelled()
+                    progress.log(f'🔄 Cargando modelo {model_name} para refinar...')
+                with timer.stage('carga_modelo'):
+                    refine_model = load_whisper_model(model_name)
+                if refine_model is None:
+                    raise RuntimeError(f'No se pudo cargar el modelo {model_name}')
+                with timer.stage('refinado'):
+                    result = refine_low_confidence(
+                        refine_model, audio.pcm, result, language, progress, timer, profile=profile
+                    )
+                mode = 'cascada'
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        audio.close()
+
+    if cache_key:
+        with timer.stage('guardar_cache'):
+            cache.put(cache_key, result)
+        if checkpoint is not None:
+            checkpoint.discard()
+
+    startup.record('primer_resultado')
+    # En memoria hasta que se descarga, el resultado guarda los segmentos en columnas
+    result['segments'] = SegmentTable.from_segments(result['segments'])
+    result['metadata'] = {
+        'desde_cache': False,
+        'modo': mode,
+        'duracion_audio': duration,
+        'silencio_omitido_s': result.pop('vad', {}).get('omitido_s', 0.0),
+        'etapas': dict(timer.etapas),
+        'cascada': result.pop('cascada', None),
+        'perfil': profile or DECODE_PROFILE,
+        'fallbacks': result.pop('fallbacks', None),
+    }
+    return result
+
+
+def transcription_job(job):
+    """Adaptador para la cola: ejecuta run_transcription con los parámetros del Job"""
+    params = job.params
+    # El estimador de costes aprende de los tiempos por etapa aunque no se publiquen métricas
+    timer = StageTimer() if ESTIMATOR_ENABLED else new_timer()
+    result = run_transcription(
+        params['archivo'],
+        params['modelo'],
+        params.get('idioma'),
+        parallel=params.get('paralelo', False),
+        progress=job.progreso,
+        cache_key=params.get('clave_cache'),
+        name=params.get('nombre'),
+        timer=timer,
+        cascade=params.get('cascada', False),
+        profile=params.get('perfil'),
+        job_id=job.id,
+    )
+
+    metadata = result['metadata']
+    record_transcription(
+        params['modelo'], metadata['modo'], metadata.get('duracion_audio'), timer, trabajo=job.id,
+        cascada=metadata.get('cascada'), perfil=metadata.get('perfil'), fallbacks=metadata.get('fallbacks'),
+    )
+    if ESTIMATOR_ENABLED:
+        record_job(job, metadata, timer.etapas)
+    if STORE_ENABLED:
+        index_result(
+            result, params.get('nombre') or 'audio', clave=params.get('clave_cache'),
+            modelo=params['modelo'], duracion=metadata.get('duracion_audio'),
+        )
+    return result
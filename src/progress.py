@@ -0,0 +1,158 @@
+"""
+Seguimiento del progreso de una transcripción.
+
+El bucle de decodificación informa directamente de cada ventana procesada en
+lugar de capturar la salida de Whisper por stderr. Cada trabajo tiene su propio
+tracker protegido con un lock, y el log solo conserva las últimas líneas.
+"""
+import threading
+from collections import deque
+
+from src.config import PROGRESS_LOG_LINES
+
+
+class TranscriptionCancelled(Exception):
+    """Se lanza desde el bucle de decodificación cuando se cancela el trabajo"""
+
+
+def _format_timestamp(seconds):
+    """Formatea segundos como MM:SS.mmm (mismo formato que el log de Whisper)"""
+    millis = int(round(seconds * 1000))
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+class ProgressTracker:
+    """Rastrea el progreso de la transcripción ventana a ventana"""
+    def __init__(self, duracion_total=None, max_log_lines=PROGRESS_LOG_LINES):
+        self.duracion_total = duracion_total or 0
+        self.ultimo_timestamp = 0
+        self.ventanas = 0
+        self.segmentos = 0
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        # Anillo acotado con (inicio, fin, texto); se formatea solo al leerlo
+        self._log = deque(maxlen=max_log_lines)
+        self._listeners = []
+        self._window_listeners = []
+        self._replace_listeners = []
+
+    def set_total(self, duracion_total):
+        """Fija la duración total (el bucle la conoce tras decodificar el audio)"""
+        with self._lock:
+            self.duracion_total = duracion_total or self.duracion_total
+
+    def on_window(self, procesado_s, segmentos=()):
+        """
+        Registra una ventana decodificada.
+
+        Args:
+            procesado_s (float): Segundos de audio procesados hasta ahora
+            segmentos (list): Segmentos nuevos producidos por la ventana
+        """
+        with self._lock:
+            self.ventanas += 1
+            self.segmentos += len(segmentos)
+            self.ultimo_timestamp = procesado_s
+            for segmento in segmentos:
+                if segmento['text']:
+                    self._log.append((segmento['start'], segmento['end'], segmento['text']))
+
+        # Fuera del lock: los listeners corren en el hilo del trabajo, entre ventanas
+        for listener in self._listeners:
+            listener()
+        for listener in self._window_listeners:
+            listener(procesado_s, segmentos)
+
+    def on_replace(self, desde, hasta, segmentos):
+        """
+        Registra segmentos ya publicados que se sustituyen (por ejemplo, al refinar la cascada).
+
+        Args:
+            desde (int): Índice del primer segmento sustituido, en el orden en que se publicaron
+            hasta (int): Índice del último segmento sustituido (incluido)
+            segmentos (list): Segmentos que ocupan su lugar
+        """
+        with self._lock:
+            self.segmentos += len(segmentos) - (hasta - desde + 1)
+            for segmento in segmentos:
+                if segmento['text']:
+                    self._log.append((segmento['start'], segmento['end'], segmento['text']))
+
+        for listener in self._replace_listeners:
+            listener(desde, hasta, segmentos)
+
+    def add_listener(self, func):
+        """Registra una función sin argumentos que se llama tras cada ventana"""
+        self._listeners.append(func)
+
+    def add_window_listener(self, func):
+        """Registra una función que recibe (procesado_s, segmentos) tras cada ventana"""
+        self._window_listeners.append(func)
+
+    def add_replace_listener(self, func):
+        """Registra una función que recibe (desde, hasta, segmentos) en cada sustitución"""
+        self._replace_listeners.append(func)
+
+    def update_from_timestamp(self, timestamp_segundos):
+        """Actualiza el progreso basándose en el timestamp procesado"""
+        with self._lock:
+            self.ultimo_timestamp = timestamp_segundos
+
+    def log(self, mensaje):
+        """Añade una línea libre al log"""
+        with self._lock:
+            self._log.append((None, None, mensaje))
+
+    @property
+    def porcentaje(self):
+        """Porcentaje entero de audio procesado"""
+        if self.duracion_total <= 0:
+            return 0
+        return min(100, int((self.ultimo_timestamp / self.duracion_total) * 100))
+
+    @property
+    def tiempo_procesado_formateado(self):
+        """Tiempo de audio procesado en formato M:SS"""
+        minutos = int(self.ultimo_timestamp // 60)
+        segundos = int(self.ultimo_timestamp % 60)
+        return f"{minutos}:{segundos:02d}"
+
+    def tail(self, n=8):
+        """Devuelve las últimas n líneas del log ya formateadas"""
+        with self._lock:
+            entradas = list(self._log)[-n:] if n else []
+
+        lineas = []
+        for inicio, fin, texto in entradas:
+            if inicio is None:
+                lineas.append(texto)
+            else:
+                lineas.append(f"[{_format_timestamp(inicio)} --> {_format_timestamp(fin)}]{texto}")
+        return lineas
+
+    def snapshot(self):
+        """Copia consistente del estado para mostrarlo desde otro hilo"""
+        with self._lock:
+            return {
+                'porcentaje': self.porcentaje,
+                'procesado_s': self.ultimo_timestamp,
+                'duracion_s': self.duracion_total,
+                'ventanas': self.ventanas,
+                'segmentos': self.segmentos,
+                'cancelado': self._cancel.is_set(),
+            }
+
+    def cancel(self):
+        """Pide cancelar la transcripción en la próxima ventana"""
+        self._cancel.set()
+
+    @property
+    def cancelado(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Lanza TranscriptionCancelled si se pidió cancelar"""
+        if self._cancel.is_set():
+            raise TranscriptionCancelled('Transcripción cancelada')
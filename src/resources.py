@@ -0,0 +1,231 @@
+"""
+Reparto de núcleos de CPU entre las transcripciones simultáneas.
+
+Los trabajos de la cola comparten un proceso, y por defecto cada uno pediría a
+torch todos los núcleos; con varios a la vez se pisan y el rendimiento total se
+hunde. El asignador reparte los núcleos en proporción al peso de cada modelo
+('peso_cpu' en MODELOS_DISPONIBLES) y recalcula el reparto cuando un trabajo
+empieza o termina.
+
+El pool de hilos de torch (y los de MKL/OpenMP) es del proceso, no de cada
+hilo: los trabajos que decodifican en el proceso comparten un único
+presupuesto, la suma de sus partes, que se aplica con torch.set_num_threads
+entre ventanas. Un trabajo en modo paralelo decodifica en procesos aparte: su
+parte se reparte entre sus workers y no cuenta para el presupuesto del
+proceso. Con CPU_PINNING, el proceso se fija a los núcleos de los trabajos que
+decodifican en él y cada worker a los de su trabajo.
+"""
+import os
+import time
+import logging
+import threading
+
+from src.config import CPU_CORES, CPU_PINNING, MODELOS_DISPONIBLES
+
+logger = logging.getLogger(__name__)
+
+
+def apportion(total, pesos):
+    """
+    Reparte total unidades en proporción a los pesos (mínimo 1 cada uno).
+
+    Args:
+        total (int): Unidades a repartir (núcleos)
+        pesos (list): Peso de cada participante
+
+    Returns:
+        list: Unidades por participante; suman total si hay al menos tantas como participantes
+    """
+    if not pesos:
+        return []
+    if total <= len(pesos):
+        return [1] * len(pesos)
+
+    suma = float(sum(pesos))
+    exactos = [total * p / suma for p in pesos]
+    partes = [max(1, int(e)) for e in exactos]
+
+    # Restos mayores primero hasta completar; si los mínimos se pasaron, se quita a los mayores
+    orden = sorted(range(len(pesos)), key=lambda i: exactos[i] - int(exactos[i]), reverse=True)
+    i = 0
+    while sum(partes) < total:
+        partes[orden[i % len(orden)]] += 1
+        i += 1
+    while sum(partes) > total:
+        mayor = max(range(len(partes)), key=lambda j: partes[j])
+        partes[mayor] -= 1
+    return partes
+
+
+def pin_process(nucleos):
+    """Fija todos los hilos del proceso (los de torch incluidos) a esos núcleos (Linux)"""
+    try:
+        hilos = [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        hilos = [0]  # Sin /proc, solo el hilo que llama
+    for tid in hilos:
+        try:
+            os.sched_setaffinity(tid, nucleos)
+        except OSError:
+            pass  # El hilo terminó mientras tanto
+
+
+class _Allocation:
+    """Parte asignada a un trabajo"""
+    def __init__(self, peso):
+        self.peso = peso
+        self.hilos = 1
+        self.nucleos = ()
+        self.procesos = 0  # Workers en otros procesos (modo paralelo); 0 = decodifica en este
+        self.inicio = self.desde = time.monotonic()
+        self.hilos_s = 0.0  # Hilos por segundo acumulados hasta 'desde'
+
+    def set_threads(self, hilos):
+        """Cambia los hilos asignados acumulando los del periodo que termina"""
+        ahora = time.monotonic()
+        self.hilos_s += self.hilos * (ahora - self.desde)
+        self.desde = ahora
+        self.hilos = hilos
+
+    def mean_threads(self):
+        """Hilos medios ponderados por tiempo desde que el trabajo empezó"""
+        ahora = time.monotonic()
+        transcurrido = ahora - self.inicio
+        if transcurrido <= 0:
+            return float(self.hilos)
+        return (self.hilos_s + self.hilos * (ahora - self.desde)) / transcurrido
+
+
+class CpuAllocator:
+    """Reparte los núcleos entre los trabajos activos y aplica el presupuesto de hilos del proceso"""
+    def __init__(self, cores=CPU_CORES, pinning=CPU_PINNING):
+        self.cores = list(cores)
+        self.pinning = pinning and hasattr(os, 'sched_setaffinity')
+        self._lock = threading.Lock()
+        self._activos = {}  # job_id -> _Allocation, en orden de llegada
+        self._aplicado = None  # (hilos, núcleos) fijados en el proceso
+        self._interop_fijado = False
+
+    def acquire(self, job_id, model_name=None):
+        """Registra un trabajo activo y recalcula el reparto"""
+        peso = MODELOS_DISPONIBLES.get(model_name, {}).get('peso_cpu', 1)
+        with self._lock:
+            self._activos[job_id] = _Allocation(peso)
+            self._rebalance()
+
+    def release(self, job_id):
+        """Da de baja un trabajo; los demás recogen sus núcleos en su próxima ventana"""
+        with self._lock:
+            if self._activos.pop(job_id, None) is not None:
+                self._rebalance()
+
+    def share(self, job_id):
+        """(hilos, núcleos) asignados ahora mismo a un trabajo, o None"""
+        with self._lock:
+            asignacion = self._activos.get(job_id)
+            if asignacion is None:
+                return None
+            return asignacion.hilos, asignacion.nucleos
+
+    def mean_threads(self, job_id):
+        """Hilos medios que ha tenido un trabajo activo (el reparto cambia al entrar y salir otros), o None"""
+        with self._lock:
+            asignacion = self._activos.get(job_id)
+            return asignacion.mean_threads() if asignacion is not None else None
+
+    def projected_threads(self, model_name=None):
+        """Hilos que recibiría ahora un trabajo nuevo de ese modelo"""
+        peso = MODELOS_DISPONIBLES.get(model_name, {}).get('peso_cpu', 1)
+        with self._lock:
+            pesos = [a.peso for a in self._activos.values()]
+        return apportion(len(self.cores), pesos + [peso])[-1]
+
+    def worker_threads(self, job_id, workers):
+        """
+        Pasa un trabajo al modo paralelo y reparte su parte entre sus workers.
+
+        Sus núcleos dejan de contar para el presupuesto del proceso en la
+        siguiente llamada a apply.
+
+        Args:
+            job_id (str): Trabajo activo
+            workers (int): Procesos que transcriben sus fragmentos
+
+        Returns:
+            tuple: (hilos por worker, núcleos a los que fijarlos o () sin CPU_PINNING), o None
+        """
+        with self._lock:
+            asignacion = self._activos.get(job_id)
+            if asignacion is None:
+                return None
+            asignacion.procesos = workers
+            return max(1, asignacion.hilos // workers), asignacion.nucleos if self.pinning else ()
+
+    def apply(self):
+        """
+        Aplica al proceso el presupuesto de los trabajos que decodifican en él, si cambió.
+
+        Lo llama cada trabajo al empezar y tras cada ventana; el valor es el mismo
+        para todos, así que no importa qué hilo lo aplique.
+        """
+        with self._lock:
+            locales = [a for a in self._activos.values() if not a.procesos]
+            if not locales:
+                return
+            actual = (
+                sum(a.hilos for a in locales),
+                tuple(sorted({nucleo for a in locales for nucleo in a.nucleos})),
+            )
+            if self._aplicado == actual:
+                return
+            self._aplicado = actual
+
+        import torch
+
+        if not self._interop_fijado:
+            self._interop_fijado = True
+            try:
+                # Whisper no aprovecha el paralelismo entre operadores; solo puede fijarse una vez
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass
+
+        hilos, nucleos = actual
+        torch.set_num_threads(hilos)
+        if self.pinning and nucleos:
+            pin_process(nucleos)
+        logger.info('Proceso: %d hilos para %d trabajos%s', hilos, len(locales),
+                    f' en núcleos {list(nucleos)}' if self.pinning else '')
+
+    def stats(self):
+        """Reparto actual por trabajo (en modo paralelo, el total de sus workers)"""
+        with self._lock:
+            return {job_id[:8]: a.hilos for job_id, a in self._activos.items()}
+
+    def _rebalance(self):
+        """Recalcula hilos y núcleos de todos los trabajos activos (con el lock tomado)"""
+        asignaciones = list(self._activos.values())
+        partes = apportion(len(self.cores), [a.peso for a in asignaciones])
+
+        inicio = 0
+        for asignacion, n in zip(asignaciones, partes):
+            asignacion.set_threads(n)
+            if inicio + n <= len(self.cores):
+                asignacion.nucleos = tuple(self.cores[inicio:inicio + n])
+            else:
+                # Más trabajos que núcleos: se comparten en rueda
+                asignacion.nucleos = (self.cores[inicio % len(self.cores)],)
+            inicio += n
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_cpu_allocator():
+    """Devuelve el asignador de CPU del proceso, creándolo en el primer uso"""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = CpuAllocator()
+        return _allocator
@@ -0,0 +1,215 @@
+"""
+Representación en columnas de los segmentos de una transcripción.
+
+Whisper devuelve cada segmento como un dict con su lista de tokens, seek,
+temperatura y otros campos; en audios de varias horas son decenas de miles de
+objetos que se quedan en memoria hasta que se exporta el resultado. SegmentTable
+guarda lo mismo en unos pocos arrays: inicio y fin en float64 (en float32 se
+pierde el milisegundo a partir de unas 4,6 horas), todo el texto en un único
+buffer UTF-8 con sus desplazamientos y, si se piden, los tokens en un array
+plano. Se puede guardar en un directorio de .npy y cargar mapeado en memoria, y
+los timestamps de un bloque de segmentos se formatean de una vez con numpy.
+"""
+import os
+
+import numpy as np
+
+_CAMPOS = ('start', 'end', 'text_offsets', 'text_bytes', 'token_offsets', 'tokens')
+
+
+def _digits(values, width):
+    """Dígitos ASCII de enteros no negativos como matriz (n, width) de uint8"""
+    potencias = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (values[:, None] // potencias % 10 + ord('0')).astype(np.uint8)
+
+
+def _leading_field(values):
+    """
+    Dígitos del primer campo con al menos 2 cifras y más solo donde hacen falta.
+
+    Como f'{v:02d}': el ancho varía por fila. Las posiciones sobrantes quedan
+    como espacios que _join_columns elimina.
+    """
+    ancho = max(2, len(str(int(values.max())))) if len(values) else 2
+    columnas = _digits(values, ancho)
+    if ancho > 2:
+        cifras = np.maximum(2, np.floor(np.log10(np.maximum(values, 1))).astype(np.int64) + 1)
+        columnas[np.arange(ancho)[None, :] < (ancho - cifras)[:, None]] = ord(' ')
+    return columnas
+
+
+def _join_columns(columnas):
+    """Concatena columnas (n, k) de uint8 y devuelve una lista de str"""
+    matriz = np.ascontiguousarray(np.concatenate(columnas, axis=1))
+    textos = matriz.view(f'S{matriz.shape[1]}').ravel()
+    if (matriz[:, 0] == ord(' ')).any():
+        textos = np.char.lstrip(textos)
+    return textos.astype(str).tolist()
+
+
+def _separator(char, n):
+    return np.full((n, 1), ord(char), dtype=np.uint8)
+
+
+def format_clock(seconds, separator=','):
+    """
+    Formatea un array de segundos como HH:MM:SS<sep>mmm (SRT y WebVTT).
+
+    Args:
+        seconds: Array o lista de segundos
+        separator (str): Separador de los milisegundos (',' en SRT, '.' en WebVTT)
+
+    Returns:
+        list: Un str por valor
+    """
+    millis = np.rint(np.asarray(seconds, dtype=np.float64) * 1000).astype(np.int64)
+    n = len(millis)
+    horas, millis = np.divmod(millis, 3600000)
+    minutos, millis = np.divmod(millis, 60000)
+    segundos, millis = np.divmod(millis, 1000)
+    return _join_columns([
+        _leading_field(horas), _separator(':', n),
+        _digits(minutos, 2), _separator(':', n),
+        _digits(segundos, 2), _separator(separator, n),
+        _digits(millis, 3),
+    ])
+
+
+def format_mmss(seconds):
+    """
+    Formatea un array de segundos como MM:SS (TXT y DOCX); los minutos pueden pasar de 99.
+
+    Returns:
+        list: Un str por valor
+    """
+    total = np.asarray(seconds, dtype=np.float64).astype(np.int64)
+    n = len(total)
+    minutos, segundos = np.divmod(total, 60)
+    return _join_columns([_leading_field(minutos), _separator(':', n), _digits(segundos, 2)])
+
+
+class SegmentTable:
+    """
+    Segmentos de una transcripción en columnas.
+
+    Se comporta como una secuencia de dicts {'id', 'start', 'end', 'text'} (con
+    'tokens' si se guardaron), que se construyen solo al acceder a ellos.
+    """
+    def __init__(self, start, end, text_offsets, text_bytes, token_offsets=None, tokens=None):
+        self.start = start
+        self.end = end
+        self.text_offsets = text_offsets
+        self.text_bytes = text_bytes
+        self.token_offsets = token_offsets
+        self.tokens = tokens
+
+    @classmethod
+    def from_segments(cls, segments, keep_tokens=False):
+        """
+        Construye la tabla a partir de segmentos de Whisper.
+
+        Args:
+            segments: Lista de dicts con 'start', 'end', 'text' (y 'tokens'), o una SegmentTable
+            keep_tokens (bool): Guardar también los tokens de cada segmento
+
+        Returns:
+            SegmentTable: La misma tabla si ya lo era
+        """
+        if isinstance(segments, cls):
+            return segments
+
+        n = len(segments)
+        start = np.fromiter((s['start'] for s in segments), dtype=np.float64, count=n)
+        end = np.fromiter((s['end'] for s in segments), dtype=np.float64, count=n)
+        textos = [s['text'].encode('utf-8') for s in segments]
+        text_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in textos], out=text_offsets[1:])
+        text_bytes = np.frombuffer(b''.join(textos), dtype=np.uint8)
+
+        token_offsets = tokens = None
+        if keep_tokens:
+            listas = [s.get('tokens', []) for s in segments]
+            token_offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum([len(t) for t in listas], out=token_offsets[1:])
+            tokens = np.fromiter((t for lista in listas for t in lista), dtype=np.int32, count=int(token_offsets[-1]))
+
+        return cls(start, end, text_offsets, text_bytes, token_offsets, tokens)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def texts(self, a=0, b=None):
+        """Textos de los segmentos [a, b) decodificados de una sola lectura del buffer"""
+        b = len(self) if b is None else b
+        offsets = self.text_offsets[a:b + 1] - self.text_offsets[a]
+        raw = self.text_bytes[self.text_offsets[a]:self.text_offsets[b]].tobytes()
+        return [raw[x:y].decode('utf-8') for x, y in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        segment = {
+            'id': i,
+            'start': float(self.start[i]),
+            'end': float(self.end[i]),
+            'text': self.texts(i, i + 1)[0],
+        }
+        if self.tokens is not None:
+            segment['tokens'] = self.tokens[self.token_offsets[i]:self.token_offsets[i + 1]].tolist()
+        return segment
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def blocks(self, size):
+        """
+        Recorre la tabla por bloques para exportar sin materializar todos los segmentos.
+
+        Yields:
+            tuple: (id del primero, inicios, finales, textos) de cada bloque
+        """
+        for a in range(0, len(self), size):
+            b = min(a + size, len(self))
+            yield a, self.start[a:b], self.end[a:b], self.texts(a, b)
+
+    def to_segments(self):
+        """Lista de dicts, para guardar en JSON o devolver en el formato de Whisper"""
+        return list(self)
+
+    @property
+    def nbytes(self):
+        """Bytes que ocupan los arrays de la tabla"""
+        return sum(getattr(self, campo).nbytes for campo in _CAMPOS if getattr(self, campo) is not None)
+
+    def save(self, directory):
+        """Guarda cada columna como un .npy en el directorio"""
+        os.makedirs(directory, exist_ok=True)
+        for campo in _CAMPOS:
+            valor = getattr(self, campo)
+            if valor is not None:
+                np.save(os.path.join(directory, f'{campo}.npy'), valor)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Carga una tabla guardada con save.
+
+        Args:
+            directory (str): Directorio con los .npy
+            mmap (bool): Mapear los arrays en memoria en lugar de leerlos
+
+        Returns:
+            SegmentTable
+        """
+        columnas = {}
+        for campo in _CAMPOS:
+            ruta = os.path.join(directory, f'{campo}.npy')
+            if os.path.exists(ruta):
+                columnas[campo] = np.load(ruta, mmap_mode='r' if mmap else None)
+        return cls(**columnas)
@@ -0,0 +1,81 @@
+"""
+Arranque del proceso: tiempos medidos y precarga del modelo.
+
+Streamlit vuelve a ejecutar app.py en cada interacción, pero los módulos se
+importan una sola vez por proceso; aquí se guardan los tiempos de la primera
+vez (imports, detección de ffmpeg, precarga, primer resultado) y se lanza la
+precarga del modelo por defecto mientras el usuario todavía está subiendo el audio.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Referencia para los tiempos relativos: primera importación de este módulo
+_inicio = time.perf_counter()
+_tiempos = {}
+_lock = threading.Lock()
+_precarga = None
+
+
+def record(nombre, segundos=None):
+    """
+    Registra un tiempo de arranque (solo la primera vez por proceso).
+
+    Args:
+        nombre (str): Etapa medida
+        segundos (float): Duración; si se omite, el tiempo transcurrido desde el inicio
+
+    Returns:
+        bool: True si se registró, False si esa etapa ya tenía tiempo
+    """
+    if segundos is None:
+        segundos = time.perf_counter() - _inicio
+    with _lock:
+        if nombre in _tiempos:
+            return False
+        _tiempos[nombre] = segundos
+
+    logger.info('Arranque: %s %.2f s', nombre, segundos)
+    return True
+
+
+def timings():
+    """Copia de los tiempos de arranque registrados, en orden de registro"""
+    with _lock:
+        return dict(_tiempos)
+
+
+def _warm_up(model_name):
+    inicio = time.perf_counter()
+    try:
+        from src.transcription import load_whisper_model
+        load_whisper_model(model_name)
+    except Exception:
+        logger.exception('Error precargando el modelo %s', model_name)
+        return
+    record('precarga_modelo', time.perf_counter() - inicio)
+
+
+def start_warmup(model_name):
+    """
+    Precarga un modelo en un hilo en segundo plano (una vez por proceso).
+
+    Usa la misma caché que load_whisper_model, así que el primer trabajo
+    reutiliza el modelo ya cargado (o espera a que termine de cargarse).
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+
+    Returns:
+        threading.Thread: Hilo de la precarga
+    """
+    global _precarga
+    with _lock:
+        if _precarga is None:
+            _precarga = threading.Thread(
+                target=_warm_up, args=(model_name,), name='precarga-modelo', daemon=True
+            )
+            _precarga.start()
+        return _precarga
@@ -0,0 +1,264 @@
+"""
+Archivo de transcripciones con búsqueda de texto completo.
+
+Cada transcripción terminada guarda sus segmentos en una base SQLite con un
+índice FTS5 (índice invertido con prefijos de 2 y 3 caracteres, sin distinguir
+mayúsculas ni tildes). Indexar es incremental: cada resultado se añade en su
+propia transacción, sin reconstruir nada. Las búsquedas aceptan palabras,
+"frases exactas" y prefijos (palabra*) y devuelven archivo, instante y un
+fragmento del texto, ordenados por relevancia.
+
+Uso desde la línea de comandos:
+    python -m src.store "presupuesto anual"
+    python -m src.store '"orden del día" votaci*' --limite 20
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+from src.config import SEARCH_MAX_RESULTS, STORE_PATH
+from src.segments import SegmentTable
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripciones (
+    id INTEGER PRIMARY KEY,
+    clave TEXT UNIQUE,
+    nombre TEXT NOT NULL,
+    ruta TEXT,
+    modelo TEXT,
+    idioma TEXT,
+    duracion REAL,
+    fecha REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segmentos (
+    id INTEGER PRIMARY KEY,
+    transcripcion_id INTEGER NOT NULL REFERENCES transcripciones(id) ON DELETE CASCADE,
+    inicio REAL NOT NULL,
+    fin REAL NOT NULL,
+    texto TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segmentos_transcripcion ON segmentos(transcripcion_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segmentos_fts USING fts5(
+    texto,
+    content='segmentos',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+"""
+
+# Términos de una consulta: "frase entre comillas" o palabra con * opcional al final
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def build_match(query):
+    """
+    Traduce la consulta del usuario a una expresión MATCH de FTS5 segura.
+
+    Cada palabra o frase se cita para que los operadores de FTS5 (AND, NEAR,
+    paréntesis, dos puntos...) se traten como texto; un * final pide prefijo.
+
+    Args:
+        query (str): Texto buscado, con "frases" y prefijos* opcionales
+
+    Returns:
+        str: Expresión MATCH, o '' si la consulta no tiene términos
+    """
+    partes = []
+    for frase, palabra in _TERM.findall(query):
+        texto = frase if frase else palabra
+        prefijo = not frase and texto.endswith('*')
+        texto = texto.rstrip('*').replace('"', '').strip()
+        if not any(c.isalnum() for c in texto):
+            continue  # Solo puntuación: el tokenizador no la indexa
+        partes.append(f'"{texto}"' + ('*' if prefijo else ''))
+    return ' '.join(partes)
+
+
+class TranscriptStore:
+    """Base SQLite con los segmentos de todas las transcripciones y su índice FTS5"""
+    def __init__(self, path=None):
+        self.path = path or STORE_PATH
+        directorio = os.path.dirname(self.path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        # Una conexión por instancia compartida entre hilos (las escrituras van con el lock)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        # WAL: los lectores no bloquean al escritor (la app y el batch pueden compartir base)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def has(self, clave):
+        """Indica si ya hay una transcripción guardada con esa clave"""
+        with self._lock:
+            fila = self._db.execute('SELECT 1 FROM transcripciones WHERE clave = ?', (clave,)).fetchone()
+        return fila is not None
+
+    def add(self, result, nombre, clave=None, ruta=None, modelo=None, duracion=None):
+        """
+        Guarda e indexa los segmentos de una transcripción.
+
+        Con clave (la de la caché), volver a añadir el mismo resultado sustituye al anterior.
+
+        Args:
+            result (dict): Resultado de Whisper ('segments' como lista o SegmentTable, 'language')
+            nombre (str): Nombre del archivo que se muestra en las búsquedas
+            clave (str): Clave de caché del resultado (opcional)
+            ruta (str): Ruta del archivo de audio (opcional)
+            modelo (str): Modelo usado (opcional)
+            duracion (float): Duración del audio en segundos (opcional)
+
+        Returns:
+            int: Id de la transcripción
+        """
+        segmentos = [
+            (inicio, fin, texto.strip())
+            for _, inicios, finales, textos in SegmentTable.from_segments(result.get('segments', [])).blocks(1000)
+            for inicio, fin, texto in zip(inicios.tolist(), finales.tolist(), textos) if texto.strip()
+        ]
+        with self._lock, self._db:
+            if clave is not None:
+                self._delete(clave)
+            cursor = self._db.execute(
+                'INSERT INTO transcripciones (clave, nombre, ruta, modelo, idioma, duracion, fecha) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (clave, nombre, ruta, modelo, result.get('language'), duracion, time.time()),
+            )
+            transcripcion_id = cursor.lastrowid
+            self._db.executemany(
+                'INSERT INTO segmentos (transcripcion_id, inicio, fin, texto) VALUES (?, ?, ?, ?)',
+                [(transcripcion_id, inicio, fin, texto) for inicio, fin, texto in segmentos],
+            )
+            # Índice externo: se añaden solo las filas nuevas
+            self._db.execute(
+                'INSERT INTO segmentos_fts (rowid, texto) '
+                'SELECT id, texto FROM segmentos WHERE transcripcion_id = ?',
+                (transcripcion_id,),
+            )
+        logger.info('Archivo: %s indexado (%d segmentos)', nombre, len(segmentos))
+        return transcripcion_id
+
+    def _delete(self, clave):
+        """Borra una transcripción y sus entradas del índice (con el lock y la transacción abiertos)"""
+        fila = self._db.execute('SELECT id FROM transcripciones WHERE clave = ?', (clave,)).fetchone()
+        if fila is None:
+            return
+        self._db.execute(
+            "INSERT INTO segmentos_fts (segmentos_fts, rowid, texto) "
+            "SELECT 'delete', id, texto FROM segmentos WHERE transcripcion_id = ?",
+            (fila['id'],),
+        )
+        self._db.execute('DELETE FROM segmentos WHERE transcripcion_id = ?', (fila['id'],))
+        self._db.execute('DELETE FROM transcripciones WHERE id = ?', (fila['id'],))
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        """
+        Busca segmentos que contengan la consulta.
+
+        Args:
+            query (str): Palabras, "frases exactas" y prefijos (palabra*)
+            limit (int): Número máximo de resultados
+
+        Returns:
+            list: Dicts con 'nombre', 'ruta', 'inicio', 'fin', 'fragmento' y 'texto',
+                ordenados por relevancia
+        """
+        match = build_match(query)
+        if not match:
+            return []
+        with self._lock:
+            filas = self._db.execute(
+                "SELECT t.nombre, t.ruta, t.fecha, s.inicio, s.fin, s.texto, "
+                "snippet(segmentos_fts, 0, '**', '**', '…', 16) AS fragmento "
+                "FROM segmentos_fts JOIN segmentos s ON s.id = segmentos_fts.rowid "
+                "JOIN transcripciones t ON t.id = s.transcripcion_id "
+                "WHERE segmentos_fts MATCH ? ORDER BY segmentos_fts.rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def stats(self):
+        """Número de transcripciones, segmentos y horas de audio guardadas"""
+        with self._lock:
+            fila = self._db.execute(
+                'SELECT COUNT(*) AS transcripciones, COALESCE(SUM(duracion), 0) AS segundos FROM transcripciones'
+            ).fetchone()
+            segmentos = self._db.execute('SELECT COUNT(*) FROM segmentos').fetchone()[0]
+        return {
+            'transcripciones': fila['transcripciones'],
+            'segmentos': segmentos,
+            'horas': fila['segundos'] / 3600,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store():
+    """Devuelve el archivo de transcripciones del proceso, creándolo en el primer uso"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TranscriptStore()
+        return _store
+
+
+def index_result(result, nombre, **campos):
+    """
+    Añade un resultado al archivo sin interrumpir a quien lo llama si falla.
+
+    Args:
+        result (dict): Resultado de Whisper
+        nombre (str): Nombre del archivo
+        **campos: clave, ruta, modelo y duracion para TranscriptStore.add
+    """
+    try:
+        store = get_transcript_store()
+        if campos.get('clave') and store.has(campos['clave']):
+            return
+        store.add(result, nombre, **campos)
+    except sqlite3.Error:
+        logger.exception('No se pudo indexar %s', nombre)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.store',
+        description='Busca en el archivo de transcripciones.'
+    )
+    parser.add_argument('consulta', help='Palabras, "frases exactas" y prefijos (palabra*)')
+    parser.add_argument('--limite', type=int, default=SEARCH_MAX_RESULTS)
+    parser.add_argument('--base', help=f'Base SQLite (por defecto {STORE_PATH})')
+    args = parser.parse_args(argv)
+
+    from src.utils import format_time
+
+    store = TranscriptStore(args.base)
+    inicio = time.perf_counter()
+    resultados = store.search(args.consulta, args.limite)
+    transcurrido = time.perf_counter() - inicio
+
+    for r in resultados:
+        print(f"{r['ruta'] or r['nombre']}  [{format_time(r['inicio'])}]  {r['fragmento']}")
+    print(f'{len(resultados)} resultados en {transcurrido * 1000:.1f} ms', file=sys.stderr)
+    return 0 if resultados else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+Transcripción en directo de un audio que va creciendo.
+
+Lee PCM s16le mono a 16 kHz por bloques desde un archivo que se sigue
+escribiendo, una tubería o un socket local, y cada STREAM_STEP_S segundos de
+audio nuevo decodifica el búfer pendiente (como máximo STREAM_MAX_BUFFER_S) en
+una sola ventana. Emite la hipótesis parcial y finaliza los segmentos que se
+repiten igual en dos pasadas seguidas y terminan antes del margen del final del
+búfer; los segmentos finales tienen tiempos absolutos que ya no cambian y el
+búfer se recorta tras ellos, así que el coste por paso y el retraso están acotados.
+
+Para otras fuentes, ffmpeg puede producir el PCM:
+    ffmpeg -i rtmp://... -f s16le -ac 1 -ar 16000 - | python -m src.streaming --stdin --modelo tiny
+
+Uso:
+    python -m src.streaming --archivo grabacion.pcm --modelo tiny --idioma es --formatos srt,txt
+    python -m src.streaming --socket 127.0.0.1:5055 --modelo tiny
+"""
+import os
+import sys
+import time
+import queue
+import bisect
+import socket
+import argparse
+import logging
+import threading
+
+import numpy as np
+
+from src.config import (
+    IDIOMAS,
+    MODELOS_DISPONIBLES,
+    STREAM_STEP_S,
+    STREAM_MAX_BUFFER_S,
+    STREAM_COMMIT_MARGIN_S,
+    STREAM_PROMPT_TOKENS,
+    STREAM_POLL_S,
+    STREAM_IDLE_TIMEOUT_S,
+)
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_BYTES = 3200  # 0.1 s de PCM s16le
+
+
+def _skip_wav_header(f):
+    """Si el archivo empieza por una cabecera WAV, avanza hasta el inicio de los datos"""
+    cabecera = f.read(12)
+    if cabecera[:4] != b'RIFF' or cabecera[8:12] != b'WAVE':
+        f.seek(0)
+        return
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return
+        if chunk[:4] == b'data':
+            return
+        f.seek(int.from_bytes(chunk[4:8], 'little'), os.SEEK_CUR)
+
+
+def read_growing_file(path, poll_s=STREAM_POLL_S, idle_timeout_s=STREAM_IDLE_TIMEOUT_S, stop=None):
+    """
+    Lee un archivo que se sigue escribiendo, como `tail -f`.
+
+    Args:
+        path (str): Archivo PCM s16le (o WAV con esa codificación)
+        poll_s (float): Espera entre lecturas cuando no hay datos nuevos
+        idle_timeout_s (float): Termina si el archivo no crece en este tiempo
+        stop (threading.Event): Termina en cuanto se active (opcional)
+
+    Yields:
+        bytes: Bloques de PCM
+    """
+    with open(path, 'rb') as f:
+        _skip_wav_header(f)
+        inactivo_desde = time.monotonic()
+        while stop is None or not stop.is_set():
+            datos = f.read(CHUNK_BYTES * 10)
+            if datos:
+                inactivo_desde = time.monotonic()
+                yield datos
+            elif time.monotonic() - inactivo_desde > idle_timeout_s:
+                return
+            else:
+                time.sleep(poll_s)
+
+
+def read_pipe(fileobj):
+    """Lee PCM de una tubería (por ejemplo, sys.stdin.buffer) hasta que se cierra"""
+    for datos in iter(lambda: fileobj.read1(CHUNK_BYTES * 10) if hasattr(fileobj, 'read1')
+                      else fileobj.read(CHUNK_BYTES * 10), b''):
+        yield datos
+
+
+def read_socket(host, port):
+    """Espera una conexión TCP local y lee PCM hasta que el emisor la cierra"""
+    with socket.create_server((host, port)) as servidor:
+        logger.info('Esperando audio en %s:%d', host, port)
+        conexion, origen = servidor.accept()
+        logger.info('Conexión desde %s:%d', *origen[:2])
+        with conexion:
+            for datos in iter(lambda: conexion.recv(CHUNK_BYTES * 10), b''):
+                yield datos
+
+
+class StreamingTranscriber:
+    """Transcribe por pasos un flujo de PCM con hipótesis parciales y segmentos finales"""
+    def __init__(self, model, language=None, on_event=None, step_s=STREAM_STEP_S,
+                 max_buffer_s=STREAM_MAX_BUFFER_S, commit_margin_s=STREAM_COMMIT_MARGIN_S):
+        from whisper.tokenizer import get_tokenizer
+
+        self.model = model
+        self.language = language if language and language != 'auto' else None
+        self.on_event = on_event or (lambda evento: None)
+        self.step = int(step_s * SAMPLE_RATE)
+        self.max_buffer = int(max_buffer_s * SAMPLE_RATE)
+        self.commit_margin_s = commit_margin_s
+
+        self.segments = []  # Segmentos finales, con tiempos absolutos
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # Muestra absoluta donde empieza el búfer
+        self._received = 0  # Muestras recibidas en total
+        self._pending = 0  # Muestras nuevas desde la última decodificación
+        self._resto = b''
+        self._previous = []  # Textos de la hipótesis anterior, para el acuerdo entre pasadas
+        self._prompt = []
+        # (muestras recibidas, instante de llegada) para medir el retraso
+        self._llegadas_muestras = []
+        self._llegadas_t = []
+        self._tokenizer = None
+        self._get_tokenizer = get_tokenizer
+
+    @property
+    def text(self):
+        return ''.join(segment['text'] for segment in self.segments)
+
+    def feed(self, datos):
+        """
+        Añade bytes PCM s16le y decodifica si se acumuló un paso de audio nuevo.
+
+        Args:
+            datos (bytes): Bloque de PCM recibido
+        """
+        datos = self._resto + datos
+        util = len(datos) - len(datos) % 2
+        self._resto = datos[util:]
+        muestras = np.frombuffer(datos[:util], dtype=np.int16).astype(np.float32) / 32768.0
+        if not len(muestras):
+            return
+
+        self._buffer = np.concatenate((self._buffer, muestras))
+        self._received += len(muestras)
+        self._pending += len(muestras)
+        self._llegadas_muestras.append(self._received)
+        self._llegadas_t.append(time.monotonic())
+
+        if self._pending >= self.step:
+            self._step(final=False)
+
+    def finish(self):
+        """Decodifica el audio restante y finaliza todo lo pendiente"""
+        if len(self._buffer):
+            self._step(final=True)
+        return self.segments
+
+    def _arrival(self, muestra):
+        """Instante en que llegó una muestra absoluta"""
+        i = bisect.bisect_left(self._llegadas_muestras, muestra)
+        return self._llegadas_t[min(i, len(self._llegadas_t) - 1)]
+
+    def _decode(self):
+        """Decodifica el búfer en una ventana y devuelve (piezas, texto, silencio)"""
+        import torch
+        from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, log_mel_spectrogram, pad_or_trim
+        from whisper.decoding import DecodingOptions
+        from whisper.utils import exact_div
+
+        from src.decoding import encode_window, split_segments
+
+        content_frames = min(N_FRAMES, len(self._buffer) // HOP_LENGTH)
+        mel = log_mel_spectrogram(self._buffer, self.model.dims.n_mels, padding=N_SAMPLES)
+        mel_segment = pad_or_trim(mel[:, :content_frames], N_FRAMES).to(self.model.device)
+        features = encode_window(self.model, mel_segment)
+
+        if self.language is None:
+            if not self.model.is_multilingual:
+                self.language = 'en'
+            else:
+                _, probs = self.model.detect_language(features)
+                self.language = max(probs, key=probs.get)
+        if self._tokenizer is None:
+            self._tokenizer = self._get_tokenizer(
+                self.model.is_multilingual, num_languages=self.model.num_languages,
+                language=self.language, task='transcribe',
+            )
+
+        result = self.model.decode(features, DecodingOptions(
+            language=self.language, temperature=0.0, fp16=False,
+            prompt=self._prompt[-STREAM_PROMPT_TOKENS:] or None,
+        ))
+        silencio = result.no_speech_prob > 0.6 and result.avg_logprob < -1.0
+
+        input_stride = exact_div(N_FRAMES, self.model.dims.n_audio_ctx)
+        time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+        piezas, _ = split_segments(
+            torch.tensor(result.tokens), self._tokenizer, 0.0, content_frames, input_stride, time_precision
+        )
+        piezas = [
+            (inicio, fin, self._tokenizer.decode([t for t in tokens.tolist() if t < self._tokenizer.eot]),
+             [t for t in tokens.tolist() if t < self._tokenizer.eot])
+            for inicio, fin, tokens in piezas
+        ]
+        return piezas, result.text, silencio
+
+    def _step(self, final):
+        self._pending = 0
+        inicio_paso = time.monotonic()
+        piezas, texto, silencio = self._decode()
+        duracion_buffer = len(self._buffer) / SAMPLE_RATE
+        offset = self._buffer_start / SAMPLE_RATE
+
+        if silencio:
+            self._previous = []
+            if final:
+                self._advance(len(self._buffer))
+            elif len(self._buffer) > self.max_buffer // 2:
+                # Silencio largo: se descarta salvo el último segundo (puede empezar una frase)
+                self._advance(len(self._buffer) - SAMPLE_RATE)
+            return
+
+        # Se finalizan las piezas que coinciden con la pasada anterior y no rozan el final
+        confirmadas = 0
+        for i, (_, fin, texto_pieza, _) in enumerate(piezas):
+            if final:
+                confirmadas = len(piezas)
+                break
+            if fin > duracion_buffer - self.commit_margin_s:
+                break
+            if i < len(self._previous) and self._previous[i] == texto_pieza.strip():
+                confirmadas = i + 1
+            else:
+                break
+
+        # Con el búfer lleno se finaliza todo lo que tenga marcas de tiempo completas
+        if not final and confirmadas == 0 and len(self._buffer) >= self.max_buffer:
+            confirmadas = max(1, len(piezas) - 1) if piezas else 0
+
+        ahora = time.monotonic()
+        fin_confirmado = 0.0
+        for inicio, fin, texto_pieza, tokens in piezas[:confirmadas]:
+            if not texto_pieza.strip():
+                fin_confirmado = fin
+                continue
+            segmento = {
+                'id': len(self.segments),
+                'start': round(offset + inicio, 3),
+                'end': round(offset + min(fin, duracion_buffer), 3),
+                'text': texto_pieza,
+            }
+            self.segments.append(segmento)
+            self._prompt.extend(tokens)
+            fin_confirmado = fin
+            self.on_event({
+                'tipo': 'final',
+                'segmento': segmento,
+                'retraso_s': ahora - self._arrival(int(segmento['end'] * SAMPLE_RATE)),
+            })
+
+        if confirmadas:
+            corte = len(self._buffer) if final else int(fin_confirmado * SAMPLE_RATE)
+            self._advance(corte)
+        elif len(self._buffer) >= self.max_buffer:
+            # Sin nada que finalizar y el búfer lleno: se descarta lo más antiguo
+            self._advance(len(self._buffer) - self.max_buffer + self.step)
+
+        pendientes = piezas[confirmadas:]
+        self._previous = [p[2].strip() for p in pendientes]
+        if not final:
+            self.on_event({
+                'tipo': 'parcial',
+                'texto': ''.join(p[2] for p in pendientes) or texto,
+                'inicio': self._buffer_start / SAMPLE_RATE,
+                'retraso_s': ahora - self._arrival(self._received),
+                'paso_s': ahora - inicio_paso,
+            })
+
+    def _advance(self, muestras):
+        """Descarta las primeras muestras del búfer"""
+        muestras = max(0, min(muestras, len(self._buffer)))
+        self._buffer = self._buffer[muestras:]
+        self._buffer_start += muestras
+        # Las llegadas anteriores al búfer ya no se consultan
+        i = bisect.bisect_left(self._llegadas_muestras, self._buffer_start)
+        if i > 1:
+            del self._llegadas_muestras[:i - 1]
+            del self._llegadas_t[:i - 1]
+
+
+def run_stream(chunks, transcriber):
+    """
+    Alimenta el transcriptor con los bloques de una fuente leída en otro hilo.
+
+    La lectura no se bloquea mientras se decodifica: todo lo que llega durante
+    un paso se procesa junto en el siguiente.
+
+    Args:
+        chunks: Iterable de bytes PCM
+        transcriber (StreamingTranscriber): Transcriptor
+
+    Returns:
+        list: Segmentos finales
+    """
+    cola = queue.Queue()
+    fin = object()
+
+    def leer():
+        try:
+            for datos in chunks:
+                cola.put(datos)
+        finally:
+            cola.put(fin)
+
+    threading.Thread(target=leer, name='lectura-directo', daemon=True).start()
+
+    terminado = False
+    while not terminado:
+        bloques = [cola.get()]
+        while True:
+            try:
+                bloques.append(cola.get_nowait())
+            except queue.Empty:
+                break
+        if bloques[-1] is fin:
+            bloques.pop()
+            terminado = True
+        if bloques:
+            transcriber.feed(b''.join(bloques))
+
+    return transcriber.finish()
+
+
+def main(argv=None):
+    from src.export import EXPORT_FORMATS, write_export
+    from src.utils import format_time
+
+    parser = argparse.ArgumentParser(
+        prog='python -m src.streaming',
+        description='Transcribe en directo PCM s16le mono a 16 kHz.'
+    )
+    fuente = parser.add_mutually_exclusive_group(required=True)
+    fuente.add_argument('--archivo', help='Archivo que se sigue escribiendo (PCM o WAV s16le 16 kHz)')
+    fuente.add_argument('--stdin', action='store_true', help='Leer PCM de la entrada estándar')
+    fuente.add_argument('--socket', help='host:puerto en el que esperar una conexión TCP local')
+    parser.add_argument('--modelo', default='tiny', choices=list(MODELOS_DISPONIBLES.keys()))
+    parser.add_argument('--idioma', default='auto', choices=list(IDIOMAS.keys()))
+    parser.add_argument('--formatos', default='', help='Exportaciones al terminar: ' + ','.join(EXPORT_FORMATS))
+    parser.add_argument('--salida', default='directo', help='Ruta base de las exportaciones (sin extensión)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    formatos = [fmt.strip() for fmt in args.formatos.split(',') if fmt.strip()]
+    desconocidos = [fmt for fmt in formatos if fmt not in EXPORT_FORMATS]
+    if desconocidos:
+        parser.error(f'Formatos no soportados: {", ".join(desconocidos)}')
+
+    from src.transcription import build_model
+    model = build_model(args.modelo)
+
+    def mostrar(evento):
+        if evento['tipo'] == 'final':
+            s = evento['segmento']
+            sys.stderr.write('\r\033[K')
+            print(f"[{format_time(s['start'])} --> {format_time(s['end'])}]{s['text']}", flush=True)
+        else:
+            sys.stderr.write(f"\r\033[K… {evento['texto'].strip()[-100:]}  ({evento['retraso_s']:.1f} s)")
+            sys.stderr.flush()
+
+    if args.archivo:
+        chunks = read_growing_file(args.archivo)
+    elif args.stdin:
+        chunks = read_pipe(sys.stdin.buffer)
+    else:
+        host, _, puerto = args.socket.rpartition(':')
+        chunks = read_socket(host or '127.0.0.1', int(puerto))
+
+    transcriber = StreamingTranscriber(model, args.idioma, on_event=mostrar)
+    try:
+        run_stream(chunks, transcriber)
+    except KeyboardInterrupt:
+        transcriber.finish()
+    sys.stderr.write('\n')
+
+    for fmt in formatos:
+        destino = f"{args.salida}.{EXPORT_FORMATS[fmt]['extension']}"
+        with open(destino, 'wb') as f:
+            write_export(fmt, transcriber.text, transcriber.segments, f)
+        logger.info('Guardado %s', destino)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
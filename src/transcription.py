@@ -1,110 +1,295 @@
 """
 Funciones para la transcripción de audio con Whisper.
 """
-import whisper
 import streamlit as st
-import sys
-import re
-import io
-
-
-class ProgressTracker:
-    """Rastrea el progreso de la transcripción en tiempo real capturando logs de Whisper"""
-    def __init__(self, duracion_total):
-        self.duracion_total = duracion_total
-        self.ultimo_timestamp = 0
-        self.porcentaje = 0
-        self.tiempo_procesado_formateado = "0:00"
-        self.buffer = []
-    
-    def write(self, text):
-        """Captura salida de stderr/stdout de Whisper"""
-        if text.strip():
-            self.buffer.append(text)
-            
-            # Buscar porcentajes en el formato de Whisper: "XX%"
-            match_percent = re.search(r'(\d+)%', text)
-            if match_percent:
-                self.porcentaje = int(match_percent.group(1))
-                
-                # Si tenemos duración total, calcular timestamp procesado
-                if self.duracion_total > 0:
-                    timestamp_segundos = (self.porcentaje / 100) * self.duracion_total
-                    self.ultimo_timestamp = timestamp_segundos
-                    minutos = int(timestamp_segundos // 60)
-                    segundos = int(timestamp_segundos % 60)
-                    self.tiempo_procesado_formateado = f"{minutos}:{segundos:02d}"
-    
-    def flush(self):
-        """Requerido por la interfaz de streams"""
-        pass
-    
-    def update_from_timestamp(self, timestamp_segundos):
-        """Actualiza el progreso basándose en el timestamp procesado"""
-        self.ultimo_timestamp = timestamp_segundos
-        
-        # Calcular porcentaje
-        if self.duracion_total > 0:
-            self.porcentaje = min(100, int((timestamp_segundos / self.duracion_total) * 100))
-        
-        # Formatear tiempo procesado
-        minutos = int(timestamp_segundos // 60)
-        segundos = int(timestamp_segundos % 60)
-        self.tiempo_procesado_formateado = f"{minutos}:{segundos:02d}"
+
+from src.config import (
+    CASCADE_DRAFT_MODEL,
+    DECODE_BATCH_SIZE,
+    DECODE_PROFILE,
+    DECODE_PROFILES,
+    MODELOS_DISPONIBLES,
+    PARALLEL_WORKERS,
+    SHARED_WEIGHTS,
+    VAD_ENABLED,
+    VAD_MIN_SKIP_FRACTION,
+    WINDOWED_MIN_DURATION_S,
+)
+
+
+SAMPLE_RATE = 16000
+
+# Opciones de decodificación fijas (forman parte de la clave de caché)
+DECODE_OPTIONS = {
+    'fp16': False,  # Forzar FP32 en CPU
+}
+
+
+def uses_int8(model_name):
+    """Indica si el modelo se carga cuantizado a INT8 según MODELOS_DISPONIBLES"""
+    return MODELOS_DISPONIBLES.get(model_name, {}).get('int8', False)
+
+
+def profile_options(profile=None, batched=False):
+    """
+    Opciones de decodificación de un perfil de DECODE_PROFILES.
+
+    Args:
+        profile (str): Nombre del perfil (None: DECODE_PROFILE)
+        batched (bool): Para transcribe_batch (ventanas independientes, sin texto anterior)
+
+    Returns:
+        dict: Temperaturas, beam_size/best_of si el perfil los fija, reintentos máximos
+            por ventana y tiempo máximo en reintentos
+    """
+    profile = profile or DECODE_PROFILE
+    if profile not in DECODE_PROFILES:
+        raise ValueError(f'Perfil de decodificación desconocido: {profile}')
+
+    ajustes = DECODE_PROFILES[profile]
+    options = {
+        'temperature': ajustes['temperature'],
+        'max_fallbacks': ajustes['max_fallbacks'],
+        'fallback_budget_s': ajustes['fallback_budget_s'],
+    }
+    for clave in ('beam_size', 'best_of'):
+        if ajustes[clave] is not None:
+            options[clave] = ajustes[clave]
+    if not batched:
+        options['condition_on_previous_text'] = ajustes['condition_on_previous_text']
+    return options
+
+
+def model_options(model_name, batched=DECODE_BATCH_SIZE > 1, cascade=False, profile=None, parallel=False):
+    """
+    Opciones que determinan el resultado de un modelo (para la clave de caché).
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+        batched (bool): Si se decodifica por lotes de ventanas independientes
+        cascade (bool): Si el modelo solo refina un borrador de CASCADE_DRAFT_MODEL
+        profile (str): Perfil de decodificación (None: DECODE_PROFILE)
+        parallel (bool): Si se permite el modo paralelo (los audios largos se cortan en
+            fragmentos y cambian los límites y el texto de los segmentos)
+
+    Returns:
+        dict: DECODE_OPTIONS y las del perfil con su nombre en 'perfil', más 'int8' si el
+            modelo se carga cuantizado, 'vad' si se salta el silencio, 'lotes' si las
+            ventanas se decodifican por lotes, 'cascada' con el modelo del borrador y
+            'paralelo' con el número de procesos
+    """
+    options = dict(DECODE_OPTIONS)
+    options['perfil'] = profile or DECODE_PROFILE
+    options.update(profile_options(profile, batched))
+    if uses_int8(model_name):
+        options['int8'] = True
+    if VAD_ENABLED:
+        options['vad'] = True
+    if batched:
+        options['lotes'] = True
+    if cascade:
+        options['cascada'] = CASCADE_DRAFT_MODEL
+    elif parallel:
+        # La cascada desactiva el modo paralelo (ver pipeline.plan_mode)
+        options['paralelo'] = PARALLEL_WORKERS
+    return options
+
+
+def quantize_model(model):
+    """
+    Cuantiza dinámicamente a INT8 las capas lineales de un modelo de Whisper.
+
+    Los pesos se guardan en INT8 y las activaciones se cuantizan al vuelo, así
+    que solo aplica en CPU. Las convoluciones y los embeddings siguen en FP32.
+
+    Args:
+        model: Modelo de Whisper en CPU
+
+    Returns:
+        Modelo con las capas lineales cuantizadas
+    """
+    import torch
+    from whisper.model import Linear
+
+    # whisper usa una subclase de nn.Linear que quantize_dynamic no reconoce;
+    # en FP32 su forward es idéntico al de nn.Linear
+    for module in model.modules():
+        if isinstance(module, Linear):
+            module.__class__ = torch.nn.Linear
+
+    # In situ: copiar el modelo FP32 entero solo para descartarlo duplicaría la memoria
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def build_model(model_name, int8=None):
+    """
+    Carga un modelo de Whisper, cuantizado si corresponde (sin caché).
+
+    En CPU y con SHARED_WEIGHTS, los pesos se mapean desde el archivo compartido
+    entre procesos (src.weights) en lugar de deserializar el checkpoint.
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+        int8 (bool): Forzar o desactivar INT8 (None: según MODELOS_DISPONIBLES)
+
+    Returns:
+        Modelo de Whisper listo para inferencia
+    """
+    # whisper arrastra torch: se importa al cargar el primer modelo, no al arrancar la app
+    import torch
+    import whisper
+
+    if int8 is None:
+        int8 = uses_int8(model_name)
+
+    if SHARED_WEIGHTS and (int8 or not torch.cuda.is_available()):
+        from src.weights import load_shared_model
+
+        model = load_shared_model(model_name)
+        # INT8 reempaqueta las capas lineales en memoria propia; el resto sigue compartido
+        return quantize_model(model) if int8 else model
+
+    if int8:
+        return quantize_model(whisper.load_model(model_name, device='cpu'))
+    return whisper.load_model(model_name)
 
 
 @st.cache_resource
 def load_whisper_model(model_name):
     """Carga el modelo de Whisper y lo mantiene en caché"""
     try:
-        return whisper.load_model(model_name)
+        return build_model(model_name)
     except Exception as e:
         st.error(f"Error al cargar el modelo: {e}")
         return None
 
 
-def transcribe_audio(model, audio_path, language=None, progress_tracker=None):
+def transcribe_audio(model, audio_path, language=None, progress_tracker=None, timer=None, vad=VAD_ENABLED,
+                     checkpoint=None, windowed=None, profile=None):
     """
     Transcribe un archivo de audio usando Whisper.
     
     Args:
         model: Modelo de Whisper cargado
-        audio_path (str): Ruta al archivo de audio
+        audio_path: Ruta al archivo de audio o array PCM a 16 kHz (por ejemplo, IngestedAudio.pcm)
         language (str): Idioma (None para auto-detección)
         progress_tracker: Objeto ProgressTracker para actualizar progreso (opcional)
+        timer: StageTimer para los tiempos por etapa (opcional)
+        vad (bool): Pasar a Whisper solo las regiones con voz
+        checkpoint: Checkpoint para guardar el avance y reanudar (opcional)
+        windowed (bool): Leer el audio y calcular el mel ventana a ventana con memoria
+            acotada (None: a partir de WINDOWED_MIN_DURATION_S)
+        profile (str): Perfil de decodificación de DECODE_PROFILES (None: DECODE_PROFILE)
     
     Returns:
-        dict: Resultado de la transcripción
+        dict: Resultado de la transcripción con 'fallbacks' (reintentos por temperatura);
+            con vad, incluye 'vad' con el audio omitido
     """
-    transcribe_kwargs = {
-        'fp16': False,  # Forzar FP32 en CPU
-        'verbose': True,  # ACTIVAR para capturar porcentajes
-    }
+    from src.decoding import decode_windows, transcribe_windows
+    from src.metrics import NULL_TIMER
+
+    timer = timer or NULL_TIMER
+    transcribe_kwargs = dict(DECODE_OPTIONS)
+    transcribe_kwargs.update(profile_options(profile))
     
     if language and language != 'auto':
         transcribe_kwargs['language'] = language
+
+    audio = audio_path
+    if windowed is None:
+        if isinstance(audio, str):
+            from src.utils import get_audio_duration
+            duration = get_audio_duration(audio)
+        else:
+            duration = len(audio) / SAMPLE_RATE
+        windowed = duration is not None and duration >= WINDOWED_MIN_DURATION_S
+
+    ingested = None
+    speech_map = None
+    if vad:
+        from src.vad import SpeechMap, detect_speech
+
+        if isinstance(audio, str):
+            if windowed:
+                # La detección de voz recorre el audio: se decodifica a un PCM en disco, no en memoria
+                from src.audio import decode_file
+                ingested = decode_file(audio)
+                audio = ingested.pcm
+            else:
+                from whisper.audio import load_audio
+                audio = load_audio(audio)
+
+        with timer.stage('vad'):
+            speech_map = SpeechMap(detect_speech(audio), len(audio))
+            if speech_map.skipped_fraction >= VAD_MIN_SKIP_FRACTION and speech_map.voiced_samples:
+                if not windowed:
+                    audio = speech_map.compact(audio)
+            else:
+                speech_map = None  # Poco que ahorrar (o nada de voz): audio completo
+
+        if speech_map is not None and progress_tracker is not None:
+            progress_tracker.log(
+                f'🔇 Se omiten {speech_map.skipped_s:.0f} s de silencio '
+                f'({speech_map.skipped_fraction:.0%} del audio)'
+            )
     
-    # Si hay progress_tracker, redirigir stderr para capturar progreso
-    if progress_tracker:
-        # Guardar stderr original
-        old_stderr = sys.stderr
-        
-        try:
-            # Redirigir stderr al progress_tracker
-            sys.stderr = progress_tracker
-            
-            # Transcribir (los logs de progreso irán a progress_tracker)
-            result = model.transcribe(audio_path, **transcribe_kwargs)
-            
-            # Restaurar stderr
-            sys.stderr = old_stderr
-            
-            return result
-        except Exception as e:
-            # Asegurar que stderr se restaura incluso si hay error
-            sys.stderr = old_stderr
-            raise e
-    else:
-        # Transcripción simple sin seguimiento
-        return model.transcribe(audio_path, **transcribe_kwargs)
+    try:
+        # El bucle de decodificación informa al tracker ventana a ventana
+        if windowed:
+            from src.windowed import open_windows
+
+            windows = open_windows(model, audio, speech_map, timer)
+            if progress_tracker is not None and windows.content_frames is not None:
+                progress_tracker.set_total(windows.position(windows.content_frames))
+            try:
+                result = decode_windows(
+                    model, windows, progress=progress_tracker, timer=timer, speech_map=speech_map,
+                    checkpoint=checkpoint, **transcribe_kwargs
+                )
+            finally:
+                windows.close()
+        else:
+            result = transcribe_windows(
+                model, audio, progress=progress_tracker, timer=timer, speech_map=speech_map,
+                checkpoint=checkpoint, **transcribe_kwargs
+            )
+    finally:
+        if ingested is not None:
+            ingested.close()
+
+    if speech_map is not None:
+        result['vad'] = {
+            'omitido_s': speech_map.skipped_s,
+            'fraccion_omitida': speech_map.skipped_fraction,
+            'regiones': len(speech_map.regiones),
+        }
+    return result
+
+
+def transcribe_audio_batched(model, audios, language=None, progress_trackers=None, timer=None, vad=VAD_ENABLED,
+                             batch_size=None, profile=None):
+    """
+    Transcribe uno o varios audios decodificando sus ventanas en lotes.
+
+    Las ventanas son independientes (sin el texto anterior como prompt), lo que
+    permite pasar varias a la vez por el encoder y el decoder.
+
+    Args:
+        model: Modelo de Whisper cargado
+        audios (list): Arrays PCM a 16 kHz
+        language (str): Idioma (None o 'auto' para auto-detección)
+        progress_trackers (list): ProgressTracker por audio (opcional)
+        timer: StageTimer para los tiempos por etapa (opcional)
+        vad (bool): Cortar las ventanas sobre las regiones con voz
+        batch_size (int): Ventanas por lote (por defecto, DECODE_BATCH_SIZE)
+        profile (str): Perfil de decodificación de DECODE_PROFILES (None: DECODE_PROFILE)
+
+    Returns:
+        list: Un resultado por audio, con el mismo formato que transcribe_audio
+    """
+    from src.batched import transcribe_batch
 
+    return transcribe_batch(
+        model, audios, language, progress=progress_trackers, timer=timer, vad=vad,
+        batch_size=batch_size or DECODE_BATCH_SIZE, **DECODE_OPTIONS, **profile_options(profile, batched=True)
+    )
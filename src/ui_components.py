@@ -2,7 +2,8 @@
 Componentes de interfaz de usuario reutilizables.
 """
 import streamlit as st
-from src.config import MODELOS_DISPONIBLES, IDIOMAS
+from src.config import MODELOS_DISPONIBLES, MODELO_POR_DEFECTO, IDIOMAS, PARALLEL_WORKERS, PARALLEL_MIN_DURATION_S, CASCADE_DRAFT_MODEL
+from src.config import DECODE_PROFILES, DECODE_PROFILE
 
 
 def render_sidebar(estado_procesando=False):
@@ -20,7 +21,7 @@ def render_sidebar(estado_procesando=False):
     for idx, (key, info) in enumerate(MODELOS_DISPONIBLES.items()):
         if info['disponible']:
             modelos_lista.append(key)
-            if key == 'base':
+            if key == MODELO_POR_DEFECTO:
                 modelo_default_idx = len(modelos_lista) - 1
         else:
             modelos_lista.append(f"🚫 {key} (no disponible)")
@@ -36,7 +37,7 @@ def render_sidebar(estado_procesando=False):
     # Determinar el modelo real
     if modelo_seleccionado.startswith('🚫'):
         st.sidebar.error('⚠️ Este modelo no está disponible en CPU gratuita. Por favor, selecciona "tiny" o "base".')
-        modelo_real = 'base'
+        modelo_real = MODELO_POR_DEFECTO
         modelo_disabled = True
     else:
         modelo_real = modelo_seleccionado
@@ -52,18 +53,60 @@ def render_sidebar(estado_procesando=False):
         disabled=estado_procesando
     )
     
+    # Perfil de decodificación: cuánto se reintenta cada ventana dudosa
+    perfiles = list(DECODE_PROFILES.keys())
+    perfil = st.sidebar.selectbox(
+        '🎚️ Perfil de decodificación',
+        perfiles,
+        format_func=lambda x: DECODE_PROFILES[x]['nombre'],
+        index=perfiles.index(DECODE_PROFILE) if DECODE_PROFILE in perfiles else 0,
+        help=' · '.join(f"{p['nombre']}: {p['descripcion']}" for p in DECODE_PROFILES.values()),
+        disabled=estado_procesando
+    )
+    
+    # Transcripción paralela (solo tiene sentido con varios núcleos)
+    paralelo = False
+    if PARALLEL_WORKERS > 1:
+        paralelo = st.sidebar.checkbox(
+            f'⚡ Transcripción paralela ({PARALLEL_WORKERS} procesos)',
+            value=False,
+            help=f'Divide audios de más de {PARALLEL_MIN_DURATION_S // 60} min en fragmentos '
+                 'y los transcribe a la vez. Usa más memoria (un modelo por proceso).',
+            disabled=estado_procesando
+        )
+    
+    # Cascada: borrador con el modelo rápido y refinado de lo dudoso con el elegido
+    cascada = False
+    if modelo_real != CASCADE_DRAFT_MODEL and not modelo_disabled:
+        cascada = st.sidebar.checkbox(
+            f'🪜 Modo cascada ({CASCADE_DRAFT_MODEL} + {modelo_real})',
+            value=False,
+            help=f'Transcribe todo con {CASCADE_DRAFT_MODEL} y repite con {modelo_real} solo los '
+                 'fragmentos de poca confianza. Casi la calidad del modelo grande, mucho más rápido.',
+            disabled=estado_procesando
+        )
+    
     # Información sobre el modelo seleccionado
     if modelo_real in MODELOS_DISPONIBLES:
         info = MODELOS_DISPONIBLES[modelo_real]
         st.sidebar.markdown('### 📊 Información del Modelo')
-        st.sidebar.info(f"**{info['nombre']}**: {info['tamaño']} - {info['velocidad']}, precisión {info['precision'].lower()}")
+        cuantizado = ' (INT8)' if info.get('int8') else ''
+        st.sidebar.info(f"**{info['nombre']}{cuantizado}**: {info['tamaño']} - {info['velocidad']}, precisión {info['precision'].lower()}")
     
-    # Advertencia de rendimiento
+    # Tiempo previsto con lo aprendido de las transcripciones anteriores en esta máquina
+    from src.estimator import get_cost_estimator
+    from src.pipeline import plan_mode
+
     st.sidebar.markdown('### ⚡ Rendimiento en CPU')
-    st.sidebar.warning(f"⏱️ Tiempo estimado para 200MB: **10-25 min con base**")
+    estimacion = get_cost_estimator().estimate(modelo_real, 3600, perfil, plan_mode(3600, paralelo, cascada))
+    base = (f"según {estimacion['observaciones']} transcripciones" if estimacion['observaciones']
+            else 'estimación inicial, se ajusta con cada transcripción')
+    st.sidebar.warning(
+        f"⏱️ Tiempo estimado por hora de audio: **~{estimacion['segundos'] / 60:.0f} min con {modelo_real}** ({base})"
+    )
     st.sidebar.info("💡 **Consejo**: Usa archivos < 50MB o modelo 'tiny' para pruebas rápidas.")
     
-    return modelo_real, idioma, modelo_disabled
+    return modelo_real, idioma, modelo_disabled, paralelo, cascada, perfil
 
 
 def render_file_uploader(estado_procesando=False):
@@ -100,6 +143,145 @@ def render_file_info(archivo):
     return tamano_mb
 
 
+def render_result(resultado):
+    """Muestra el resultado de la transcripción y genera las descargas bajo demanda"""
+    from src.export import EXPORT_FORMATS, export_bytes
+    
+    if resultado['desde_cache']:
+        st.success(f"⚡ Recuperado de caché en {resultado['tiempo_total'] * 1000:.0f} ms")
+    else:
+        st.success(f"🎉 Completado en {resultado['tiempo_total'] / 60:.1f} minutos")
+    
+    if resultado.get('silencio_omitido_s') and resultado.get('duracion_audio'):
+        omitido = resultado['silencio_omitido_s']
+        st.info(f"🔇 Se omitieron {omitido / 60:.1f} min de silencio "
+                f"({omitido / resultado['duracion_audio']:.0%} del audio)")
+    
+    if resultado.get('cascada'):
+        cascada = resultado['cascada']
+        st.info(f"🪜 Cascada: se refinaron {cascada['segmentos_escalados']} de {cascada['segmentos_borrador']} "
+                f"segmentos ({cascada['audio_escalado_s']:.0f} s, {cascada['fraccion_escalada']:.0%} del audio)")
+    
+    fallbacks = resultado.get('fallbacks')
+    if fallbacks and (fallbacks['reintentos'] or fallbacks['agotados']):
+        perfil = DECODE_PROFILES.get(resultado.get('perfil'), {}).get('nombre', resultado.get('perfil'))
+        mensaje = (f"🔁 {fallbacks['reintentos']} reintentos por temperatura ({fallbacks['segundos']:.0f} s) "
+                   f"con el perfil {perfil}")
+        if fallbacks['agotados']:
+            mensaje += f"; {fallbacks['agotados']} ventanas se quedaron sin reintentar por el límite del perfil"
+        st.info(mensaje)
+    
+    if resultado.get('etapas'):
+        with st.expander('⏱️ Tiempo por etapa'):
+            for etapa, segundos in resultado['etapas'].items():
+                st.text(f"{etapa.replace('_', ' ')}: {segundos:.2f} s")
+    
+    st.markdown('---')
+    st.subheader('📄 Resultado')
+    st.info(f"**Idioma detectado**: {resultado['idioma']}")
+    
+    with st.expander('📝 Ver transcripción completa', expanded=True):
+        st.text_area(
+            'Texto transcrito',
+            resultado['texto'],
+            height=300,
+            label_visibility='collapsed'
+        )
+    
+    # Descargas: el archivo solo se genera cuando se pide
+    st.markdown('##### 📥 Descargar')
+    formato = st.radio(
+        'Formato',
+        list(EXPORT_FORMATS.keys()),
+        format_func=lambda f: EXPORT_FORMATS[f]['nombre'],
+        horizontal=True,
+        label_visibility='collapsed',
+        key='formato_descarga'
+    )
+    
+    if st.button('📦 Preparar descarga', use_container_width=True):
+        info = EXPORT_FORMATS[formato]
+        st.download_button(
+            label=f"📥 Descargar {info['nombre']}",
+            data=export_bytes(formato, resultado['texto'], resultado['segmentos']),
+            file_name=f"transcripcion_{resultado['nombre']}.{info['extension']}",
+            mime=info['mime'],
+            use_container_width=True
+        )
+
+
+@st.fragment(run_every=1)
+def render_job_status(job_id):
+    """Muestra el progreso de un trabajo refrescándose cada segundo sin rehacer la página"""
+    import time
+    from src.estimator import remaining_seconds
+    from src.jobs import get_job_manager, PENDIENTE
+    from src.utils import format_time
+    
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    
+    if job is None or not job.activo:
+        # Terminó: se repinta la página completa para mostrar el resultado
+        st.rerun()
+    
+    progress_bar = st.progress(0)
+    status_detail = st.empty()
+    
+    estimado = job.params.get('estimacion_s')
+    if job.estado == PENDIENTE:
+        posicion = manager.queue_position(job_id)
+        progress_bar.progress(0)
+        proceso = f' Proceso estimado: ~{format_time(estimado)}.' if estimado else ''
+        if job.diferido:
+            status_detail.info(
+                f'⏳ En cola diferida: posición {posicion}. Este audio no cabe en el tiempo de respuesta '
+                f'configurado y empezará cuando no haya otros trabajos esperando.{proceso}'
+            )
+        else:
+            status_detail.info(f'⏳ En cola: posición {posicion}. La transcripción empezará en cuanto haya un hueco.{proceso}')
+    else:
+        snapshot = job.progreso.snapshot()
+        progreso_porcentaje = snapshot['porcentaje']
+        tiempo_transcurrido = time.time() - job.iniciado
+        minutos_trans = int(tiempo_transcurrido // 60)
+        segundos_trans = int(tiempo_transcurrido % 60)
+        
+        # Previsión de antes de empezar corregida con la velocidad real según avanza
+        tiempo_restante_est = remaining_seconds(estimado, tiempo_transcurrido, progreso_porcentaje)
+        restante = f'~{format_time(tiempo_restante_est)}' if tiempo_restante_est is not None else 'calculando...'
+        
+        if progreso_porcentaje > 0:
+            progress_bar.progress(min(progreso_porcentaje, 99))
+            
+            duracion_min = int(snapshot['duracion_s'] // 60)
+            duracion_seg = int(snapshot['duracion_s'] % 60)
+            
+            status_detail.success(
+                f'🎵 **Progreso: {progreso_porcentaje}%** | '
+                f'Procesado: {job.progreso.tiempo_procesado_formateado} / {duracion_min}:{duracion_seg:02d}\n\n'
+                f'⏱️ Tiempo transcurrido: {minutos_trans}:{segundos_trans:02d} | '
+                f'Restante: {restante} | '
+                f"Segmentos: {snapshot['segmentos']}"
+            )
+        else:
+            progress_bar.progress(1)
+            status_detail.info(
+                f'⏱️ Iniciando transcripción... Tiempo transcurrido: {minutos_trans}:{segundos_trans:02d} | '
+                f'Restante: {restante}'
+            )
+        
+        # Mostrar los últimos logs de Whisper
+        st.markdown('##### 📋 Logs de Whisper')
+        recent_logs = job.progreso.tail(8)
+        if recent_logs:
+            st.code('\n'.join(recent_logs), language=None)
+    
+    st.caption('💡 Puedes recargar la página: el trabajo sigue en segundo plano.')
+    if st.button('⏹️ Cancelar transcripción', key=f'cancelar_{job_id}'):
+        manager.cancel(job_id)
+
+
 def render_info_panel():
     """Renderiza el panel de información"""
     st.header('ℹ️ Información')
@@ -109,8 +291,8 @@ def render_info_panel():
     1. **Selecciona** el modelo y idioma en la barra lateral
     2. **Sube** tu archivo de audio
     3. **Haz clic** en "Transcribir Audio"
-    4. **Espera** a que se complete (puede tardar varios minutos)
-    5. **Descarga** el resultado en TXT o DOCX
+    4. **Espera** a que se complete (puede tardar varios minutos; puedes recargar la página)
+    5. **Descarga** el resultado en TXT, DOCX, SRT, WebVTT o JSONL
     
     ### ⚡ Consejos de rendimiento:
     - **tiny**: Más rápido, menos preciso
@@ -125,3 +307,36 @@ def render_info_panel():
     Para procesamiento más rápido, considera activar GPU.
     """)
 
+    from src.startup import timings
+
+    tiempos = timings()
+    if tiempos:
+        with st.expander('⏱️ Tiempos de arranque'):
+            for nombre, segundos in tiempos.items():
+                st.text(f"{nombre.replace('_', ' ')}: {segundos:.2f} s")
+
+
+def render_search():
+    """Buscador sobre el archivo de transcripciones"""
+    from src.store import get_transcript_store
+    from src.utils import format_time
+
+    with st.expander('🔎 Buscar en transcripciones anteriores'):
+        consulta = st.text_input(
+            'Buscar',
+            placeholder='palabras, "frase exacta" o prefijo*',
+            label_visibility='collapsed'
+        )
+        store = get_transcript_store()
+        if not consulta:
+            stats = store.stats()
+            st.caption(f"{stats['transcripciones']} transcripciones, {stats['segmentos']} segmentos, "
+                       f"{stats['horas']:.1f} h de audio")
+            return
+
+        resultados = store.search(consulta)
+        if not resultados:
+            st.info('Sin resultados.')
+            return
+        for r in resultados:
+            st.markdown(f"**{r['nombre']}** · `{format_time(r['inicio'])}` — {r['fragmento']}")
@@ -5,6 +5,9 @@ import os
 import subprocess
 import sys
 import json
+import functools
+
+from src.config import PROBE_BYTES
 
 
 def format_time(seconds):
@@ -14,88 +17,86 @@ def format_time(seconds):
     return f"{minutes:02d}:{seconds:02d}"
 
 
-def setup_ffmpeg():
-    """Configura ffmpeg para que esté disponible en el PATH"""
-    try:
-        # Verificar si ffmpeg está disponible
-        result = subprocess.run(['ffmpeg', '-version'], 
-                             capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            return True
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
-    
-    # Si no está disponible, intentar usar los ejecutables locales
-    try:
-        local_ffmpeg = os.path.join(os.getcwd(), 'ffmpeg', 'ffmpeg.exe')
-        if os.path.exists(local_ffmpeg):
-            # Añadir al PATH temporalmente
-            ffmpeg_dir = os.path.join(os.getcwd(), 'ffmpeg')
-            os.environ['PATH'] = ffmpeg_dir + os.pathsep + os.environ['PATH']
-            
-            # Verificar que funciona
-            result = subprocess.run([local_ffmpeg, '-version'], 
-                                 capture_output=True, text=True, timeout=10)
+@functools.lru_cache(maxsize=None)
+def find_tool(name):
+    """
+    Localiza un ejecutable de FFmpeg (una sola vez por proceso).
+
+    Args:
+        name (str): 'ffmpeg' o 'ffprobe'
+
+    Returns:
+        str: Comando o ruta del ejecutable que funciona, o None si no hay ninguno
+    """
+    candidatos = [name, os.path.join(os.getcwd(), 'ffmpeg', f'{name}.exe')]
+    for candidato in candidatos:
+        if candidato != name and not os.path.exists(candidato):
+            continue
+        try:
+            result = subprocess.run([candidato, '-version'],
+                                    capture_output=True, text=True, timeout=10)
             if result.returncode == 0:
-                return True
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
-    
-    return False
+                return candidato
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            pass
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def setup_ffmpeg():
+    """Configura ffmpeg para que esté disponible en el PATH (se comprueba una vez por proceso)"""
+    ffmpeg = find_tool('ffmpeg')
+    if ffmpeg is None:
+        return False
+
+    if ffmpeg != 'ffmpeg':
+        # Ejecutables locales: añadir su directorio al PATH para whisper y la ingesta
+        ffmpeg_dir = os.path.dirname(ffmpeg)
+        os.environ['PATH'] = ffmpeg_dir + os.pathsep + os.environ['PATH']
+    return True
 
 
 def get_audio_duration(audio_path):
     """
     Obtiene la duración de un archivo de audio en segundos usando FFprobe.
     
+    Con el contenido en memoria (por ejemplo, el buffer del archivo subido) solo
+    se envía a ffprobe su principio por una tubería; si no está entero, la
+    duración se extrapola del bitrate y el tamaño total (es aproximada).
+    
     Args:
-        audio_path (str): Ruta al archivo de audio
+        audio_path: Ruta al archivo de audio, o su contenido (bytes o memoryview)
     
     Returns:
         float: Duración en segundos, o None si falla
     """
+    ffprobe = find_tool('ffprobe')
+    if ffprobe is None:
+        return None
+
+    en_memoria = not isinstance(audio_path, (str, os.PathLike))
     try:
-        # Intentar con ffprobe del sistema
         cmd = [
-            'ffprobe',
+            ffprobe,
             '-v', 'quiet',
             '-print_format', 'json',
             '-show_format',
-            audio_path
+            'pipe:0' if en_memoria else audio_path
         ]
         
+        entrada = bytes(memoryview(audio_path)[:PROBE_BYTES]) if en_memoria else None
         result = subprocess.run(
             cmd,
+            input=entrada,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
             check=True,
             timeout=10
         )
         
-        data = json.loads(result.stdout)
-        duration = float(data['format']['duration'])
-        return duration
-        
+        formato = json.loads(result.stdout)['format']
+        if en_memoria and len(entrada) < memoryview(audio_path).nbytes and formato.get('bit_rate'):
+            return memoryview(audio_path).nbytes * 8 / float(formato['bit_rate'])
+        return float(formato['duration'])
     except Exception:
-        # Intentar con ffprobe local
-        try:
-            local_ffprobe = os.path.join(os.getcwd(), 'ffmpeg', 'ffprobe.exe')
-            if os.path.exists(local_ffprobe):
-                cmd[0] = local_ffprobe
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    check=True,
-                    timeout=10
-                )
-                data = json.loads(result.stdout)
-                duration = float(data['format']['duration'])
-                return duration
-        except Exception:
-            pass
-        
         return None
-
@@ -0,0 +1,179 @@
+"""
+Detección de voz por energía y planitud espectral antes de pasar el audio a Whisper.
+
+En una sola pasada vectorizada (por bloques, para acotar memoria con audios
+mapeados en disco) se calcula la energía y la planitud espectral de frames de
+30 ms. Un frame es voz si supera un umbral de energía adaptado al ruido de fondo
+y su espectro no es plano como el del ruido. Las regiones se ensanchan un poco,
+se unen si el hueco entre ellas es corto y se descartan las muy breves.
+Whisper recibe solo las regiones con voz concatenadas; SpeechMap devuelve
+los tiempos de los segmentos a la línea temporal original.
+"""
+import numpy as np
+
+from src.audio import read_samples
+from src.config import (
+    VAD_FRAME_S,
+    VAD_THRESHOLD_DB,
+    VAD_MAX_FLATNESS,
+    VAD_PAD_S,
+    VAD_MIN_SILENCE_S,
+    VAD_MIN_SPEECH_S,
+)
+
+SAMPLE_RATE = 16000
+BLOCK_FRAMES = 4096  # Frames por bloque de FFT (~2 min con frames de 30 ms)
+
+
+def frame_features(audio, frame):
+    """
+    Energía en dBFS y planitud espectral de cada frame, por bloques.
+
+    Args:
+        audio (np.ndarray): Audio mono float32 (puede ser un memmap)
+        frame (int): Muestras por frame
+
+    Returns:
+        tuple: (energia_db, planitud), arrays de longitud len(audio) // frame
+    """
+    n_frames = len(audio) // frame
+    energia = np.empty(n_frames, dtype=np.float32)
+    planitud = np.empty(n_frames, dtype=np.float32)
+    ventana = np.hanning(frame).astype(np.float32)
+
+    for i in range(0, n_frames, BLOCK_FRAMES):
+        n = min(BLOCK_FRAMES, n_frames - i)
+        bloque = read_samples(audio, i * frame, (i + n) * frame).reshape(n, frame)
+        potencia_media = np.einsum('ij,ij->i', bloque, bloque) / frame
+        energia[i:i + n] = 10 * np.log10(potencia_media + 1e-10)
+
+        espectro = np.abs(np.fft.rfft(bloque * ventana, axis=1)) ** 2 + 1e-10
+        # Media geométrica / media aritmética: ~1 para ruido blanco, ~0 para tonos y voz
+        planitud[i:i + n] = np.exp(np.mean(np.log(espectro), axis=1)) / np.mean(espectro, axis=1)
+
+    return energia, planitud
+
+
+def _runs(mask):
+    """Inicios y finales (exclusivos) de las rachas de True de una máscara booleana"""
+    bordes = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    return np.flatnonzero(bordes == 1), np.flatnonzero(bordes == -1)
+
+
+def detect_speech(audio, sample_rate=SAMPLE_RATE, frame_s=VAD_FRAME_S, threshold_db=VAD_THRESHOLD_DB,
+                  max_flatness=VAD_MAX_FLATNESS, pad_s=VAD_PAD_S, min_silence_s=VAD_MIN_SILENCE_S,
+                  min_speech_s=VAD_MIN_SPEECH_S):
+    """
+    Calcula las regiones con voz de un audio.
+
+    Args:
+        audio (np.ndarray): Audio mono float32
+        sample_rate (int): Frecuencia de muestreo
+        frame_s (float): Duración de cada frame de análisis
+        threshold_db (float): dB por encima del ruido de fondo para considerar voz
+        max_flatness (float): Planitud espectral máxima de un frame de voz
+        pad_s (float): Margen que se añade a cada lado de una región
+        min_silence_s (float): Huecos más cortos que esto se mantienen
+        min_speech_s (float): Regiones más cortas que esto se descartan
+
+    Returns:
+        list: Tuplas (inicio, fin) en muestras, ordenadas y sin solapes
+    """
+    frame = int(sample_rate * frame_s)
+    energia, planitud = frame_features(audio, frame)
+    if len(energia) == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    # Umbral relativo al ruido de fondo, acotado para audios sin pausas o muy silenciosos
+    fondo = np.percentile(energia, 10)
+    umbral = np.clip(fondo + threshold_db, -55.0, -35.0)
+    voz = (energia > umbral) & (planitud < max_flatness)
+
+    # Ensanchar cada frame de voz pad_s a cada lado (dilatación con una convolución)
+    pad = int(round(pad_s / frame_s))
+    if pad:
+        voz = np.convolve(voz.astype(np.float32), np.ones(2 * pad + 1, dtype=np.float32), mode='same') > 0
+
+    # Rellenar huecos cortos
+    inicios, finales = _runs(~voz)
+    min_silencio = int(round(min_silence_s / frame_s))
+    for a, b in zip(inicios, finales):
+        if b - a < min_silencio and a > 0 and b < len(voz):
+            voz[a:b] = True
+
+    # Descartar regiones cortas
+    inicios, finales = _runs(voz)
+    min_voz = int(round(min_speech_s / frame_s))
+    regiones = [
+        (int(a) * frame, min(len(audio), int(b) * frame))
+        for a, b in zip(inicios, finales) if b - a >= min_voz
+    ]
+
+    # La cola que no llena un frame se une a la última región si llega hasta el final
+    if regiones and regiones[-1][1] == len(energia) * frame:
+        regiones[-1] = (regiones[-1][0], len(audio))
+    return regiones
+
+
+class SpeechMap:
+    """Correspondencia entre el audio compactado (solo voz) y la línea temporal original"""
+    def __init__(self, regiones, total_samples, sample_rate=SAMPLE_RATE):
+        self.regiones = list(regiones)
+        self.total_samples = total_samples
+        self.sample_rate = sample_rate
+        longitudes = np.array([b - a for a, b in self.regiones], dtype=np.int64)
+        # Inicio de cada región en el audio compactado y en el original
+        self._compacto = np.concatenate(([0], np.cumsum(longitudes)[:-1])) if len(longitudes) else np.zeros(0, np.int64)
+        self._original = np.array([a for a, _ in self.regiones], dtype=np.int64)
+        self.voiced_samples = int(longitudes.sum())
+
+    @property
+    def skipped_s(self):
+        """Segundos de audio que no pasan por Whisper"""
+        return (self.total_samples - self.voiced_samples) / self.sample_rate
+
+    @property
+    def skipped_fraction(self):
+        return 1 - self.voiced_samples / self.total_samples if self.total_samples else 0.0
+
+    def iter_voiced(self, audio, chunk_samples):
+        """
+        Recorre las regiones con voz por bloques, sin construir el audio compactado.
+
+        Yields:
+            np.ndarray: Bloques float32 de como mucho chunk_samples muestras
+        """
+        for a, b in self.regiones:
+            for inicio in range(a, b, chunk_samples):
+                yield read_samples(audio, inicio, min(b, inicio + chunk_samples))
+
+    def compact(self, audio):
+        """Concatena las regiones con voz en un array nuevo"""
+        salida = np.empty(self.voiced_samples, dtype=np.float32)
+        for (a, b), inicio in zip(self.regiones, self._compacto):
+            salida[inicio:inicio + (b - a)] = audio[a:b]
+        return salida
+
+    def to_original(self, t, is_end=False):
+        """
+        Convierte un instante del audio compactado a la línea temporal original.
+
+        Args:
+            t (float): Segundos en el audio compactado
+            is_end (bool): Un final que cae justo en el borde pertenece a la región anterior
+
+        Returns:
+            float: Segundos en el audio original
+        """
+        if not self.regiones:
+            return t
+        muestra = t * self.sample_rate
+        lado = 'left' if is_end else 'right'
+        k = max(0, int(np.searchsorted(self._compacto, muestra, side=lado)) - 1)
+        return float((muestra - self._compacto[k] + self._original[k]) / self.sample_rate)
+
+    def remap_segment(self, segment):
+        """Devuelve los tiempos start/end de un segmento de Whisper a la línea original (in situ)"""
+        segment['start'] = self.to_original(segment['start'])
+        segment['end'] = max(segment['start'], self.to_original(segment['end'], is_end=True))
+        return segment
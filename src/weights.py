@@ -0,0 +1,244 @@
+"""
+Pesos de los modelos compartidos entre procesos mediante un archivo mapeado en memoria.
+
+whisper.load_model deserializa el checkpoint (en FP16) y copia cada tensor a
+memoria privada del proceso; con varias réplicas de Streamlit o el pool de
+src.parallel, cada proceso tiene su propia copia y paga la carga completa. Aquí
+los pesos se exportan una vez, ya en FP32, a un archivo plano en
+SHARED_WEIGHTS_DIR (tensores contiguos y alineados, con un índice JSON). Cada
+proceso lo mapea en solo lectura con copia en escritura y crea el modelo con
+sus parámetros apuntando al mapeo, sin inicializarlo ni copiar nada: las
+páginas son las de la caché del sistema, compartidas por todos los procesos,
+y adjuntarse cuesta milisegundos. Con SHARED_WEIGHTS_DIR en /dev/shm los pesos
+ni siquiera pasan por disco.
+
+Uso para exportar los pesos por adelantado (por ejemplo, al desplegar):
+    python -m src.weights tiny base
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from src.config import SHARED_WEIGHTS_DIR
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+ALIGNMENT = 64  # Alineación de cada tensor dentro del archivo (bytes)
+
+_export_lock = threading.Lock()
+
+# Operaciones en el sitio que solo rellenan tensores al construir un módulo (inicialización)
+_INIT_OPS = frozenset({'uniform_', 'normal_', 'kaiming_uniform_', 'ones_', 'zeros_', 'fill_', 'zero_'})
+
+
+def _paths(model_name, directory=None):
+    """Rutas del archivo de pesos y de su índice para un modelo"""
+    import whisper
+
+    # La versión del checkpoint (el hash de su URL) forma parte del nombre
+    url = whisper._MODELS.get(model_name)
+    version = url.split('/')[-2][:12] if url else 'local'
+    base = os.path.join(directory or SHARED_WEIGHTS_DIR, f'{os.path.basename(model_name)}-{version}')
+    return base + '.bin', base + '.json'
+
+
+def _tensors(model):
+    """Parámetros y buffers densos del modelo (alignment_heads es disperso y se regenera)"""
+    tensores = dict(model.named_parameters())
+    tensores.update((nombre, t) for nombre, t in model.named_buffers() if not t.is_sparse)
+    return tensores
+
+
+def export_weights(model_name, directory=None):
+    """
+    Carga un modelo con whisper y vuelca sus pesos FP32 al archivo compartido.
+
+    El archivo se escribe en un temporal y el índice se publica al final con un
+    rename, así que varios procesos pueden exportar a la vez sin ver a medias.
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+        directory (str): Directorio de los pesos (por defecto, SHARED_WEIGHTS_DIR)
+
+    Returns:
+        tuple: (ruta del archivo de pesos, ruta del índice)
+    """
+    import whisper
+
+    ruta_bin, ruta_json = _paths(model_name, directory)
+    os.makedirs(os.path.dirname(ruta_bin), exist_ok=True)
+
+    model = whisper.load_model(model_name, device='cpu')
+    indice = {'version': VERSION, 'modelo': model_name, 'dims': vars(model.dims), 'tensores': {}}
+
+    fd, tmp_bin = tempfile.mkstemp(dir=os.path.dirname(ruta_bin), suffix='.bin.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            offset = 0
+            for nombre, tensor in _tensors(model).items():
+                datos = tensor.detach().float().contiguous().numpy()
+                relleno = -offset % ALIGNMENT
+                f.write(b'\0' * relleno)
+                offset += relleno
+                indice['tensores'][nombre] = {'offset': offset, 'shape': list(datos.shape)}
+                f.write(datos.tobytes())
+                offset += datos.nbytes
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_bin, ruta_bin)
+
+        tmp_json = ruta_json + f'.{os.getpid()}.tmp'
+        with open(tmp_json, 'w', encoding='utf-8') as f:
+            json.dump(indice, f)
+        os.replace(tmp_json, ruta_json)
+    except BaseException:
+        try:
+            os.unlink(tmp_bin)
+        except OSError:
+            pass
+        raise
+
+    logger.info('Pesos de %s exportados a %s (%.0f MB)', model_name, ruta_bin, offset / 2 ** 20)
+    return ruta_bin, ruta_json
+
+
+def _read_index(ruta_bin, ruta_json):
+    """Índice de los pesos si existe, es de esta versión y el archivo está completo"""
+    try:
+        with open(ruta_json, encoding='utf-8') as f:
+            indice = json.load(f)
+        tamano = os.path.getsize(ruta_bin)
+    except (OSError, ValueError):
+        return None
+    if indice.get('version') != VERSION:
+        return None
+    ultimo = max(indice['tensores'].values(), key=lambda t: t['offset'], default=None)
+    if ultimo is not None and ultimo['offset'] + 4 * int(np.prod(ultimo['shape'])) > tamano:
+        return None
+    return indice
+
+
+def _skip_init():
+    """
+    Contexto que omite la inicialización de los módulos de torch creados dentro.
+
+    Es un TorchFunctionMode: la pila de modos es de cada hilo, así que los
+    modelos que otros hilos construyan a la vez se inicializan con normalidad.
+    Todos los tensores omitidos se sustituyen después por los del archivo.
+    """
+    from torch.overrides import TorchFunctionMode
+
+    class _SinInicializar(TorchFunctionMode):
+        def __torch_function__(self, func, types, args=(), kwargs=None):
+            kwargs = kwargs or {}
+            if getattr(func, '__name__', None) in _INIT_OPS:
+                return args[0] if args else kwargs['tensor']
+            return func(*args, **kwargs)
+
+    return _SinInicializar()
+
+
+def _assign(model, nombre, tensor):
+    """Sustituye un parámetro o buffer por el tensor mapeado"""
+    import torch
+
+    *ruta, hoja = nombre.split('.')
+    modulo = model.get_submodule('.'.join(ruta))
+    if hoja in modulo._parameters:
+        modulo._parameters[hoja] = torch.nn.Parameter(tensor, requires_grad=False)
+    else:
+        modulo._buffers[hoja] = tensor
+
+
+def attach_model(model_name, directory=None):
+    """
+    Crea un modelo de Whisper cuyos pesos apuntan al archivo compartido.
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+        directory (str): Directorio de los pesos (por defecto, SHARED_WEIGHTS_DIR)
+
+    Returns:
+        Modelo de Whisper en CPU, o None si los pesos aún no se han exportado
+    """
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    ruta_bin, ruta_json = _paths(model_name, directory)
+    indice = _read_index(ruta_bin, ruta_json)
+    if indice is None:
+        return None
+
+    # Copia en escritura: las páginas se comparten mientras nadie escriba en ellas
+    datos = np.memmap(ruta_bin, dtype=np.uint8, mode='c')
+
+    # Sin inicializar: los pesos aleatorios se sustituirían enseguida por los del archivo, y
+    # la memoria de torch.empty no llega a tocarse. (En el dispositivo meta no se puede:
+    # Whisper crea alignment_heads con to_sparse, que no tiene kernel para meta.)
+    with _skip_init():
+        model = Whisper(ModelDimensions(**indice['dims']))
+
+    if set(_tensors(model)) - set(indice['tensores']):
+        # Un índice de otra versión de whisper puede no cubrir todos los tensores
+        logger.warning('Pesos compartidos de %s incompletos, se vuelven a exportar', model_name)
+        return None
+
+    for nombre, info in indice['tensores'].items():
+        n = int(np.prod(info['shape']))
+        vista = datos[info['offset']:info['offset'] + 4 * n].view(np.float32).reshape(info['shape'])
+        _assign(model, nombre, torch.from_numpy(vista))
+
+    if model_name in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[model_name])
+    return model
+
+
+def load_shared_model(model_name, directory=None):
+    """
+    Devuelve el modelo con pesos compartidos, exportándolos la primera vez.
+
+    Args:
+        model_name (str): Nombre del modelo de Whisper
+        directory (str): Directorio de los pesos (por defecto, SHARED_WEIGHTS_DIR)
+
+    Returns:
+        Modelo de Whisper en CPU
+    """
+    model = attach_model(model_name, directory)
+    if model is None:
+        with _export_lock:
+            model = attach_model(model_name, directory)
+            if model is None:
+                export_weights(model_name, directory)
+                model = attach_model(model_name, directory)
+    if model is None:
+        raise RuntimeError(f'No se pudieron compartir los pesos de {model_name}')
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m src.weights',
+        description='Exporta los pesos de modelos de Whisper al archivo compartido entre procesos.'
+    )
+    parser.add_argument('modelos', nargs='+', help='Modelos a exportar (tiny, base...)')
+    parser.add_argument('--directorio', help=f'Directorio de los pesos (por defecto {SHARED_WEIGHTS_DIR})')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for modelo in args.modelos:
+        ruta_bin, _ = export_weights(modelo, args.directorio)
+        print(f'{modelo}: {ruta_bin}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
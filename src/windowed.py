@@ -0,0 +1,169 @@
+"""
+Transcripción por ventanas con memoria acotada para grabaciones de varias horas.
+
+transcribe_windows calcula el log-mel de todo el audio antes de decodificar la
+primera ventana (y con una ruta, whisper decodifica el archivo entero a un
+array float32): con grabaciones de varias horas son gigas de memoria. Aquí el
+audio llega por bloques, de ffmpeg o leído del PCM ya ingerido sin mapearlo en
+memoria, a un búfer deslizante que solo conserva desde la ventana actual, y el
+mel se calcula ventana a ventana. El bucle de decodificación es el mismo
+(decode_windows), así que el texto anterior sigue sirviendo de prompt entre
+ventanas. Como en la decodificación por lotes, el mel se normaliza por ventana.
+"""
+import numpy as np
+import torch
+from whisper.audio import HOP_LENGTH, N_FFT, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+
+from src.audio import read_samples, stream_pcm
+from src.config import INGEST_CHUNK_BYTES
+from src.metrics import NULL_TIMER
+
+CHUNK_SAMPLES = INGEST_CHUNK_BYTES // 4  # Muestras float32 leídas de cada vez de un array
+
+
+class PcmWindows:
+    """
+    Búfer deslizante sobre un flujo de bloques de PCM.
+
+    Las lecturas deben pedirse en posiciones crecientes: todo lo anterior a la
+    última posición pedida se libera.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._start = 0  # Muestra del flujo en la que empieza el búfer
+        self.exhausted = False
+
+    @property
+    def total_samples(self):
+        """Muestras del flujo completo, o None si aún no ha terminado"""
+        return self._start + len(self._buffer) if self.exhausted else None
+
+    def read(self, start, size):
+        """
+        Muestras [start, start + size) del flujo.
+
+        Args:
+            start (int): Primera muestra (no menor que la de la lectura anterior)
+            size (int): Muestras pedidas
+
+        Returns:
+            np.ndarray: Hasta size muestras float32 (menos al final del flujo)
+        """
+        if start < self._start:
+            raise ValueError(f'La muestra {start} ya se liberó del búfer (empieza en {self._start})')
+
+        offset = start - self._start
+        partes = [self._buffer[offset:]] if offset < len(self._buffer) else []
+        disponible = max(0, len(self._buffer) - offset)
+        salto = max(0, offset - len(self._buffer))  # Muestras futuras que se descartan (al reanudar)
+        while disponible < size and not self.exhausted:
+            bloque = next(self._chunks, None)
+            if bloque is None:
+                self.exhausted = True
+                break
+            if salto:
+                if len(bloque) <= salto:
+                    salto -= len(bloque)
+                    continue
+                bloque = bloque[salto:]
+                salto = 0
+            partes.append(np.asarray(bloque, dtype=np.float32))
+            disponible += len(bloque)
+
+        # Una sola parte se queda como vista; varias se juntan en un búfer nuevo y el anterior se libera
+        if not partes:
+            self._buffer = np.zeros(0, dtype=np.float32)
+        elif len(partes) == 1:
+            self._buffer = partes[0]
+        else:
+            self._buffer = np.concatenate(partes)
+        # Si el flujo acabó antes de start, el búfer vacío queda en el final real
+        self._start = start - salto
+        return self._buffer[:size]
+
+    def close(self):
+        """Libera el búfer y cierra la fuente (termina ffmpeg si aún no había acabado)"""
+        self._buffer = np.zeros(0, dtype=np.float32)
+        cerrar = getattr(self._chunks, 'close', None)
+        if cerrar is not None:
+            cerrar()
+
+
+class StreamingMelWindows:
+    """Ventanas de mel calculadas bajo demanda desde un PcmWindows (ver MelWindows en src.decoding)"""
+    # La primera ventana se calcula igual para detectar el idioma y para decodificar
+    reuse_language_features = True
+
+    def __init__(self, pcm, n_mels, total_samples=None, timer=None):
+        """
+        Args:
+            pcm (PcmWindows): Flujo de audio
+            n_mels (int): Bandas de mel del modelo
+            total_samples (int): Muestras totales si se conocen de antemano (opcional)
+            timer: StageTimer que acumula el tiempo de mel (opcional)
+        """
+        self.pcm = pcm
+        self.n_mels = n_mels
+        self.total_samples = total_samples
+        self.timer = timer or NULL_TIMER
+
+    @property
+    def content_frames(self):
+        total = self.total_samples if self.total_samples is not None else self.pcm.total_samples
+        return None if total is None else total // HOP_LENGTH
+
+    def segment(self, seek):
+        """
+        Mel de la ventana que empieza en seek.
+
+        Returns:
+            tuple: (mel de N_FRAMES, frames con contenido), o None si no queda audio
+        """
+        # N_FFT muestras más para que los últimos frames vean audio real y no relleno
+        muestras = self.pcm.read(seek * HOP_LENGTH, N_SAMPLES + N_FFT)
+        segment_size = min(N_FRAMES, len(muestras) // HOP_LENGTH)
+        if segment_size <= 0:
+            return None
+        with self.timer.stage('mel'):
+            mel = log_mel_spectrogram(
+                torch.from_numpy(muestras), self.n_mels, padding=N_SAMPLES + N_FFT - len(muestras)
+            )
+        return pad_or_trim(mel[:, :segment_size], N_FRAMES), segment_size
+
+    def language_segment(self):
+        """Mel de la primera ventana para detectar el idioma"""
+        window = self.segment(0)
+        return window[0] if window is not None else torch.zeros((self.n_mels, N_FRAMES))
+
+    def position(self, seek):
+        """Segundos transcritos al llegar a seek"""
+        frames = self.content_frames
+        return (seek if frames is None else min(frames, seek)) * HOP_LENGTH / SAMPLE_RATE
+
+    def close(self):
+        self.pcm.close()
+
+
+def open_windows(model, audio, speech_map=None, timer=None):
+    """
+    Prepara las ventanas de un audio sin cargarlo entero en memoria.
+
+    Args:
+        model: Modelo de Whisper (para el número de bandas de mel)
+        audio: Ruta del archivo (se decodifica con ffmpeg sobre la marcha) o array
+            PCM a 16 kHz (por ejemplo, IngestedAudio.pcm, que se lee sin mapearlo)
+        speech_map: SpeechMap de un array; solo se leen sus regiones con voz (opcional)
+        timer: StageTimer (opcional)
+
+    Returns:
+        StreamingMelWindows
+    """
+    if isinstance(audio, str):
+        chunks, total = stream_pcm(audio), None
+    elif speech_map is not None:
+        chunks, total = speech_map.iter_voiced(audio, CHUNK_SAMPLES), speech_map.voiced_samples
+    else:
+        chunks = (read_samples(audio, a, a + CHUNK_SAMPLES) for a in range(0, len(audio), CHUNK_SAMPLES))
+        total = len(audio)
+    return StreamingMelWindows(PcmWindows(chunks), model.dims.n_mels, total, timer)
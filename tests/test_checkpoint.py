@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from src.checkpoint import Checkpoint, purge_stale
+
+KEY = 'a' * 64
+
+
+def _write_two_windows(directory):
+    checkpoint = Checkpoint(KEY, str(directory))
+    assert checkpoint.load(3000) is None
+    checkpoint.start(3000, 'es')
+    checkpoint.record(1500, [{'start': 0.0, 'end': 30.0, 'text': ' uno'}], 0)
+    checkpoint.record(3000, [{'start': 30.0, 'end': 60.0, 'text': ' dos'}], 5)
+    checkpoint.close()
+    return checkpoint
+
+
+def test_resume_returns_recorded_windows(tmp_path):
+    _write_two_windows(tmp_path)
+
+    checkpoint = Checkpoint(KEY, str(tmp_path))
+    state = checkpoint.load(3000)
+    checkpoint.close()
+
+    assert state['seek'] == 3000
+    assert state['language'] == 'es'
+    assert state['prompt_reset_since'] == 5
+    assert state['ventanas'] == 2
+    assert [s['text'] for s in state['segments']] == [' uno', ' dos']
+
+
+def test_other_audio_is_not_resumed(tmp_path):
+    _write_two_windows(tmp_path)
+
+    checkpoint = Checkpoint(KEY, str(tmp_path))
+    assert checkpoint.load(4000) is None
+    checkpoint.close()
+
+
+def test_partial_last_line_is_ignored_and_truncated(tmp_path):
+    path = _write_two_windows(tmp_path).path
+    with open(path, 'ab') as f:
+        f.write(b'{"seek": 4500, "segm')
+
+    checkpoint = Checkpoint(KEY, str(tmp_path))
+    state = checkpoint.load(3000)
+    assert state['ventanas'] == 2
+
+    # Al continuar, la línea incompleta desaparece y la siguiente ventana queda bien escrita
+    checkpoint.start(3000, 'es', state)
+    checkpoint.record(4500, [{'start': 60.0, 'end': 90.0, 'text': ' tres'}], 5)
+    checkpoint.close()
+
+    checkpoint = Checkpoint(KEY, str(tmp_path))
+    state = checkpoint.load(3000)
+    checkpoint.close()
+    assert state['ventanas'] == 3
+    assert state['seek'] == 4500
+
+
+def test_second_job_cannot_take_a_checkpoint_in_use(tmp_path):
+    primero = Checkpoint(KEY, str(tmp_path))
+    assert primero.load(3000) is None
+    primero.start(3000, 'es')
+    primero.record(1500, [], 0)
+
+    segundo = Checkpoint(KEY, str(tmp_path))
+    assert not segundo.acquire()
+    assert segundo.load(3000) is None
+    segundo.start(3000, 'es')  # Sin el bloqueo no escribe nada
+    segundo.record(9999, [], 0)
+    segundo.discard()
+    assert os.path.exists(primero.path)
+
+    primero.close()
+    state = Checkpoint(KEY, str(tmp_path)).load(3000)
+    assert state['seek'] == 1500
+
+
+def test_discard_removes_file(tmp_path):
+    checkpoint = _write_two_windows(tmp_path)
+    checkpoint.discard()
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_purge_stale_skips_locked_files(tmp_path):
+    en_uso = Checkpoint('b' * 64, str(tmp_path))
+    en_uso.acquire()
+    _write_two_windows(tmp_path)
+
+    assert purge_stale(str(tmp_path), max_age_s=-1) == 1
+    assert os.listdir(tmp_path) == [os.path.basename(en_uso.path)]
+    en_uso.close()
+
+
+@pytest.mark.parametrize('max_age_s, borrados', [(3600, 0), (-1, 1)])
+def test_purge_stale_by_age(tmp_path, max_age_s, borrados):
+    _write_two_windows(tmp_path)
+    assert purge_stale(str(tmp_path), max_age_s=max_age_s) == borrados
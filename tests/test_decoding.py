@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip('whisper')
+
+from src.decoding import FallbackBudget
+
+
+def test_unlimited_budget_always_allows():
+    budget = FallbackBudget()
+    budget.record(100.0)
+    assert budget.allows(10)
+
+
+def test_per_window_limit():
+    budget = FallbackBudget(max_per_window=2)
+    assert budget.allows(1)
+    assert budget.allows(2)
+    assert not budget.allows(3)
+
+
+def test_time_budget_runs_out():
+    budget = FallbackBudget(max_seconds=1.0)
+    budget.record(0.6)
+    assert budget.allows(1)
+    budget.record(0.5, ventanas=2)
+    assert not budget.allows(1)
+
+    budget.deny(3)
+    assert budget.report() == {'reintentos': 3, 'agotados': 3, 'segundos': 1.1}
+
+
+def test_combine_reports_ignores_missing():
+    a = {'reintentos': 2, 'agotados': 1, 'segundos': 0.25}
+    b = {'reintentos': 1, 'agotados': 0, 'segundos': 0.5}
+    assert FallbackBudget.combine([a, None, b]) == {'reintentos': 3, 'agotados': 1, 'segundos': 0.75}
+    assert FallbackBudget.combine([]) == {'reintentos': 0, 'agotados': 0, 'segundos': 0}
@@ -0,0 +1,34 @@
+import pytest
+
+from src.estimator import remaining_seconds
+
+
+def test_without_estimate_uses_linear_extrapolation():
+    assert remaining_seconds(None, 10.0, 50) == pytest.approx(10.0)
+    # Con menos del 5 % la extrapolación no es fiable
+    assert remaining_seconds(None, 10.0, 1) is None
+
+
+def test_at_start_uses_estimate():
+    assert remaining_seconds(100.0, 0.0, 0) == pytest.approx(100.0)
+    assert remaining_seconds(100.0, 30.0, 2) == pytest.approx(70.0)
+
+
+def test_unknown_once_estimate_is_exceeded_without_progress():
+    assert remaining_seconds(100.0, 120.0, 1) is None
+
+
+def test_blends_estimate_and_progress():
+    # Al 25 %: peso 0.5 entre la previsión (100 s) y la extrapolación (40 s)
+    assert remaining_seconds(100.0, 10.0, 25) == pytest.approx(0.5 * 100 + 0.5 * 40 - 10)
+
+
+def test_finished_job_has_nothing_left():
+    assert remaining_seconds(100.0, 80.0, 100) == pytest.approx(0.0)
+    assert remaining_seconds(50.0, 80.0, 100) == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize('estimado', [0.0, 10.0, 100.0])
+@pytest.mark.parametrize('porcentaje', [5, 25, 50, 90, 99])
+def test_never_negative(estimado, porcentaje):
+    assert remaining_seconds(estimado, 60.0, porcentaje) >= 0.0
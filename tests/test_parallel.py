@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('streamlit')
+
+from src.parallel import find_split_points, merge_chunk_results
+
+
+def _segment(start, end, text):
+    return {'start': start, 'end': end, 'text': text, 'seek': 0}
+
+
+def test_merge_shifts_times_and_renumbers():
+    primero = {'language': 'es', 'segments': [_segment(0.0, 4.0, ' uno dos')]}
+    segundo = {'language': 'es', 'segments': [_segment(1.5, 3.0, ' tres cuatro')]}
+
+    merged = merge_chunk_results([(0.0, 0.0, primero), (9.0, 10.0, segundo)])
+
+    assert [s['id'] for s in merged['segments']] == [0, 1]
+    assert merged['segments'][1]['start'] == pytest.approx(10.5)
+    assert merged['segments'][1]['end'] == pytest.approx(12.0)
+    assert merged['segments'][1]['seek'] == 900
+    assert merged['text'] == ' uno dos tres cuatro'
+    assert merged['language'] == 'es'
+
+
+def test_merge_drops_segments_inside_the_overlap():
+    primero = {'language': 'es', 'segments': [_segment(0.0, 10.5, ' cuatro cinco seis')]}
+    segundo = {'language': 'es', 'segments': [_segment(0.0, 0.8, ' cuatro'), _segment(2.0, 3.0, ' siete')]}
+
+    merged = merge_chunk_results([(0.0, 0.0, primero), (9.0, 10.0, segundo)])
+
+    assert [s['text'] for s in merged['segments']] == [' cuatro cinco seis', ' siete']
+
+
+def test_merge_strips_words_repeated_across_the_cut():
+    primero = {'language': 'es', 'segments': [_segment(0.0, 10.5, ' cuatro cinco seis')]}
+    segundo = {'language': 'es', 'segments': [_segment(0.5, 3.0, ' cinco seis siete ocho')]}
+
+    merged = merge_chunk_results([(0.0, 0.0, primero), (9.0, 10.0, segundo)])
+
+    ultimo = merged['segments'][-1]
+    assert ultimo['text'] == ' siete ocho'
+    # No se solapa con el segmento anterior
+    assert ultimo['start'] == pytest.approx(10.5)
+    assert ultimo['end'] == pytest.approx(12.0)
+
+
+def test_merge_skips_identical_duplicate():
+    primero = {'language': 'es', 'segments': [_segment(0.0, 10.5, ' Hola, mundo.')]}
+    segundo = {'language': 'es', 'segments': [_segment(0.5, 2.0, ' hola mundo')]}
+
+    merged = merge_chunk_results([(0.0, 0.0, primero), (9.0, 10.0, segundo)])
+
+    assert len(merged['segments']) == 1
+
+
+def test_merge_keeps_single_matching_word_in_longer_segment():
+    primero = {'language': 'es', 'segments': [_segment(0.0, 10.5, ' y dijo que sí')]}
+    segundo = {'language': 'es', 'segments': [_segment(1.0, 3.0, ' sí vendrá mañana')]}
+
+    merged = merge_chunk_results([(0.0, 0.0, primero), (9.0, 10.0, segundo)])
+
+    assert merged['segments'][-1]['text'] == ' sí vendrá mañana'
+
+
+def test_merge_uses_majority_language():
+    partes = [
+        (0.0, 0.0, {'language': 'es', 'segments': []}),
+        (10.0, 10.0, {'language': 'en', 'segments': []}),
+        (20.0, 20.0, {'language': 'es', 'segments': []}),
+    ]
+    assert merge_chunk_results(partes)['language'] == 'es'
+    assert merge_chunk_results([])['language'] is None
+
+
+def test_split_points_fall_in_silence():
+    sr = 16000
+    ruido = np.random.default_rng(0).standard_normal(10 * sr).astype(np.float32) * 0.3
+    audio = ruido.copy()
+    audio[int(4.5 * sr):int(5.5 * sr)] = 0.0
+
+    cuts = find_split_points(audio, 2, search_s=2.0)
+
+    assert cuts[0] == 0 and cuts[-1] == len(audio)
+    assert len(cuts) == 3
+    assert 4.5 * sr <= cuts[1] <= 5.5 * sr
+
+
+def test_split_points_single_chunk():
+    audio = np.zeros(16000, dtype=np.float32)
+    assert find_split_points(audio, 1) == [0, len(audio)]
@@ -0,0 +1,51 @@
+import pytest
+
+from src.resources import CpuAllocator, apportion
+
+
+@pytest.mark.parametrize('total, pesos', [(8, [1, 2, 4]), (7, [1, 1, 1]), (16, [4, 1]), (3, [5, 1, 1])])
+def test_apportion_uses_every_core(total, pesos):
+    partes = apportion(total, pesos)
+    assert sum(partes) == total
+    assert min(partes) >= 1
+
+
+def test_apportion_is_proportional():
+    assert apportion(8, [1, 1]) == [4, 4]
+    assert apportion(6, [1, 2]) == [2, 4]
+
+
+def test_apportion_with_more_participants_than_units():
+    assert apportion(2, [1, 1, 1]) == [1, 1, 1]
+    assert apportion(4, []) == []
+
+
+def test_allocator_rebalances_on_release():
+    allocator = CpuAllocator(cores=range(8), pinning=False)
+    allocator.acquire('a', 'tiny')
+    allocator.acquire('b', 'tiny')
+    assert allocator.share('a')[0] == 4
+
+    allocator.release('b')
+    assert allocator.share('a')[0] == 8
+    assert allocator.share('b') is None
+    allocator.release('b')  # Soltar dos veces no falla
+
+
+def test_allocator_splits_parallel_share_between_workers():
+    allocator = CpuAllocator(cores=range(8), pinning=False)
+    allocator.acquire('a', 'tiny')
+    allocator.acquire('b', 'tiny')
+
+    assert allocator.worker_threads('b', 2) == (2, ())
+    assert allocator.worker_threads('desconocido', 2) is None
+
+
+def test_allocator_gives_disjoint_cores():
+    allocator = CpuAllocator(cores=range(8), pinning=False)
+    for job_id in 'abc':
+        allocator.acquire(job_id, 'tiny')
+
+    nucleos = [set(allocator.share(job_id)[1]) for job_id in 'abc']
+    assert sum(len(n) for n in nucleos) == 8
+    assert not (nucleos[0] & nucleos[1]) and not (nucleos[1] & nucleos[2])
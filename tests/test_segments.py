@@ -0,0 +1,56 @@
+import numpy as np
+
+from src.segments import SegmentTable
+
+SEGMENTOS = [
+    {'id': 0, 'start': 0.0, 'end': 2.5, 'text': ' Buenos días.', 'tokens': [1, 2, 3]},
+    {'id': 1, 'start': 2.5, 'end': 4.0, 'text': ' ¿Qué tal? ñandú', 'tokens': []},
+    {'id': 2, 'start': 16600.123, 'end': 16601.456, 'text': '', 'tokens': [4]},
+]
+
+
+def test_round_trip_keeps_times_and_text():
+    tabla = SegmentTable.from_segments(SEGMENTOS)
+
+    assert len(tabla) == 3
+    assert tabla.to_segments() == [
+        {'id': s['id'], 'start': s['start'], 'end': s['end'], 'text': s['text']} for s in SEGMENTOS
+    ]
+    assert tabla[-1]['start'] == 16600.123
+
+
+def test_tokens_only_when_requested():
+    assert 'tokens' not in SegmentTable.from_segments(SEGMENTOS)[0]
+
+    tabla = SegmentTable.from_segments(SEGMENTOS, keep_tokens=True)
+    assert [s['tokens'] for s in tabla] == [[1, 2, 3], [], [4]]
+
+
+def test_from_segments_returns_same_table():
+    tabla = SegmentTable.from_segments(SEGMENTOS)
+    assert SegmentTable.from_segments(tabla) is tabla
+
+
+def test_empty_table():
+    tabla = SegmentTable.from_segments([])
+    assert not tabla
+    assert tabla.to_segments() == []
+
+
+def test_blocks_cover_every_segment():
+    tabla = SegmentTable.from_segments(SEGMENTOS)
+    bloques = list(tabla.blocks(2))
+
+    assert [primero for primero, *_ in bloques] == [0, 2]
+    assert [t for *_, textos in bloques for t in textos] == [s['text'] for s in SEGMENTOS]
+    np.testing.assert_array_equal(bloques[0][1], [0.0, 2.5])
+
+
+def test_save_and_load_mapped(tmp_path):
+    tabla = SegmentTable.from_segments(SEGMENTOS, keep_tokens=True)
+    tabla.save(str(tmp_path))
+
+    cargada = SegmentTable.load(str(tmp_path))
+    assert isinstance(cargada.start, np.memmap)
+    assert cargada.to_segments() == tabla.to_segments()
+    assert cargada.nbytes == tabla.nbytes
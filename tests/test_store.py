@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from src.store import TranscriptStore, build_match
+
+
+@pytest.mark.parametrize('query, match', [
+    ('presupuesto anual', '"presupuesto" "anual"'),
+    ('"orden del día" votaci*', '"orden del día" "votaci"*'),
+    ('a AND (b OR c)', '"a" "AND" "(b" "OR" "c)"'),
+    ('NEAR(x y)', '"NEAR(x" "y)"'),
+    ('columna:valor', '"columna:valor"'),
+    ('di"go', '"digo"'),
+    ('"frase sin cerrar', '"frase" "sin" "cerrar"'),
+    ('- * ?', ''),
+    ('', ''),
+])
+def test_build_match_quotes_every_term(query, match):
+    assert build_match(query) == match
+
+
+@pytest.fixture
+def store(tmp_path):
+    try:
+        store = TranscriptStore(str(tmp_path / 'archivo.db'))
+    except sqlite3.OperationalError:
+        pytest.skip('SQLite sin FTS5')
+    yield store
+    store.close()
+
+
+def test_search_with_operators_does_not_fail(store):
+    resultado = {'language': 'es', 'segments': [
+        {'start': 0.0, 'end': 2.0, 'text': ' Aprobado el presupuesto anual'},
+        {'start': 2.0, 'end': 4.0, 'text': ' Votación del orden del día'},
+    ]}
+    store.add(resultado, 'pleno.mp3', clave='k')
+
+    # Los operadores de FTS5 se buscan como palabras, no fallan
+    assert store.search('presupuesto AND') == []
+    assert [r['inicio'] for r in store.search('presupuesto -')] == [0.0]
+    assert [r['inicio'] for r in store.search('votacion')] == [2.0]
+    assert [r['inicio'] for r in store.search('"orden del dia" vot*')] == [2.0]
+    assert store.search('(') == []
+
+
+def test_add_with_same_key_replaces(store):
+    store.add({'segments': [{'start': 0.0, 'end': 1.0, 'text': ' antiguo'}]}, 'a.mp3', clave='k')
+    store.add({'segments': [{'start': 0.0, 'end': 1.0, 'text': ' nuevo'}]}, 'a.mp3', clave='k')
+
+    assert store.search('antiguo') == []
+    assert len(store.search('nuevo')) == 1
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.vad import SpeechMap
+
+SR = 16000
+
+
+@pytest.fixture
+def speech_map():
+    # Voz en [1 s, 3 s) y [5 s, 6 s) de un audio de 10 s
+    return SpeechMap([(1 * SR, 3 * SR), (5 * SR, 6 * SR)], 10 * SR)
+
+
+def test_skipped_time(speech_map):
+    assert speech_map.voiced_samples == 3 * SR
+    assert speech_map.skipped_s == pytest.approx(7.0)
+    assert speech_map.skipped_fraction == pytest.approx(0.7)
+
+
+def test_to_original(speech_map):
+    assert speech_map.to_original(0.0) == pytest.approx(1.0)
+    assert speech_map.to_original(1.5) == pytest.approx(2.5)
+    # El inicio de la segunda región en el audio compactado
+    assert speech_map.to_original(2.0) == pytest.approx(5.0)
+    assert speech_map.to_original(2.5) == pytest.approx(5.5)
+
+
+def test_end_on_region_border_stays_in_previous_region(speech_map):
+    assert speech_map.to_original(2.0, is_end=True) == pytest.approx(3.0)
+
+
+def test_remap_segment(speech_map):
+    segment = speech_map.remap_segment({'start': 1.0, 'end': 2.0, 'text': ' hola'})
+    assert segment['start'] == pytest.approx(2.0)
+    assert segment['end'] == pytest.approx(3.0)
+
+    segment = speech_map.remap_segment({'start': 1.5, 'end': 2.5})
+    assert (segment['start'], segment['end']) == (pytest.approx(2.5), pytest.approx(5.5))
+
+
+def test_compact_concatenates_voiced_regions(speech_map):
+    audio = np.arange(10 * SR, dtype=np.float32)
+    compacto = speech_map.compact(audio)
+
+    assert len(compacto) == 3 * SR
+    assert compacto[0] == 1 * SR
+    assert compacto[2 * SR] == 5 * SR
+    np.testing.assert_array_equal(np.concatenate(list(speech_map.iter_voiced(audio, SR))), compacto)
+
+
+def test_without_regions_times_are_unchanged():
+    speech_map = SpeechMap([], 10 * SR)
+    assert speech_map.to_original(3.2) == pytest.approx(3.2)
+    assert speech_map.skipped_fraction == pytest.approx(1.0)